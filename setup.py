@@ -46,6 +46,7 @@ setup(
               'vunit.vivado',
               'vunit.test.lint',
               'vunit.test.unit',
+              'vunit.test.benchmark',
               'vunit.test.acceptance'],
     package_data={'vunit': DATA_FILES},
     zip_safe=False,
@@ -0,0 +1,78 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
+
+"""
+Collects statistics of the caches used when adding and parsing source files
+"""
+
+import json
+from collections import OrderedDict
+from contextlib import contextmanager
+from vunit.ostools import get_time
+
+
+class CacheStatistics(object):
+    """
+    Counts cache events and accumulates the time spent per cache
+    """
+
+    def __init__(self):
+        self._caches = OrderedDict()
+
+    def reset(self):
+        self._caches = OrderedDict()
+
+    def _get(self, name):
+        """
+        Returns the statistics of the named cache
+        """
+        if name not in self._caches:
+            self._caches[name] = OrderedDict([("time", 0.0)])
+        return self._caches[name]
+
+    def count(self, name, event):
+        """
+        Count an event such as a hit or miss of the named cache
+        """
+        statistics = self._get(name)
+        statistics[event] = statistics.get(event, 0) + 1
+
+    @contextmanager
+    def timed(self, name):
+        """
+        Add the time spent within the context to the named cache
+        """
+        start = get_time()
+        try:
+            yield
+        finally:
+            self._get(name)["time"] += get_time() - start
+
+    def to_dict(self):
+        return OrderedDict((name, OrderedDict(statistics))
+                           for name, statistics in self._caches.items())
+
+    def log_summary(self, logger):
+        """
+        Log the statistics of every cache on info level
+        """
+        for name, statistics in self._caches.items():
+            logger.info("Cache %s: %s", name,
+                        ", ".join("%s=%.3fs" % (event, value) if event == "time" else "%s=%i" % (event, value)
+                                  for event, value in statistics.items()))
+
+    def write_json(self, file_name, extra=None):
+        """
+        Write the statistics of every cache to a JSON file
+        """
+        data = self.to_dict()
+        if extra is not None:
+            data.update(extra)
+        with open(file_name, "w") as fptr:
+            json.dump(data, fptr, indent=4, separators=(',', ': '))
+
+
+CACHE_STATISTICS = CacheStatistics()
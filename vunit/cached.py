@@ -9,83 +9,253 @@ Utility to perform costly operation on file contents which can be cached
 """
 
 import os
-from vunit.hashing import hash_string
+import sys
+from os.path import splitext, abspath, dirname, join
+from contextlib import contextmanager
+from vunit.hashing import hash_file, hash_string, HASH_ALGORITHM
 from vunit.ostools import read_file
+from vunit.database import lookup
+from vunit.parsing.slotted import pickle_versions
+from vunit.cache_statistics import CACHE_STATISTICS
 
 
-def cached(key, function, file_name, encoding, database=None, newline=None):
+# The project database is re-created when the version changes
+DATABASE_VERSION = (15, sys.version, HASH_ALGORITHM)
+
+
+def cached(key, function, file_name, encoding,  # pylint: disable=too-many-arguments, too-many-locals
+           database=None, newline=None, shared_database=None, relocate=None):
+    """
+    Call function with file content if an update is needed
+
+    When a shared database is given results are also looked up by the
+    content hash alone such that files with the same contents share
+    results regardless of their file name. The relocate function is
+    called with a shared result, the file name it was computed for and
+    the file name it is used for and returns the result for the latter.
+
+    Hits, misses and the time spent are recorded in CACHE_STATISTICS
+    using key as the name. Results pickled with another version of their
+    class are removed and counted as misses.
+    """
+    with CACHE_STATISTICS.timed(key):
+        return _cached(key, function, file_name, encoding, database, newline, shared_database, relocate)
+
+
+def _cached(key, function, file_name, encoding,  # pylint: disable=too-many-arguments, too-many-locals
+            database, newline, shared_database, relocate):
     """
     Call function with file content if an update is needed
     """
 
     if database is None:
         # Without a database just return the function of the contents
+        CACHE_STATISTICS.count(key, "misses")
         content = read_file(file_name, encoding=encoding, newline=newline)
         return function(content)
 
-    function_key = ("%s(%s, newline=%s)" % (key, file_name, newline)).encode()
-    content, content_hash = _file_content_hash(file_name, encoding, database, newline=newline)
+    function_key = _function_key(key, file_name, newline)
+    content_hash = file_content_hash(file_name, database)
 
-    if function_key not in database:
-        # We do not have a cached version of this computation
-        # recompute and update database
-        if content is None:
-            content = read_file(file_name, encoding=encoding, newline=newline)
-        result = function(content)
-        database[function_key] = content_hash, result
-        return result
+    value = lookup(database, function_key)
+    if value is not None:
+        old_content_hash, old_result = value
+        if old_content_hash == content_hash:
+            CACHE_STATISTICS.count(key, "hits")
+            return old_result
 
-    old_content_hash, old_result = database[function_key]
-    if old_content_hash == content_hash:
-        return old_result
+    # We do not have a cached version of this computation or the content hash differs
+    # recompute or fetch from the shared database and update database
+    shared_key = None
+    if shared_database is not None:
+        shared_key = _shared_key(key, file_name, content_hash, newline)
 
-    # Content hash differs, recompute and update database
-    if content is None:
+    shared_value = None if shared_key is None else lookup(shared_database, shared_key)
+    if shared_value is not None:
+        CACHE_STATISTICS.count(key, "shared_hits")
+        old_file_name, result = shared_value
+        if old_file_name != file_name and relocate is not None:
+            result = relocate(result, old_file_name, file_name)
+    else:
+        CACHE_STATISTICS.count(key, "misses")
         content = read_file(file_name, encoding=encoding, newline=newline)
-    result = function(content)
+        result = function(content)
+        if shared_key is not None:
+            shared_database[shared_key] = file_name, result
+
     database[function_key] = content_hash, result
     return result
 
 
-def file_content_hash(file_name, encoding, database=None):
+def is_cached(key, file_name, database=None, newline=None, shared_database=None):
     """
-    Returns the hash of the contents of the file
+    Returns True if cached would return a stored result without calling the function
+    """
+    if database is None:
+        return False
 
-    Use the database to keep a persistent cache of the last content
-    hash.
+    content_hash = file_content_hash(file_name, database)
+    function_key = _function_key(key, file_name, newline)
+    value = lookup(database, function_key)
+    if value is not None and value[0] == content_hash:
+        return True
+
+    return (shared_database is not None
+            and lookup(shared_database, _shared_key(key, file_name, content_hash, newline)) is not None)
+
+
+def store_cached(key, file_name, result, database,  # pylint: disable=too-many-arguments
+                 newline=None, shared_database=None):
     """
-    _, content_hash = _file_content_hash(file_name, encoding, database)
-    return content_hash
+    Store the result of the function computed elsewhere, such as in another process,
+    as cached would have done
+    """
+    CACHE_STATISTICS.count(key, "misses")
+    content_hash = file_content_hash(file_name, database)
+    if shared_database is not None:
+        shared_database[_shared_key(key, file_name, content_hash, newline)] = file_name, result
+    database[_function_key(key, file_name, newline)] = content_hash, result
+
+
+def _function_key(key, file_name, newline):
+    return ("%s(%s, newline=%s)" % (key, file_name, newline)).encode()
+
+
+def _shared_key(key, file_name, content_hash, newline):
+    return shared_content_key(key, content_hash,
+                              "newline=%s, suffix=%s" % (newline, splitext(file_name)[1]))
 
 
-def _file_content_hash(file_name, encoding, database=None, newline=None):
+def shared_content_key(key, content_hash, details=""):
     """
-    Returns the file content as well as the hash of the content
+    Returns the key of a result in a database shared between projects
+
+    The key only depends on the content and not on the file name. It
+    includes the DATABASE_VERSION of the project database and the pickle
+    versions of the parse results such that a result is not shared with a
+    VUnit which would re-create its project database or fail to unpickle it
+    """
+    versions = hash_string(str((DATABASE_VERSION, pickle_versions())))
+    return ("%s(%s, %s, versions=%s)" % (key, content_hash, details, versions)).encode()
+
+
+def file_content_hash(file_name, database=None):
+    """
+    Returns the hash of the raw bytes of the file
 
     Use the database to keep a persistent cache of the last content
-    hash.  If the file modification date has not changed assume the
-    hash is the same and do not re-open the file.
+    hash.  If the file modification time, size and inode have not
+    changed assume the hash is the same and do not re-open the file.
+
+    Files hashed again because only the modification time changed are
+    counted as unchanged_rehashes in CACHE_STATISTICS.
     """
+    with CACHE_STATISTICS.timed("file_content_hash"):
+        return _file_content_hash(file_name, database)
+
+
+def _file_content_hash(file_name, database):
+    """
+    Returns the hash of the raw bytes of the file
+    """
+    name = "file_content_hash"
 
     if database is None:
-        content = read_file(file_name, encoding=encoding, newline=newline)
-        return content, hash_string(content)
+        CACHE_STATISTICS.count(name, "misses")
+        return hash_file(file_name)
 
-    key = ("cached._file_content_hash(%s, newline=%s)" % (file_name, newline)).encode()
+    key = ("cached.file_content_hash(%s)" % file_name).encode()
+    stat_key = _file_stat_key(file_name)
 
-    if key not in database:
-        content = read_file(file_name, encoding=encoding, newline=newline)
-        content_hash = hash_string(content)
-        timestamp = os.path.getmtime(file_name)
-        database[key] = timestamp, content_hash
-        return content, content_hash
-
-    timestamp = os.path.getmtime(file_name)
-    last_timestamp, last_content_hash = database[key]
-    if timestamp != last_timestamp:
-        content = read_file(file_name, encoding=encoding, newline=newline)
-        content_hash = hash_string(content)
-        database[key] = timestamp, content_hash
-        return content, content_hash
+    last_content_hash = None
+    if key in database:
+        last_stat_key, last_content_hash = database[key]
+        if stat_key == last_stat_key:
+            CACHE_STATISTICS.count(name, "hits")
+            return last_content_hash
+
+    content_hash = hash_file(file_name)
+    if last_content_hash is None:
+        CACHE_STATISTICS.count(name, "misses")
+    elif content_hash == last_content_hash:
+        CACHE_STATISTICS.count(name, "unchanged_rehashes")
+    else:
+        CACHE_STATISTICS.count(name, "rehashes")
+    database[key] = stat_key, content_hash
+    return content_hash
+
+
+def _stat_key(stat):
+    """
+    Returns the modification time, size and inode of a stat result
+
+    The inode is not available from directory scans on Windows and is left out
+    """
+    mtime = getattr(stat, "st_mtime_ns", stat.st_mtime)
+    inode = 0 if os.name == "nt" else stat.st_ino
+    return mtime, stat.st_size, inode
+
+
+# Stat keys of files found during a pre-stat directory scan
+_PRESTAT_KEYS = None
+
+# The minimum number of added files within a directory to scan it
+_MIN_PRESTAT_FILES = 8
+
+
+def _file_stat_key(file_name):
+    """
+    Returns the stat key of file_name using the pre-stat directory scan if available
+    """
+    if _PRESTAT_KEYS is not None:
+        stat_key = _PRESTAT_KEYS.get(abspath(file_name), None)
+        if stat_key is not None:
+            return stat_key
+    return _stat_key(os.stat(file_name))
+
+
+@contextmanager
+def prestat(file_names):
+    """
+    Stat the files in the directories of file_names with one directory scan per directory
+
+    Within the context the stat results are used instead of stating
+    every file separately. Only directories containing many of the files
+    are scanned. This is only done on Windows where the directory scan
+    returns the stat results without a system call per file.
+    """
+    global _PRESTAT_KEYS  # pylint: disable=global-statement
+
+    if _PRESTAT_KEYS is not None or os.name != "nt" or not hasattr(os, "scandir"):
+        # Already within a pre-stat context, not Windows or Python 2.7
+        yield
+        return
+
+    file_names_per_directory = {}
+    for file_name in file_names:
+        file_name = abspath(file_name)
+        file_names_per_directory.setdefault(dirname(file_name), set()).add(file_name)
+
+    prestat_keys = {}
+    for directory, directory_file_names in file_names_per_directory.items():
+        if len(directory_file_names) < _MIN_PRESTAT_FILES:
+            continue
+
+        try:
+            entries = list(os.scandir(directory))  # pylint: disable=no-member
+        except OSError:
+            continue
+
+        for entry in entries:
+            file_name = join(directory, entry.name)
+            if file_name in directory_file_names:
+                try:
+                    prestat_keys[file_name] = _stat_key(entry.stat())
+                except OSError:
+                    pass
 
-    return None, last_content_hash
+    _PRESTAT_KEYS = prestat_keys
+    try:
+        yield
+    finally:
+        _PRESTAT_KEYS = None
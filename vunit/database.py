@@ -8,13 +8,26 @@
 A simple file based database
 """
 
-from os.path import join, exists
+from os.path import join, exists, isdir
 import os
 import pickle
 import io
 import struct
+import shutil
+import logging
+import sqlite3
+from contextlib import contextmanager
+from collections import OrderedDict
 from vunit.ostools import renew_path
 
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None  # pylint: disable=invalid-name
+
+LOGGER = logging.getLogger(__name__)
+
 
 class DataBase(object):
     """
@@ -27,6 +40,15 @@ class DataBase(object):
 
     The reason to not just have the keys as the file names is that
     many operating systems does not support very long file names thus limiting the key length
+
+    Several processes may share the database. Nodes are written to a
+    temporary file which is renamed such that a node is never seen
+    partially written. Node indexes are allocated while holding an
+    advisory lock on the lock file within the directory, as are node
+    removals. When two processes add the same key at the same time it is
+    stored in two nodes. The most recently written node is used and the
+    other one is removed when the nodes are next discovered. A node
+    removed by another process is treated as a missing key.
     """
 
     def __init__(self, path, new=False):
@@ -43,23 +65,107 @@ class DataBase(object):
             os.makedirs(path)
 
         # Map keys to nodes indexes
-        self._keys_to_nodes = self._discover_nodes()
+        with self._lock():
+            self._keys_to_nodes = self._read_index()
+            self._index_is_stale = self._keys_to_nodes is None
+            if self._index_is_stale:
+                self._keys_to_nodes = self._discover_nodes()
+
         if not self._keys_to_nodes:
             self._next_node = 0
         else:
             self._next_node = max(self._keys_to_nodes.values()) + 1
 
+    _index_file_base_name = "index"
+    _lock_file_base_name = "lock"
+
+    def _lock(self):
+        """
+        Hold the advisory lock shared with other processes using the database
+        """
+        return _file_lock(join(self._path, self._lock_file_base_name))
+
+    def _node_file_base_names(self):
+        """
+        Return the file names of all nodes ignoring the index and temporary files
+        """
+        return [file_base_name
+                for file_base_name in os.listdir(self._path)
+                if file_base_name.isdigit()]
+
     def _discover_nodes(self):
         """
         Discover nodes already found in the database
+
+        Two processes may have added the same key, the most recently
+        written node is used and the others are removed. Must be called
+        while holding the lock
         """
         keys_to_nodes = {}
-        for file_base_name in os.listdir(self._path):
-            key = self._read_key(join(self._path, file_base_name))
-            assert key not in keys_to_nodes  # Two nodes contains the same key
-            keys_to_nodes[key] = int(file_base_name)
+        write_times = {}
+        for file_base_name in self._node_file_base_names():
+            file_name = join(self._path, file_base_name)
+            key = self._read_key(file_name)
+            node = int(file_base_name)
+            write_time = (_mtime(file_name), node)
+
+            if key in keys_to_nodes:
+                if write_time < write_times[key]:
+                    os.remove(file_name)
+                    continue
+                os.remove(join(self._path, str(keys_to_nodes[key])))
+
+            keys_to_nodes[key] = node
+            write_times[key] = write_time
         return keys_to_nodes
 
+    def _read_index(self):
+        """
+        Read the persisted index mapping keys to nodes
+
+        The index is written with the same modification time as the
+        directory. Writing or removing a node changes the modification
+        time of the directory. Returns None when the index is missing or
+        not valid
+        """
+        index_file_name = join(self._path, self._index_file_base_name)
+        if not exists(index_file_name):
+            return None
+
+        if _mtime(index_file_name) != _mtime(self._path):
+            return None
+
+        try:
+            with io.open(index_file_name, "rb") as fptr:
+                keys_to_nodes = pickle.load(fptr)
+        except KeyboardInterrupt:
+            raise KeyboardInterrupt
+        except:  # pylint: disable=bare-except
+            LOGGER.debug("Ignoring unreadable index %s", index_file_name)
+            return None
+
+        node_file_base_names = set(self._node_file_base_names())
+        if set(str(node) for node in keys_to_nodes.values()) != node_file_base_names:
+            return None
+
+        return keys_to_nodes
+
+    def flush(self):
+        """
+        Persist the index if nodes were written since it was read
+        """
+        if not self._index_is_stale:
+            return
+
+        index_file_name = join(self._path, self._index_file_base_name)
+        tmp_file_name = "%s.%i.tmp" % (index_file_name, os.getpid())
+        with self._lock():
+            with io.open(tmp_file_name, "wb") as fptr:
+                pickle.dump(self._keys_to_nodes, fptr, protocol=pickle.HIGHEST_PROTOCOL)
+            _replace_file(tmp_file_name, index_file_name)
+            _set_mtime(index_file_name, _mtime(self._path))
+        self._index_is_stale = False
+
     @staticmethod
     def _read_key_from_fptr(fptr):
         """
@@ -77,24 +183,33 @@ class DataBase(object):
         with io.open(file_name, "rb") as fptr:
             return self._read_key_from_fptr(fptr)
 
-    def _read_data(self, file_name):
+    def _read_data(self, file_name, key):
         """
-        Read key found in file_name
+        Read the data of key found in file_name
+
+        Returns None if the node was removed or now holds another key
         """
-        with io.open(file_name, "rb") as fptr:
-            self._read_key_from_fptr(fptr)
-            data = fptr.read()
-        return data
+        try:
+            with io.open(file_name, "rb") as fptr:
+                if self._read_key_from_fptr(fptr) != key:
+                    return None
+                return fptr.read()
+        except (IOError, OSError):
+            if exists(file_name):
+                raise
+            return None
 
     @staticmethod
     def _write_node(file_name, key, value):
         """
-        Write node to file
+        Write node to file through a temporary file which is renamed
         """
-        with io.open(file_name, "wb") as fptr:
+        tmp_file_name = "%s.%i.tmp" % (file_name, os.getpid())
+        with io.open(tmp_file_name, "wb") as fptr:
             fptr.write(struct.pack("I", len(key)))
             fptr.write(key)
             fptr.write(value)
+        _replace_file(tmp_file_name, file_name)
 
     def _to_file_name(self, key):
         """
@@ -104,40 +219,675 @@ class DataBase(object):
 
     def _allocate_node_for_key(self, key):
         """
-        Allocate a node index for a new key
+        Allocate a node index for a new key skipping nodes added by other processes
+
+        Must be called while holding the lock until the node has been written
         """
         assert key not in self._keys_to_nodes
+        while exists(join(self._path, str(self._next_node))):
+            self._next_node += 1
         self._keys_to_nodes[key] = self._next_node
         self._next_node += 1
+        self._index_is_stale = True
 
     def __setitem__(self, key, value):
-        if key not in self._keys_to_nodes:
+        if key in self._keys_to_nodes:
+            self._write_node(self._to_file_name(key), key, value)
+            # Renaming the node changes the modification time of the directory
+            self._index_is_stale = True
+            return
+
+        with self._lock():
             self._allocate_node_for_key(key)
-        self._write_node(self._to_file_name(key), key, value)
+            self._write_node(self._to_file_name(key), key, value)
 
     def __getitem__(self, key):
         if key not in self:
             raise KeyError(key)
 
-        return self._read_data(self._to_file_name(key))
+        data = self._read_data(self._to_file_name(key), key)
+        if data is None:
+            # Removed by another process
+            del self._keys_to_nodes[key]
+            self._index_is_stale = True
+            raise KeyError(key)
+        return data
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+
+        file_name = self._to_file_name(key)
+        with self._lock():
+            if exists(file_name):
+                os.remove(file_name)
+        del self._keys_to_nodes[key]
+        self._index_is_stale = True
 
     def __contains__(self, key):
         return key in self._keys_to_nodes
 
+    def keys(self):
+        return list(self._keys_to_nodes.keys())
+
+    @property
+    def size(self):
+        """
+        The total size of the node files in bytes
+        """
+        return sum(os.path.getsize(join(self._path, file_base_name))
+                   for file_base_name in self._node_file_base_names())
+
+    def compact(self):
+        """
+        Removed nodes are deleted directly so compaction only persists the index
+        """
+        self.flush()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes, every node is written directly so there is nothing to group
+        """
+        yield
+
+
+class LogDataBase(object):
+    """
+    A single file log structured database
+    both keys and values are bytes
+
+    The database consists of a single file where every write is
+    appended as a record. Each record contains four bytes denoting the
+    key length and four bytes denoting the value length as unsigned
+    integers followed by the key followed by the value.
+
+    The index mapping keys to the offset of their latest record is
+    rebuilt when opening the database by reading only the record
+    headers and keys. Overwritten records are garbage which is removed
+    by rewriting the file when it exceeds the compaction threshold.
+
+    The database is not safe for several processes writing at the same time.
+    """
+
+    _header = struct.Struct("II")
+
+    # Value size of a record marking the key as deleted
+    _deleted = 0xFFFFFFFF
+
+    def __init__(self, file_name, new=False, garbage_threshold=0.5, min_garbage_size=1024 * 1024):
+        """
+        Create database in file_name
+        - file_name is a file
+        - new create new database
+        - garbage_threshold is the fraction of the file size which may be garbage before compacting
+        - min_garbage_size is the number of garbage bytes always tolerated without compacting
+        """
+        self._file_name = file_name
+        self._garbage_threshold = garbage_threshold
+        self._min_garbage_size = min_garbage_size
+
+        directory = os.path.dirname(file_name)
+        if directory != "" and not exists(directory):
+            os.makedirs(directory)
+
+        if new or not exists(file_name):
+            io.open(file_name, "wb").close()
+
+        # Map keys to (offset, size) of the value within the file
+        self._index = {}
+        self._garbage_size = 0
+        self._fptr = io.open(file_name, "r+b")
+        self._read_index()
+
+        if self._needs_compaction():
+            self.compact()
+
+    def _read_index(self):
+        """
+        Read the index from the record headers and keys of the file
+
+        A partially written record at the end of the file, as left by an
+        interrupted write, is truncated
+        """
+        fptr = self._fptr
+        fptr.seek(0, os.SEEK_END)
+        file_size = fptr.tell()
+        fptr.seek(0)
+        offset = 0
+        while offset < file_size:
+            header = fptr.read(self._header.size)
+            if len(header) != self._header.size:
+                break
+            key_size, value_size = self._header.unpack(header)
+            value_offset = offset + self._header.size + key_size
+            deleted = value_size == self._deleted
+            if deleted:
+                value_size = 0
+            if value_offset + value_size > file_size:
+                break
+            key = fptr.read(key_size)
+            if key in self._index:
+                self._garbage_size += self._record_size(key, self._index[key][1])
+            if deleted:
+                self._garbage_size += self._record_size(key, 0)
+                self._index.pop(key, None)
+            else:
+                self._index[key] = (value_offset, value_size)
+            offset = value_offset + value_size
+            fptr.seek(offset)
+
+        if offset != file_size:
+            LOGGER.warning("Truncating incomplete record at the end of %s", self._file_name)
+            fptr.truncate(offset)
+
+    def _record_size(self, key, value_size):
+        return self._header.size + len(key) + value_size
+
+    def _needs_compaction(self):
+        """
+        Return True if the garbage exceeds the threshold
+        """
+        if self._garbage_size <= self._min_garbage_size:
+            return False
+        return self._garbage_size > self._garbage_threshold * self.size
+
+    @property
+    def size(self):
+        """
+        The size of the database file in bytes
+        """
+        self._fptr.seek(0, os.SEEK_END)
+        return self._fptr.tell()
+
+    def compact(self):
+        """
+        Rewrite the file keeping only the latest record of every key
+        """
+        tmp_file_name = self._file_name + ".tmp"
+        index = {}
+        with io.open(tmp_file_name, "wb") as fptr:
+            for key, (offset, size) in self._index.items():
+                fptr.write(self._header.pack(len(key), size))
+                fptr.write(key)
+                index[key] = (fptr.tell(), size)
+                self._fptr.seek(offset)
+                fptr.write(self._fptr.read(size))
+
+        self._fptr.close()
+        _replace_file(tmp_file_name, self._file_name)
+        self._fptr = io.open(self._file_name, "r+b")
+        self._index = index
+        self._garbage_size = 0
+
+    def __setitem__(self, key, value):
+        fptr = self._fptr
+        fptr.seek(0, os.SEEK_END)
+        offset = fptr.tell()
+        fptr.write(self._header.pack(len(key), len(value)))
+        fptr.write(key)
+        fptr.write(value)
+
+        if key in self._index:
+            self._garbage_size += self._record_size(key, self._index[key][1])
+        self._index[key] = (offset + self._header.size + len(key), len(value))
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+
+        fptr = self._fptr
+        fptr.seek(0, os.SEEK_END)
+        fptr.write(self._header.pack(len(key), self._deleted))
+        fptr.write(key)
+
+        self._garbage_size += self._record_size(key, self._index[key][1]) + self._record_size(key, 0)
+        del self._index[key]
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+
+        offset, size = self._index[key]
+        self._fptr.seek(offset)
+        return self._fptr.read(size)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def keys(self):
+        return list(self._index.keys())
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes, the appended records are flushed to the file at the end
+        """
+        yield
+        self.flush()
+
+    def flush(self):
+        self._fptr.flush()
+
+    def close(self):
+        self._fptr.close()
+
+
+class SqliteDataBase(object):
+    """
+    A SQLite file based database
+    both keys and values are bytes
+
+    The database is opened in write-ahead logging mode such that readers
+    do not block writers which lets several processes share it. Writes
+    made within a transaction are committed together instead of one at a
+    time. The write lock is only taken at the first write of a transaction
+    such that other processes are not blocked while nothing is written.
+    """
+
+    def __init__(self, file_name, new=False, timeout=60.0):
+        """
+        Create database in file_name
+        - file_name is a file
+        - new create new database
+        - timeout is the number of seconds to wait for a lock held by another process
+        """
+        self._file_name = file_name
+        self._timeout = timeout
+
+        directory = os.path.dirname(file_name)
+        if directory != "" and not exists(directory):
+            os.makedirs(directory)
+
+        if new:
+            for suffix in ("", "-wal", "-shm"):
+                if exists(file_name + suffix):
+                    os.remove(file_name + suffix)
+
+        self._connection = sqlite3.connect(file_name, timeout=timeout, isolation_level=None)
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute("PRAGMA synchronous=NORMAL")
+        self._execute("CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, value BLOB NOT NULL)")
+        self._transaction_depth = 0
+        self._in_transaction = False
+
+    def _execute(self, *args):
+        """
+        Execute an SQL statement reporting a lock held by another process for too long
+        """
+        try:
+            return self._connection.execute(*args)
+        except sqlite3.OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            raise DataBaseLockTimeout("Timed out after %g seconds waiting for another process "
+                                      "to release the lock of %s" % (self._timeout, self._file_name))
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group all writes until the outermost transaction ends into a single SQLite transaction
+        """
+        self._transaction_depth += 1
+        try:
+            yield
+        finally:
+            # Every write is a complete entry so writes made before an exception are also kept
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0 and self._in_transaction:
+                self._in_transaction = False
+                self._execute("COMMIT")
+
+    def _begin_write(self):
+        """
+        Take the write lock at the first write within a transaction
+        """
+        if self._transaction_depth > 0 and not self._in_transaction:
+            self._execute("BEGIN IMMEDIATE")
+            self._in_transaction = True
+
+    def __setitem__(self, key, value):
+        self._begin_write()
+        self._execute("INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)",
+                      (sqlite3.Binary(key), sqlite3.Binary(value)))
+
+    def __getitem__(self, key):
+        row = self._execute("SELECT value FROM entries WHERE key = ?",
+                            (sqlite3.Binary(key),)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return bytes(row[0])
+
+    def __delitem__(self, key):
+        self._begin_write()
+        cursor = self._execute("DELETE FROM entries WHERE key = ?",
+                               (sqlite3.Binary(key),))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        row = self._execute("SELECT 1 FROM entries WHERE key = ?",
+                            (sqlite3.Binary(key),)).fetchone()
+        return row is not None
+
+    def keys(self):
+        return [bytes(row[0]) for row in self._execute("SELECT key FROM entries")]
+
+    def flush(self):
+        """
+        Every write outside of a transaction is committed directly so there is nothing to flush
+        """
+
+    @property
+    def size(self):
+        """
+        The size of the database file and its write-ahead log in bytes
+        """
+        return sum(os.path.getsize(self._file_name + suffix)
+                   for suffix in ("", "-wal")
+                   if exists(self._file_name + suffix))
 
-class PickledDataBase(object):
+    def compact(self):
+        """
+        Rewrite the database file without free pages and truncate the write-ahead log
+        """
+        self._execute("VACUUM")
+        self._execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        self._connection.close()
+
+
+class DataBaseLockTimeout(Exception):
+    """
+    Raised when another process holds the lock of a database for longer than the timeout
+    """
+
+
+@contextmanager
+def _file_lock(file_name):
+    """
+    Hold an exclusive advisory lock on file_name
+
+    Advisory locks are not available on Windows where this does nothing
+    """
+    if fcntl is None:
+        yield
+        return
+
+    with io.open(file_name, "ab") as fptr:
+        fcntl.flock(fptr.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fptr.fileno(), fcntl.LOCK_UN)
+
+
+def _mtime(path):
+    """
+    Return the modification time of path with the best available resolution
+    """
+    stat = os.stat(path)
+    return getattr(stat, "st_mtime_ns", stat.st_mtime)
+
+
+def _set_mtime(path, mtime):
+    """
+    Set the modification time of path as returned by _mtime
+    """
+    if isinstance(mtime, float):
+        # Python 2.7
+        os.utime(path, (mtime, mtime))
+    else:
+        os.utime(path, ns=(mtime, mtime))  # pylint: disable=unexpected-keyword-arg
+
+
+def _replace_file(src, dst):
+    """
+    Atomically replace dst with src where supported by the operating system
+    """
+    try:
+        os.replace(src, dst)  # pylint: disable=no-member
+    except AttributeError:
+        # Python 2.7
+        if os.name == "nt" and exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+# Map the name of a single file backend to its class and file name suffix
+_FILE_BACKENDS = {"log": (LogDataBase, ".log"),
+                  "sqlite": (SqliteDataBase, ".sqlite")}
+
+DATABASE_BACKENDS = ("nodes",) + tuple(sorted(_FILE_BACKENDS))
+
+
+def open_database(path, backend="nodes", new=False):
+    """
+    Open the byte based database of the backend stored at path
+
+    The nodes backend is stored as a directory at path while the single file
+    backends are stored at path with a backend specific suffix. When opening
+    a single file database which does not exist a node database found at path
+    is migrated into it and removed once all entries have been migrated.
+    """
+    if backend == "nodes":
+        return DataBase(path, new=new)
+
+    if backend not in _FILE_BACKENDS:
+        raise ValueError("Unknown database backend %r not one of %r" % (backend, DATABASE_BACKENDS))
+
+    database_class, suffix = _FILE_BACKENDS[backend]
+    file_name = path + suffix
+    migrate = not new and isdir(path) and not exists(file_name)
+    database = database_class(file_name, new=new)
+
+    if migrate:
+        LOGGER.info("Migrating %s to %s", path, file_name)
+        old_database = DataBase(path)
+        with database.transaction():
+            # DataBase has no items(), each value is read from its own node file
+            for key in old_database.keys():  # pylint: disable=consider-using-dict-items
+                database[key] = old_database[key]
+        shutil.rmtree(path)
+
+    return database
+
+
+class PickledDataBase(object):  # pylint: disable=too-many-instance-attributes
     """
     Wraps a byte based database (un)pickling the values
     Allowing storage of arbitrary Python objects
+
+    The most recently used values are kept in memory in their unpickled
+    form. Writes are buffered in memory and written to the byte based
+    database when evicted, when flushed or when the outermost transaction
+    ends. Stored values are shared with the caller and must not be
+    modified after being stored or read.
+
+    An evicted value is written together with the next least recently
+    used values in a short transaction of the byte based database such
+    that its lock is not held while adding files.
     """
-    def __init__(self, database):
+    def __init__(self, database, cache_size=1024, batch_size=64):
         self._database = database
+        self._cache_size = cache_size
+        self._batch_size = batch_size
+        self._cache = OrderedDict()
+        self._dirty = set()
+        self._touched = set()
+        self._transaction_depth = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def stats(self):
+        """
+        The number of cache hits, misses and evictions
+        """
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions}
+
+    def _insert(self, key, value):
+        """
+        Insert value as the most recently used and evict the least recently used values above the cache size
+        """
+        self._cache.pop(key, None)
+        self._cache[key] = value
+        while len(self._cache) > self._cache_size:
+            old_key, old_value = self._cache.popitem(last=False)
+            self.evictions += 1
+            if old_key in self._dirty:
+                self._dirty.remove(old_key)
+                self._write_batch(old_key, old_value)
+
+    def _write_batch(self, key, value):
+        """
+        Write the evicted value together with the dirty values among the
+        next least recently used values within one transaction
+        """
+        items = [(key, value)]
+        # The most recently used value is never part of the batch
+        for idx, other_key in enumerate(self._cache):
+            if idx >= min(self._batch_size, len(self._cache) - 1):
+                break
+            if other_key in self._dirty:
+                items.append((other_key, self._cache[other_key]))
+
+        with self._database.transaction():
+            for other_key, other_value in items:
+                self._dirty.discard(other_key)
+                self._write(other_key, other_value)
+
+    def _write(self, key, value):
+        self._database[key] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
 
     def __getitem__(self, key):
-        return pickle.loads(self._database[key])
+        self._touched.add(key)
+        if key in self._cache:
+            self.hits += 1
+            value = self._cache[key]
+        else:
+            self.misses += 1
+            value = pickle.loads(self._database[key])
+        self._insert(key, value)
+        return value
 
     def __setitem__(self, key, value):
-        self._database[key] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._touched.add(key)
+        self._dirty.add(key)
+        self._insert(key, value)
+
+    def __delitem__(self, key):
+        if key not in self._cache and key not in self._database:
+            raise KeyError(key)
+
+        self._touched.discard(key)
+        self._dirty.discard(key)
+        self._cache.pop(key, None)
+        if key in self._database:
+            del self._database[key]
 
     def __contains__(self, key):
-        return key in self._database
+        if key in self._cache:
+            return True
+
+        if key not in self._database:
+            return False
+
+        # Read the value directly since another process sharing the byte
+        # based database may remove it before it is read
+        try:
+            data = self._database[key]
+        except KeyError:
+            return False
+        self.misses += 1
+        self._insert(key, pickle.loads(data))
+        return True
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes and flush when the outermost transaction ends
+
+        The byte based database is only locked while writing a batch of
+        evicted values or flushing. The buffered values are also flushed
+        when an exception is raised such that the byte based database is
+        not left with only the evicted values
+        """
+        self._transaction_depth += 1
+        try:
+            yield
+        finally:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.flush()
+
+    def flush(self):
+        """
+        Write all buffered values to the byte based database
+        """
+        with self._database.transaction():
+            for key in self._dirty:
+                self._write(key, self._cache[key])
+        self._dirty = set()
+        self._database.flush()
+
+    def touch(self, key):
+        """
+        Mark key as used such that it is kept by collect_garbage without reading it
+        """
+        self._touched.add(key)
+
+    def collect_garbage(self, keep=()):
+        """
+        Remove all entries neither read nor written since the database was opened
+        except the keys in keep. Returns the number of removed entries
+        """
+        self.flush()
+        keep = set(keep)
+        stale_keys = [key for key in self._database.keys()
+                      if key not in self._touched and key not in keep]
+        with self._database.transaction():
+            for key in stale_keys:
+                del self._database[key]
+        self._database.flush()
+        return len(stale_keys)
+
+    @property
+    def size(self):
+        return self._database.size
+
+    def compact(self):
+        self.flush()
+        self._database.compact()
+
+
+def touch(database, key):
+    """
+    Mark key as used in database if it supports garbage collection
+    """
+    if hasattr(database, "touch"):
+        database.touch(key)
+
+
+def lookup(database, key):
+    """
+    Returns the value of key in database or None when missing
+
+    A value pickled with another version of its class, such as a parse
+    result of an older VUnit, is removed and treated as missing
+    """
+    try:
+        if key in database:
+            return database[key]
+    except pickle.UnpicklingError:
+        LOGGER.debug("Removing %r pickled with another version", key)
+        try:
+            del database[key]
+        except KeyError:
+            # Removed by another process
+            pass
+    return None
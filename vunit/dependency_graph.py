@@ -59,34 +59,39 @@ class DependencyGraph(object):
         """
         Follow graph edges starting from the nodes iteratively
         returning all the nodes visited
-        """
-        def visit(node):
-            """
-            Visit a single node and all following nodes in the graph
-            that have not already been visisted.
-            Detects circular dependencies
-            """
-            if node in path:
-                start = path_ordered.index(node)
-                raise CircularDependencyException(path_ordered[start:] + [node, ])
-
-            path.add(node)
-            path_ordered.append(node)
-            if node in graph:
-                for other_node in graph[node]:
-                    if other_node not in visited:
-                        visit(other_node)
-            path.remove(node)
-            path_ordered.pop()
-            visited.add(node)
-            callback(node)
 
+        The nodes are visited depth first in the same order as a
+        recursive traversal would but using an explicit stack to not
+        be limited by the recursion depth on long dependency chains.
+        Detects circular dependencies
+        """
         visited = set()
         for node in nodes:
-            if node not in visited:
-                path = set()
-                path_ordered = []
-                visit(node)
+            if node in visited:
+                continue
+
+            path = set([node])
+            path_ordered = [node]
+            stack = [iter(graph.get(node, ()))]
+            while stack:
+                for other_node in stack[-1]:
+                    if other_node in visited:
+                        continue
+
+                    if other_node in path:
+                        start = path_ordered.index(other_node)
+                        raise CircularDependencyException(path_ordered[start:] + [other_node, ])
+
+                    path.add(other_node)
+                    path_ordered.append(other_node)
+                    stack.append(iter(graph.get(other_node, ())))
+                    break
+                else:
+                    stack.pop()
+                    visited_node = path_ordered.pop()
+                    path.remove(visited_node)
+                    visited.add(visited_node)
+                    callback(visited_node)
 
     def get_dependent(self, nodes):
         """
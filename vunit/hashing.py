@@ -9,10 +9,76 @@ Wrapper arround selected hash method
 """
 
 import hashlib
+import io
+import os
 
 
 def hash_string(string):
     """
     returns hash of bytes
+
+    Always SHA-1 since the hash is part of file and directory names
     """
     return hashlib.sha1(string.encode(encoding="utf-8")).hexdigest()
+
+
+def _select_hash_algorithm():
+    """
+    Select the algorithm used to hash file contents, either from the
+    VUNIT_HASH_ALGORITHM environment variable or the fastest available
+    """
+    environ_name = "VUNIT_HASH_ALGORITHM"
+    if environ_name in os.environ:
+        algorithm = os.environ[environ_name]
+        try:
+            hashlib.new(algorithm)
+        except ValueError:
+            raise RuntimeError(
+                ("Hash algorithm from " + environ_name + " environment variable %r is not supported. "
+                 "Supported algorithms are %r")
+                % (algorithm, sorted(hashlib.algorithms_available)))
+        return algorithm
+
+    if hasattr(hashlib, "blake2b"):
+        return "blake2b"
+
+    # Python 2.7
+    return "sha1"
+
+
+HASH_ALGORITHM = _select_hash_algorithm()
+
+
+def new_hash():
+    """
+    Returns a new hash object of the selected algorithm
+    """
+    if HASH_ALGORITHM == "blake2b":
+        # Same digest size as SHA-1
+        return hashlib.blake2b(digest_size=20)  # pylint: disable=no-member
+    return hashlib.new(HASH_ALGORITHM)
+
+
+def hash_bytes(data):
+    """
+    returns hash of bytes using the selected algorithm
+    """
+    hasher = new_hash()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def hash_file(file_name, chunk_size=1024 * 1024):
+    """
+    returns hash of the raw bytes of file_name using the selected algorithm
+
+    The file is read in chunks such that large files are never held in memory
+    """
+    hasher = new_hash()
+    with io.open(file_name, "rb") as fptr:
+        while True:
+            chunk = fptr.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
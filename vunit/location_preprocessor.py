@@ -11,6 +11,8 @@ to enable better messages
 
 
 import re
+import bisect
+from vunit.parsing.comments import get_line_offsets
 
 
 class LocationPreprocessor(object):
@@ -88,13 +90,15 @@ class LocationPreprocessor(object):
         matches = list(potential_subprogram_call_with_arguments_pattern.finditer(code))
         if self._subprograms_without_arguments:
             matches += list(potential_subprogram_call_without_arguments_pattern.finditer(code))
+
+        line_offsets = get_line_offsets(code)
         matches.sort(key=lambda match: match.start('subprogram'), reverse=True)
 
         for match in matches:
             if self._subprogram_declaration_start_backwards_pattern.match(code[match.start():0:-1]):
                 continue
             file_name_association = ', file_name => "' + file_name + '"'
-            line_num_association = ', line_num => ' + str(1 + code[:match.start('subprogram')].count('\n'))
+            line_num_association = ', line_num => ' + str(bisect.bisect(line_offsets, match.start('subprogram')))
             if 'args' in match.groupdict():
                 closing_paranthesis_start = self._find_closing_parenthesis(code[match.start('args'):])
 
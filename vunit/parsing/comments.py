@@ -0,0 +1,115 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
+
+"""
+Removal of comments shared by the parsers and test scanners
+"""
+
+import re
+import bisect
+from collections import OrderedDict
+
+
+class StrippedCode(object):
+    """
+    Code where comments have been replaced by whitespace
+
+    Newlines within comments are kept such that an offset or line number
+    in the stripped code is the same in the original code. The line
+    offsets are the offsets where each line starts.
+    """
+
+    def __init__(self, code, line_offsets):
+        self.code = code
+        self.line_offsets = line_offsets
+
+    def lineno(self, offset):
+        """
+        Returns the line number of the offset starting from 1
+        """
+        return bisect.bisect(self.line_offsets, offset)
+
+
+def get_line_offsets(code):
+    """
+    Returns a list with one entry per line returning the offset in the
+    code where it starts
+    """
+    if not code:
+        return []
+
+    offsets = [0]
+    offsets += [match.end() for match in _NEWLINE_RE.finditer(code, 0, len(code) - 1)]
+    return offsets
+
+
+_NEWLINE_RE = re.compile(r"\n")
+_NOT_NEWLINE_RE = re.compile(r"[^\n]")
+
+# Strings are matched to not treat comment delimiters within them as comments
+_VHDL_COMMENT_RE = re.compile(r"""
+    (?P<string>"(?:[^"\n]|"")*"|'[^\n]')
+    |
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    """, re.DOTALL | re.VERBOSE)
+
+_VERILOG_COMMENT_RE = re.compile(r"""
+    (?P<string>"(?:\\.|[^"\\\n])*")
+    |
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+    """, re.DOTALL | re.VERBOSE)
+
+
+def _comment_repl(match):
+    """
+    Replace comment with equal amount of whitespace to make
+    lexical position unaffected
+    """
+    if match.group("comment") is None:
+        return match.group(0)
+    return _NOT_NEWLINE_RE.sub(" ", match.group(0))
+
+
+class _StrippedCodeCache(object):
+    """
+    Keeps the most recently stripped code such that the same contents
+    are only stripped once when read by several parsers and scanners
+    """
+
+    def __init__(self, size=32):
+        self._size = size
+        self._cache = OrderedDict()
+
+    def get(self, regex, code):
+        """
+        Returns the StrippedCode of code using the comment regex
+        """
+        key = (regex.pattern, code)
+        stripped = self._cache.pop(key, None)
+        if stripped is None:
+            stripped_code = regex.sub(_comment_repl, code)
+            stripped = StrippedCode(stripped_code, get_line_offsets(stripped_code))
+            if len(self._cache) >= self._size:
+                self._cache.popitem(last=False)
+        self._cache[key] = stripped
+        return stripped
+
+
+_CACHE = _StrippedCodeCache()
+
+
+def strip_vhdl_comments(code):
+    """
+    Returns the StrippedCode of VHDL code
+    """
+    return _CACHE.get(_VHDL_COMMENT_RE, code)
+
+
+def strip_verilog_comments(code):
+    """
+    Returns the StrippedCode of Verilog code
+    """
+    return _CACHE.get(_VERILOG_COMMENT_RE, code)
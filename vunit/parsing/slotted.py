@@ -0,0 +1,77 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
+
+"""
+Compact base class of parse results stored in the project database
+"""
+
+import pickle
+
+
+class Slotted(object):
+    """
+    Base class of parse results stored in the project database
+
+    The attributes are kept in __slots__ instead of a __dict__ and are
+    pickled as a tuple of their values together with the pickle version
+    of the class. The pickle version must be increased when the slots
+    of the class change. Slots in _transient_slots are pickled as None.
+    """
+    __slots__ = ()
+    _pickle_version = 1
+    _transient_slots = ()
+
+    def __reduce__(self):
+        cls = type(self)
+        values = tuple(None if name in cls._transient_slots else getattr(self, name)
+                       for name in _slot_names(cls))
+        state = getattr(self, "__dict__", None)
+        if state:
+            return (_unpickle, (cls, cls._pickle_version, values), state)
+        return (_unpickle, (cls, cls._pickle_version, values))
+
+
+def pickle_versions():
+    """
+    Returns the sorted names and pickle versions of all subclasses of Slotted
+    """
+    versions = []
+    classes = list(Slotted.__subclasses__())
+    while classes:
+        cls = classes.pop()
+        name = "%s.%s" % (cls.__module__, cls.__name__)
+        versions.append((name, cls._pickle_version))  # pylint: disable=protected-access
+        classes += cls.__subclasses__()
+    return tuple(sorted(versions))
+
+
+_SLOT_NAMES = {}
+
+
+def _slot_names(cls):
+    """
+    Returns the names of the slots of cls and its base classes
+    """
+    if cls not in _SLOT_NAMES:
+        names = []
+        for base in reversed(cls.__mro__):
+            names += [name for name in base.__dict__.get("__slots__", ()) if name not in ("__dict__", "__weakref__")]
+        _SLOT_NAMES[cls] = tuple(names)
+    return _SLOT_NAMES[cls]
+
+
+def _unpickle(cls, version, values):
+    """
+    Re-create an instance of cls from the pickled slot values
+    """
+    if version != cls._pickle_version:  # pylint: disable=protected-access
+        raise pickle.UnpicklingError("%s was pickled with version %i but version %i is required"
+                                     % (cls.__name__, version, cls._pickle_version))  # pylint: disable=protected-access
+
+    obj = cls.__new__(cls)
+    for name, value in zip(_slot_names(cls), values):
+        setattr(obj, name, value)
+    return obj
@@ -13,6 +13,8 @@ import re
 from vunit.ostools import read_file, file_exists, simplify_path
 
 TokenType = collections.namedtuple("Token", ["kind", "value", "location"])
+# The name Token refers to the function below so pickle using it
+TokenType.__reduce__ = lambda self: (Token, tuple(self))
 
 
 def Token(kind, value="", location=None):  # pylint: disable=invalid-name
@@ -22,6 +24,9 @@ def Token(kind, value="", location=None):  # pylint: disable=invalid-name
 def new_token_kind(name):
     """
     Create a new token kind with nice __repr__
+
+    The token kind is pickled by reference using a key which is unique
+    among all token kinds such that unpickled tokens have the same kind
     """
 
     def new_token(kind, value='', location=None):
@@ -30,12 +35,28 @@ def new_token_kind(name):
         """
         return Token(kind, value, location)
 
+    key = name
+    count = 1
+    while key in _TOKEN_KINDS:
+        count += 1
+        key = "%s#%i" % (name, count)
+
     cls = type(name,
                (object,), {
                    "__repr__": lambda self: name,
-                   "__call__": new_token
+                   "__call__": new_token,
+                   "__reduce__": lambda self: (_get_token_kind, (key,))
                })
-    return cls()
+    kind = cls()
+    _TOKEN_KINDS[key] = kind
+    return kind
+
+
+_TOKEN_KINDS = {}
+
+
+def _get_token_kind(key):
+    return _TOKEN_KINDS[key]
 
 
 class Tokenizer(object):
@@ -48,13 +69,16 @@ class Tokenizer(object):
         self._assoc = {}
         self._regex = None
 
-    def add(self, kind, regex, func=None):
+    def add(self, kind, regex, func=None, ignore=False):
         """
         Add token type
+
+        func -- Function called with each token returning the token to keep or None
+        ignore -- Skip tokens of this type without creating them
         """
         key = chr(ord('a') + len(self._regexs))
         self._regexs.append((key, regex))
-        self._assoc[key] = (kind, func)
+        self._assoc[key] = (kind, func, ignore)
         return kind
 
     def finalize(self):
@@ -63,29 +87,31 @@ class Tokenizer(object):
     def tokenize(self, code, file_name=None, previous_location=None, create_locations=False):
         """
         Tokenize the code
+
+        The location of a token starts where the previous token ended
         """
         tokens = []
+        append = tokens.append
         start = 0
-        while True:
-            match = self._regex.search(code, pos=start)
-            if match is None:
-                break
-            lexpos = (start, match.end() - 1)
-            start = match.end()
-            kind, func = self._assoc[match.lastgroup]
-            value = match.group(match.lastgroup)
+        for match in self._regex.finditer(code):
+            end = match.end()
+            kind, func, ignore = self._assoc[match.lastgroup]
+            if ignore:
+                start = end
+                continue
 
             if create_locations:
-                location = ((file_name, lexpos), previous_location)
+                location = ((file_name, (start, end - 1)), previous_location)
             else:
                 location = None
+            start = end
 
-            token = Token(kind, value, location)
+            token = TokenType(kind, match.group(), location)
             if func is not None:
                 token = func(token)
 
             if token is not None:
-                tokens.append(token)
+                append(token)
         return tokens
 
 
@@ -238,6 +264,10 @@ class LocationException(Exception):
         self._message = message
         self._location = location
 
+    @property
+    def severity(self):
+        return self._severtity
+
     def log(self, logger):
         """
         Log the exception
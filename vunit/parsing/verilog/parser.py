@@ -12,42 +12,102 @@ Verilog parsing functionality
 """
 
 import logging
-from os.path import dirname, exists, abspath
+import copy
+from os.path import dirname, abspath
 from vunit.ostools import read_file
 from vunit.parsing.encodings import HDL_FILE_ENCODING
 from vunit.parsing.tokenizer import TokenStream, EOFException, LocationException
 from vunit.parsing.verilog.tokenizer import VerilogTokenizer
-from vunit.parsing.verilog.preprocess import VerilogPreprocessor, find_included_file, Macro
+from vunit.parsing.verilog.preprocess import (VerilogPreprocessor, TokenCache, IncludeCache,
+                                              IncludeResolver, Macro)
 from vunit.parsing.verilog.tokens import *
-from vunit.cached import file_content_hash
+from vunit.parsing.slotted import Slotted
+from vunit.cached import file_content_hash, shared_content_key
+from vunit.database import lookup
+from vunit.hashing import hash_string
+from vunit.cache_statistics import CACHE_STATISTICS
 
 LOGGER = logging.getLogger(__name__)
 
 
-class VerilogParser(object):
+class VerilogParser(object):  # pylint: disable=too-many-instance-attributes
     """
     Parse a single Verilog file
     """
 
-    def __init__(self, database=None):
+    def __init__(self, database=None, shared_database=None, dependencies_only=False):
+        """
+        dependencies_only -- Only extract the module parameters of test benches, see VerilogDesignFile.parse
+        """
+        self._dependencies_only = dependencies_only
         self._tokenizer = VerilogTokenizer()
-        self._preprocessor = VerilogPreprocessor(self._tokenizer)
+        self._include_resolver = IncludeResolver()
+        self._token_cache = TokenCache(self._tokenizer,
+                                       database=database,
+                                       content_hash=self._content_hash)
+        self._include_cache = IncludeCache(self._content_hash,
+                                           database=database,
+                                           include_resolver=self._include_resolver)
+        self._preprocessor = VerilogPreprocessor(self._tokenizer,
+                                                 self._token_cache,
+                                                 self._include_cache,
+                                                 self._include_resolver)
         self._database = database
+        self._shared_database = shared_database
         self._content_cache = {}
+        self._checked_included_files = set()
+        self._dependents = {}
 
     def parse(self, file_name, include_paths=None, defines=None):
         """
         Parse verilog code
         """
+        with CACHE_STATISTICS.timed("VerilogParser.parse"):
+            return self._parse(file_name, include_paths, defines)
 
+    @staticmethod
+    def _normalize(file_name, include_paths, defines):
+        """
+        Returns the include paths and defines used when parsing file_name
+        """
         defines = {} if defines is None else defines
         include_paths = [] if include_paths is None else include_paths
         include_paths = [dirname(file_name)] + include_paths
+        return include_paths, defines
+
+    def _parse(self, file_name, include_paths, defines):
+        """
+        Parse verilog code unless found in the cache
+        """
+        include_paths, defines = self._normalize(file_name, include_paths, defines)
 
         cached = self._lookup_parse_cache(file_name, include_paths, defines)
         if cached is not None:
+            CACHE_STATISTICS.count("VerilogParser.parse", "hits")
             return cached
 
+        shared = self._lookup_shared_cache(file_name, include_paths, defines)
+        if shared is not None:
+            CACHE_STATISTICS.count("VerilogParser.parse", "shared_hits")
+            result, included_files = shared
+            self._store_result(file_name, result, included_files, defines)
+            return result
+
+        CACHE_STATISTICS.count("VerilogParser.parse", "misses")
+
+        result, included_files = self._parse_without_cache(file_name, include_paths, defines)
+
+        if self._database is None:
+            return result
+
+        self._store_result(file_name, result, included_files, defines)
+        self._store_shared_result(file_name, result, included_files, defines)
+        return result
+
+    def _parse_without_cache(self, file_name, include_paths, defines):
+        """
+        Parse verilog code and return the result and the included files
+        """
         initial_defines = dict((key, Macro(key, self._tokenizer.tokenize(value)))
                                for key, value in defines.items())
         code = read_file(file_name, encoding=HDL_FILE_ENCODING)
@@ -59,19 +119,43 @@ class VerilogParser(object):
                                                   included_files=included_files)
 
         included_files_for_design_file = [name for _, name in included_files if name is not None]
-        result = VerilogDesignFile.parse(pp_tokens, included_files_for_design_file)
+        result = VerilogDesignFile.parse(pp_tokens, included_files_for_design_file,
+                                         dependencies_only=self._dependencies_only)
+        return result, included_files
 
-        if self._database is None:
-            return result
+    def parse_without_cache(self, file_name, include_paths=None, defines=None):
+        """
+        Parse verilog code without using any database
+
+        Returns the result and the included files to be stored using store
+        """
+        include_paths, defines = self._normalize(file_name, include_paths, defines)
+        return self._parse_without_cache(file_name, include_paths, defines)
 
+    def is_cached(self, file_name, include_paths=None, defines=None):
+        """
+        Returns True if parse would re-use a result from the database
+        """
+        include_paths, defines = self._normalize(file_name, include_paths, defines)
+        return (self._lookup_parse_cache(file_name, include_paths, defines) is not None
+                or self._lookup_shared_cache(file_name, include_paths, defines) is not None)
+
+    def store(self, file_name, defines, result, included_files):
+        """
+        Store the result of parse_file from another process into the database
+        """
+        _, defines = self._normalize(file_name, None, defines)
+        CACHE_STATISTICS.count("VerilogParser.parse", "misses")
         self._store_result(file_name, result, included_files, defines)
-        return result
+        self._store_shared_result(file_name, result, included_files, defines)
 
-    @staticmethod
-    def _key(file_name):
+    def _key(self, file_name, dependencies_only=None):
         """
         Returns the database key for parse results of file_name
         """
+        dependencies_only = self._dependencies_only if dependencies_only is None else dependencies_only
+        if dependencies_only:
+            return ("CachedVerilogParser.parse_dependencies(%s)" % abspath(file_name)).encode()
         return ("CachedVerilogParser.parse(%s)" % abspath(file_name)).encode()
 
     def _store_result(self, file_name, result, included_files, defines):
@@ -80,20 +164,145 @@ class VerilogParser(object):
         """
         new_included_files = [(short_name, full_name, self._content_hash(full_name))
                               for short_name, full_name in included_files]
+        for _, included_file_name, content_hash in new_included_files:
+            if included_file_name is not None:
+                self._add_dependent(included_file_name, content_hash, abspath(file_name))
+
         key = self._key(file_name)
         self._database[key] = self._content_hash(file_name), new_included_files, defines, result
         return result
 
+    @staticmethod
+    def _dependents_key(included_file_name):
+        """
+        Returns the database key of the files including included_file_name
+        """
+        return ("VerilogParser.dependents(%s)" % included_file_name).encode()
+
+    def _get_dependents(self, included_file_name):
+        """
+        Returns the content hash of included_file_name when last checked
+        and the set of files including it
+        """
+        if included_file_name not in self._dependents:
+            key = self._dependents_key(included_file_name)
+            if key in self._database:
+                content_hash, dependents = self._database[key]
+                # Copied since the set is modified and stored again
+                self._dependents[included_file_name] = [content_hash, set(dependents)]
+            else:
+                self._dependents[included_file_name] = [None, set()]
+        return self._dependents[included_file_name]
+
+    def _add_dependent(self, included_file_name, content_hash, file_name):
+        """
+        Add file_name to the files including included_file_name
+        """
+        value = self._get_dependents(included_file_name)
+        if value[0] == content_hash and file_name in value[1]:
+            return
+
+        if value[0] != content_hash:
+            self._check_included_file(included_file_name)
+        value[1].add(file_name)
+        self._database[self._dependents_key(included_file_name)] = value
+
+    def _check_included_file(self, included_file_name):
+        """
+        Check the included file once per run and remove the parse results
+        of the files including it when it has changed since the last run.
+        Its cached tokens and include results are marked as used since
+        they are not read when the parse results are re-used
+        """
+        if included_file_name in self._checked_included_files:
+            return
+        self._checked_included_files.add(included_file_name)
+        self._token_cache.touch(included_file_name)
+        self._include_cache.touch(included_file_name)
+
+        value = self._get_dependents(included_file_name)
+        content_hash = self._content_hash(included_file_name)
+        if value[0] == content_hash:
+            return
+
+        for dependent in value[1]:
+            # The dependents are shared by the parse modes
+            for dependencies_only in (False, True):
+                key = self._key(dependent, dependencies_only)
+                if lookup(self._database, key) is not None:
+                    CACHE_STATISTICS.count("VerilogParser.parse", "invalidations")
+                    del self._database[key]
+
+        value[0] = content_hash
+        value[1] = set()
+        self._database[self._dependents_key(included_file_name)] = value
+
+    def _shared_key(self, file_name, defines):
+        """
+        Returns the shared database key for parse results of the contents of file_name
+        """
+        return shared_content_key("VerilogParser.parse_dependencies" if self._dependencies_only
+                                  else "VerilogParser.parse",
+                                  self._content_hash(file_name),
+                                  "defines=%s" % hash_string(repr(sorted(defines.items()))))
+
+    def _store_shared_result(self, file_name, result, included_files, defines):
+        """
+        Store parse result into the shared database
+        """
+        if self._shared_database is None:
+            return
+
+        new_included_files = [(short_name, full_name, self._content_hash(full_name))
+                              for short_name, full_name in included_files]
+        self._shared_database[self._shared_key(file_name, defines)] = new_included_files, result
+
+    def _lookup_shared_cache(self, file_name, include_paths, defines):
+        """
+        Use parse results of a file with the same contents from the shared database
+
+        Included files are resolved relative to the include paths of
+        file_name and must have the same contents as when parsed.
+        Returns the result and included files or None
+        """
+        if self._database is None or self._shared_database is None:
+            return None
+
+        value = lookup(self._shared_database, self._shared_key(file_name, defines))
+        if value is None:
+            return None
+
+        old_included_files, result = value
+        included_files = []
+        renamed = {}
+        for include_str, old_included_file_name, last_content_hash in old_included_files:
+            included_file_name = self._include_resolver.find(include_paths, include_str)
+            if last_content_hash != self._content_hash(included_file_name):
+                return None
+            included_files.append((include_str, included_file_name))
+            renamed[old_included_file_name] = included_file_name
+
+        # Copied since the shared result must not be modified
+        result = copy.copy(result)
+        result.included_files = [renamed.get(name, name) for name in result.included_files]
+        LOGGER.debug("Re-using shared Verilog parse results for %s", file_name)
+        return result, included_files
+
     def _content_hash(self, file_name):
         """
-        Hash the contents of the file
+        Hash the contents of the file once per run
+
+        The existence of the file is checked using the include resolver
+        which already knows about the included files it has found
         """
-        if file_name is None or not exists(file_name):
+        if file_name is None:
             return None
         if file_name not in self._content_cache:
-            self._content_cache[file_name] = file_content_hash(file_name,
-                                                               encoding=HDL_FILE_ENCODING,
-                                                               database=self._database)
+            if self._include_resolver.exists(abspath(file_name)):
+                self._content_cache[file_name] = file_content_hash(file_name,
+                                                                   database=self._database)
+            else:
+                self._content_cache[file_name] = None
         return self._content_cache[file_name]
 
     def _lookup_parse_cache(self, file_name, include_paths, defines):
@@ -106,10 +315,11 @@ class VerilogParser(object):
             return None
 
         key = self._key(file_name)
-        if key not in self._database:
+        value = lookup(self._database, key)
+        if value is None:
             return None
 
-        old_content_hash, old_included_files, old_defines, old_result = self._database[key]
+        old_content_hash, old_included_files, old_defines, old_result = value
         if old_defines != defines:
             return None
 
@@ -117,10 +327,18 @@ class VerilogParser(object):
             return None
 
         for include_str, included_file_name, last_content_hash in old_included_files:
+            if included_file_name is not None:
+                # Removes the cached result when the included file has changed
+                self._check_included_file(included_file_name)
+                if key not in self._database:
+                    return None
+
+            # Also compared since the dependents and the result are stored separately
+            # and may not both have been written when a run stopped
             if last_content_hash != self._content_hash(included_file_name):
                 return None
 
-            if find_included_file(include_paths, include_str) != included_file_name:
+            if self._include_resolver.find(include_paths, include_str) != included_file_name:
                 return None
 
         LOGGER.debug("Re-using cached Verilog parse results for %s", file_name)
@@ -128,10 +346,22 @@ class VerilogParser(object):
         return old_result
 
 
-class VerilogDesignFile(object):
+def parse_file(file_name, include_paths=None, defines=None, dependencies_only=False):
+    """
+    Parse the Verilog file without using any database
+
+    Returns the result and the included files
+    """
+    return VerilogParser(dependencies_only=dependencies_only).parse_without_cache(file_name, include_paths, defines)
+
+
+class VerilogDesignFile(Slotted):
     """
     Contains Verilog objecs found within a file
     """
+    __slots__ = ("modules", "packages", "imports", "package_references", "instances",
+                 "included_files")
+
     def __init__(self,  # pylint: disable=too-many-arguments
                  modules=None,
                  packages=None,
@@ -147,9 +377,15 @@ class VerilogDesignFile(object):
         self.included_files = [] if included_files is None else included_files
 
     @classmethod
-    def parse(cls, tokens, included_files):
+    def parse(cls, tokens, included_files, dependencies_only=False):
         """
         Parse verilog file
+
+        dependencies_only -- Only find what is needed for the compile
+                             order unless the file contains a test bench.
+                             The parameters of modules are only needed
+                             to find and configure test benches and are
+                             left empty in files without any runner_cfg.
         """
         tokens = [token
                   for token in tokens
@@ -157,7 +393,8 @@ class VerilogDesignFile(object):
                                         COMMENT,
                                         NEWLINE,
                                         MULTI_COMMENT)]
-        return cls(modules=VerilogModule.find(tokens),
+        find_parameters = not dependencies_only or any(token.value == "runner_cfg" for token in tokens)
+        return cls(modules=VerilogModule.find(tokens, find_parameters=find_parameters),
                    packages=VerilogPackage.find(tokens),
                    imports=cls.find_imports(tokens),
                    package_references=cls.find_package_references(tokens),
@@ -261,10 +498,11 @@ def _parse_block_label(stream):
         return
 
 
-class VerilogModule(object):
+class VerilogModule(Slotted):
     """
     A verilog module
     """
+    __slots__ = ("name", "parameters")
 
     def __init__(self, name, parameters):
         self.name = name
@@ -284,10 +522,15 @@ class VerilogModule(object):
         return tokens[idx + 1].value
 
     @classmethod
-    def find(cls, tokens):
+    def find(cls, tokens, find_parameters=True):
         """
         Find all modules within code, nested modules are ignored
+
+        find_parameters -- Find the parameters of the modules, otherwise they are empty
         """
+        if not find_parameters:
+            return cls._find_without_parameters(tokens)
+
         idx = 0
         name = None
         balance = 0
@@ -314,11 +557,33 @@ class VerilogModule(object):
             idx += 1
         return results
 
+    @classmethod
+    def _find_without_parameters(cls, tokens):
+        """
+        Find all modules within code without looking at their contents
+        """
+        name = None
+        balance = 0
+        results = []
+        for idx, token in enumerate(tokens):
+            kind = token.kind
+            if kind == MODULE:
+                if balance == 0:
+                    name = tokens[idx + 1].value
+                balance += 1
+
+            elif kind == ENDMODULE:
+                balance -= 1
+                if balance == 0:
+                    results.append(cls(name, []))
+        return results
+
 
-class VerilogPackage(object):
+class VerilogPackage(Slotted):
     """
     A verilog package
     """
+    __slots__ = ("name",)
 
     def __init__(self, name):
         self.name = name
@@ -6,11 +6,13 @@
 
 # pylint: disable=unused-wildcard-import
 # pylint: disable=wildcard-import
+# pylint: disable=too-many-lines
 
 """
 Verilog parsing functionality
 """
-from os.path import join, exists, abspath
+import os
+from os.path import join, exists, abspath, split, isdir
 import logging
 from vunit.parsing.tokenizer import (TokenStream,
                                      Token,
@@ -19,19 +21,31 @@ from vunit.parsing.tokenizer import (TokenStream,
                                      EOFException,
                                      LocationException)
 from vunit.parsing.verilog.tokens import *
+from vunit.parsing.slotted import Slotted
 from vunit.ostools import read_file
+from vunit.cached import file_content_hash
+from vunit.database import touch, lookup
+from vunit.hashing import hash_string
+from vunit.cache_statistics import CACHE_STATISTICS
 LOGGER = logging.getLogger(__name__)
 
 
-class VerilogPreprocessor(object):
+class VerilogPreprocessor(object):  # pylint: disable=too-many-instance-attributes
     """
     A Verilog preprocessor
     """
 
-    def __init__(self, tokenizer):
+    def __init__(self, tokenizer, token_cache=None, include_cache=None, include_resolver=None):
         self._tokenizer = tokenizer
+        self._token_cache = TokenCache(tokenizer) if token_cache is None else token_cache
+        self._include_resolver = IncludeResolver() if include_resolver is None else include_resolver
+        self._include_cache = (IncludeCache(content_hash=self._token_cache.content_hash,
+                                            include_resolver=self._include_resolver)
+                               if include_cache is None else include_cache)
         self._macro_trace = set()
         self._include_trace = set()
+        self._expansion_cache = MacroExpansionCache()
+        self._num_problems = 0
 
     def preprocess(self, tokens, defines=None, include_paths=None, included_files=None):
         """
@@ -39,57 +53,73 @@ class VerilogPreprocessor(object):
         """
         self._include_trace = set()
         self._macro_trace = set()
+        self._expansion_cache.clear()
         return self._preprocess(tokens, defines, include_paths, included_files)
 
-    def _preprocess(self, tokens, defines=None, include_paths=None, included_files=None):
+    def _preprocess(self,  # pylint: disable=too-many-arguments
+                    tokens, defines=None, include_paths=None, included_files=None, result=None):
         """
         Pre-process tokens while filling in defines
+
+        The tokens are appended to result such that nested macro
+        expansions and includes are written directly to the output
+        instead of to intermediate lists
         """
         stream = TokenStream(tokens)
         include_paths = [] if include_paths is None else include_paths
         included_files = [] if included_files is None else included_files
         defines = {} if defines is None else defines
-        result = []
+        result = [] if result is None else result
+        append = result.append
 
         while not stream.eof:
             token = stream.pop()
             if not token.kind == PREPROCESSOR:
-                result.append(token)
+                append(token)
                 continue
 
+            num_tokens = len(result)
             try:
-                result += self.preprocessor(token, stream, defines, include_paths, included_files)
+                self.preprocessor(token, stream, defines, include_paths, included_files, result)
             except LocationException as exc:
+                # Drop any partial output of the failing directive
+                del result[num_tokens:]
                 exc.log(LOGGER)
+                if exc.severity != "debug":
+                    self._num_problems += 1
 
         return result
 
     def preprocessor(self,  # pylint: disable=too-many-arguments,too-many-branches
-                     token, stream, defines, include_paths, included_files):
+                     token, stream, defines, include_paths, included_files, result):
         """
-        Handle preprocessor token
+        Handle preprocessor token appending any resulting tokens to result
         """
         if token.value == "define":
             macro = define(token, stream)
             if macro is not None:
                 defines[macro.name] = macro
+                self._expansion_cache.clear()
 
         elif token.value == "undef":
             undef(token, stream, defines)
+            self._expansion_cache.clear()
 
         elif token.value in ("undefineall", "resetall"):
             defines.clear()
+            self._expansion_cache.clear()
 
         elif token.value == "include":
-            return self.include(token, stream, include_paths, included_files, defines)
+            self.include(token, stream, include_paths, included_files, defines, result)
 
         elif token.value in ("ifdef", "ifndef"):
             try:
                 tokens = self.if_statement(token, stream, defines)
-                return self._preprocess(tokens,
-                                        defines=defines,
-                                        include_paths=include_paths,
-                                        included_files=included_files)
+                self._preprocess(tokens,
+                                 defines=defines,
+                                 include_paths=include_paths,
+                                 included_files=included_files,
+                                 result=result)
             except EOFException:
                 raise LocationException.warning(
                     "EOF reached when parsing `%s" % token.value,
@@ -115,14 +145,12 @@ class VerilogPreprocessor(object):
                     self._skip_protected_region(stream)
 
         elif token.value in defines:
-            return self.expand_macro(token, stream, defines, include_paths, included_files)
+            self.expand_macro(token, stream, defines, include_paths, included_files, result)
         else:
             raise LocationException.debug(
                 "Verilog undefined name",
                 token.location)
 
-        return []
-
     @staticmethod
     def _skip_protected_region(stream):
         """
@@ -147,9 +175,12 @@ Skipped
                         return
 
     def expand_macro(self,  # pylint: disable=too-many-arguments
-                     macro_token, stream, defines, include_paths, included_files):
+                     macro_token, stream, defines, include_paths, included_files, result=None):
         """
-        Expand a macro
+        Expand a macro appending the tokens to result which is returned
+
+        An expansion without warnings, errors, includes or changes of the
+        defines is stored in the expansion cache for re-use
         """
         macro = defines[macro_token.value]
         macro_point = (strip_previous(macro_token.location), hash(frozenset(defines.keys())))
@@ -157,15 +188,30 @@ Skipped
             raise LocationException.error(
                 "Circular macro expansion of %s detected" % macro_token.value,
                 macro_token.location)
+
+        values = macro.actuals_from_stream(macro_token, stream)
+        result = [] if result is None else result
+        key = self._expansion_cache.key(macro, values)
+        if self._expansion_cache.lookup(key, macro_token.location, values, result):
+            return result
+
+        num_tokens = len(result)
+        num_included_files = len(included_files)
+        num_problems = self._num_problems
+        version = self._expansion_cache.version
         self._macro_trace.add(macro_point)
-        tokens = self._preprocess(macro.expand_from_stream(macro_token,
-                                                           stream,
-                                                           previous=macro_token.location),
-                                  defines=defines,
-                                  include_paths=include_paths,
-                                  included_files=included_files)
+        self._preprocess(macro.expand(values, previous=macro_token.location),
+                         defines=defines,
+                         include_paths=include_paths,
+                         included_files=included_files,
+                         result=result)
         self._macro_trace.remove(macro_point)
-        return tokens
+
+        if (num_problems == self._num_problems
+                and num_included_files == len(included_files)
+                and version == self._expansion_cache.version):
+            self._expansion_cache.store(key, macro_token.location, values, result[num_tokens:])
+        return result
 
     @staticmethod
     def if_statement(if_token, stream, defines):
@@ -235,9 +281,9 @@ Skipped
         return result
 
     def include(self,  # pylint: disable=too-many-arguments
-                token, stream, include_paths, included_files, defines):
+                token, stream, include_paths, included_files, defines, result):
         """
-        Handle `include directive
+        Handle `include directive appending the included tokens to result
         """
         stream.skip_while(WHITESPACE)
         try:
@@ -278,7 +324,7 @@ Skipped
             raise LocationException.warning("Verilog `include bad argument",
                                             tok.location)
 
-        included_file = find_included_file(include_paths, file_name_tok.value)
+        included_file = self._include_resolver.find(include_paths, file_name_tok.value)
         included_files.append((file_name_tok.value, included_file))
         if included_file is None:
             # Is debug message since there are so many builtin includes in tools
@@ -292,16 +338,596 @@ Skipped
                 "Circular `include of %s detected" % file_name_tok.value,
                 file_name_tok.location)
         self._include_trace.add(include_point)
-
-        included_tokens = self._tokenizer.tokenize(read_file(included_file),
-                                                   file_name=included_file,
-                                                   previous_location=token.location)
-        included_tokens = self._preprocess(included_tokens,
-                                           defines,
-                                           include_paths,
-                                           included_files)
+        self._preprocess_included_file(token, included_file,
+                                       include_paths, included_files, defines, result)
         self._include_trace.remove(include_point)
-        return included_tokens
+
+    def _preprocess_included_file(self,  # pylint: disable=too-many-arguments
+                                  include_token, included_file, include_paths, included_files, defines, result):
+        """
+        Preprocess the included file or re-use the result of an earlier
+        include of the same file with the same defines
+
+        Results are only re-used and stored outside of macro expansions
+        and when no warnings or errors were found since they may depend
+        on the macros and includes being expanded.
+        """
+        if self._macro_trace:
+            self._preprocess(self._token_cache.tokenize(included_file,
+                                                        previous_location=include_token.location),
+                             defines,
+                             include_paths,
+                             included_files,
+                             result)
+            return
+
+        key = self._include_cache.key(included_file, defines)
+        include_result = self._include_cache.lookup(key, include_paths)
+        if include_result is not None:
+            include_result.splice(include_token.location, defines, included_files, result)
+            self._expansion_cache.clear()
+            return
+
+        defines_before = dict(defines)
+        num_included_files = len(included_files)
+        num_problems = self._num_problems
+        num_tokens = len(result)
+        self._preprocess(self._token_cache.tokenize(included_file,
+                                                    previous_location=include_token.location),
+                         defines,
+                         include_paths,
+                         included_files,
+                         result)
+
+        if num_problems == self._num_problems:
+            def create_result():
+                return IncludeResult.create(included_file,
+                                            include_token.location,
+                                            result[num_tokens:],
+                                            defines_before,
+                                            defines,
+                                            included_files[num_included_files:],
+                                            self._include_cache.content_hash)
+
+            include_result = self._include_cache.store(key, create_result)
+            if include_result is not None:
+                # Use the stored macros which are cheaper to store again by an outer include
+                include_result.splice_defines(include_token.location, defines)
+                self._expansion_cache.clear()
+
+
+class TokenCache(object):
+    """
+    Tokens of included files keyed by their resolved path and content hash
+
+    A file included many times is only tokenized once per run. The
+    tokens are kept without the location of the `include directive
+    which is added every time they are used. When a database is given
+    the tokens are also kept between runs.
+    """
+
+    def __init__(self, tokenizer, database=None, content_hash=None):
+        """
+        content_hash -- Function returning the content hash of a file, by default
+                        the content hash is computed once per file and cache
+        """
+        self._tokenizer = tokenizer
+        self._database = database
+        self.content_hash = self._cached_content_hash if content_hash is None else content_hash
+        self._content_hashes = {}
+        self._tokens = {}
+
+    def _cached_content_hash(self, file_name):
+        """
+        Returns the content hash of file_name computed once per cache
+        """
+        if file_name is None:
+            return None
+        if file_name not in self._content_hashes:
+            self._content_hashes[file_name] = file_content_hash(file_name, database=self._database)
+        return self._content_hashes[file_name]
+
+    def tokenize(self, file_name, previous_location=None):
+        """
+        Returns the same tokens as tokenizing the contents of file_name with previous_location
+        """
+        key = (file_name, self.content_hash(file_name))
+        if key in self._tokens:
+            CACHE_STATISTICS.count("TokenCache.tokenize", "hits")
+        else:
+            self._tokens[key] = self._tokenize(file_name, key[1])
+
+        return [Token(kind, value, None if lexpos is None else ((file_name, lexpos), previous_location))
+                for kind, value, lexpos in self._tokens[key]]
+
+    def _tokenize(self, file_name, content_hash):
+        """
+        Returns the tokens of file_name as (kind, value, lexpos) tuples
+        from the database or by tokenizing the file
+        """
+        database_key = self._database_key(file_name)
+        if self._database is not None and database_key in self._database:
+            last_content_hash, tokens = self._database[database_key]
+            if last_content_hash == content_hash:
+                CACHE_STATISTICS.count("TokenCache.tokenize", "database_hits")
+                return tokens
+
+        CACHE_STATISTICS.count("TokenCache.tokenize", "misses")
+        tokens = [(token.kind, token.value, None if token.location is None else token.location[0][1])
+                  for token in self._tokenizer.tokenize(read_file(file_name), file_name=file_name)]
+
+        if self._database is not None:
+            self._database[database_key] = content_hash, tokens
+        return tokens
+
+    def touch(self, file_name):
+        """
+        Keep the tokens of file_name in the database when its garbage is collected
+
+        Used when a cached parse result including file_name is re-used without tokenizing it
+        """
+        if self._database is not None:
+            touch(self._database, self._database_key(file_name))
+
+    @staticmethod
+    def _database_key(file_name):
+        return ("TokenCache.tokenize(%s)" % file_name).encode()
+
+
+class IncludeCache(object):
+    """
+    Preprocessed tokens of included files keyed by their resolved path,
+    content hash and the defines before the include
+
+    Like a precompiled header the result of an include with the same
+    defines is spliced in instead of preprocessing the file again. When a
+    database is given the results are also kept between runs.
+    """
+
+    def __init__(self, content_hash, database=None, include_resolver=None):
+        """
+        content_hash -- Function returning the content hash of a file
+        """
+        self.content_hash = content_hash
+        self._include_resolver = IncludeResolver() if include_resolver is None else include_resolver
+        self._database = database
+        self._results = {}
+        self._candidates = set()
+        self._database_keys = {}
+
+    @staticmethod
+    def key(file_name, defines):
+        """
+        Returns the key of including file_name with defines
+        """
+        return file_name, hash_string(repr(sorted((name, macro.fingerprint)
+                                                  for name, macro in defines.items())))
+
+    def lookup(self, key, include_paths):
+        """
+        Returns the IncludeResult of key or None when not found or when
+        the files it includes have changed
+        """
+        file_name, _ = key
+        content_hash = self.content_hash(file_name)
+
+        if key in self._results:
+            CACHE_STATISTICS.count("IncludeCache.lookup", "hits")
+            last_content_hash, result = self._results[key]
+        else:
+            value = None if self._database is None else lookup(self._database, self._database_key(key))
+            if value is None:
+                CACHE_STATISTICS.count("IncludeCache.lookup", "misses")
+                return None
+            CACHE_STATISTICS.count("IncludeCache.lookup", "database_hits")
+            last_content_hash, result = value
+            self._results[key] = value
+
+        if last_content_hash != content_hash:
+            return None
+
+        for include_str, included_file_name, last_included_content_hash in result.included_files:
+            if self._include_resolver.find(include_paths, include_str) != included_file_name:
+                return None
+
+            if self.content_hash(included_file_name) != last_included_content_hash:
+                return None
+
+        return result
+
+    def store(self, key, create_result):
+        """
+        Store the IncludeResult returned by create_result for key and return it
+
+        The result is only created when key is stored the second time such
+        that files only included once with the same defines do not pay for it
+        """
+        if key not in self._candidates:
+            self._candidates.add(key)
+            return None
+
+        result = create_result()
+        if result is None:
+            return None
+
+        file_name, _ = key
+        value = self.content_hash(file_name), result
+        self._results[key] = value
+        if self._database is not None:
+            self._add_database_key(file_name, value[0], self._database_key(key))
+            self._database[self._database_key(key)] = value
+        return result
+
+    def touch(self, file_name):
+        """
+        Keep the results of including file_name in the database when its garbage is collected
+
+        Used when a cached parse result including file_name is re-used without looking them up
+        """
+        if self._database is None:
+            return
+
+        for database_key in self._get_database_keys(file_name)[1]:
+            touch(self._database, database_key)
+
+    def _get_database_keys(self, file_name):
+        """
+        Returns the content hash of file_name when its results were last
+        stored and the set of database keys of the results
+        """
+        if file_name not in self._database_keys:
+            index_key = self._index_key(file_name)
+            if index_key in self._database:
+                content_hash, database_keys = self._database[index_key]
+                # Copied since the set is modified and stored again
+                self._database_keys[file_name] = [content_hash, set(database_keys)]
+            else:
+                self._database_keys[file_name] = [None, set()]
+        return self._database_keys[file_name]
+
+    def _add_database_key(self, file_name, content_hash, database_key):
+        """
+        Add database_key to the results of file_name removing the results of other contents
+        """
+        value = self._get_database_keys(file_name)
+        if value[0] == content_hash and database_key in value[1]:
+            return
+
+        if value[0] != content_hash:
+            for old_database_key in value[1]:
+                try:
+                    del self._database[old_database_key]
+                except KeyError:
+                    pass
+            value[0] = content_hash
+            value[1] = set()
+
+        value[1].add(database_key)
+        self._database[self._index_key(file_name)] = value
+
+    @staticmethod
+    def _database_key(key):
+        return ("IncludeCache(%s, %s)" % key).encode()
+
+    @staticmethod
+    def _index_key(file_name):
+        return ("IncludeCache.keys(%s)" % file_name).encode()
+
+
+class IncludeResult(Slotted):
+    """
+    The result of preprocessing an included file
+
+    The locations of the `include directive within the locations of the
+    result are replaced by _INCLUDE_LOCATION and the locations of the
+    directive are added back when the result is spliced in.
+    """
+    __slots__ = ("tokens", "removed_defines", "changed_defines", "included_files")
+    # Results of version 1 may contain locations from outside the included files
+    _pickle_version = 2
+
+    def __init__(self, tokens, removed_defines, changed_defines, included_files):
+        self.tokens = tokens
+        self.removed_defines = removed_defines
+        self.changed_defines = changed_defines
+        self.included_files = included_files
+
+    @classmethod
+    def create(cls,  # pylint: disable=too-many-arguments
+               file_name, include_location, tokens, defines_before, defines_after, included_files, content_hash):
+        """
+        Create the result of including file_name at include_location or
+        None if any location does not come from the included files
+
+        A location from outside, such as of a macro defined before the
+        include, is not part of the cache key and would be spliced into
+        other files with the wrong locations.
+        """
+        file_names = set([file_name]) | set(name for _, name in included_files)
+        try:
+            result = cls(tokens=[Token(token.kind, token.value, _strip_include_location(token.location,
+                                                                                        include_location))
+                                 for token in tokens],
+                         removed_defines=[name for name in defines_before if name not in defines_after],
+                         changed_defines=[_strip_macro_include_location(macro, include_location)
+                                          for name, macro in defines_after.items()
+                                          if defines_before.get(name) is not macro],
+                         included_files=[(include_str, name, content_hash(name))
+                                         for include_str, name in included_files])
+
+            for token in result.tokens:
+                _check_location_files(token.location, file_names)
+
+            for macro in result.changed_defines:
+                _check_location_files(macro.previous, file_names)
+                for token in macro.tokens:
+                    _check_location_files(token.location, file_names)
+                for tokens in macro.defaults.values():
+                    for token in tokens:
+                        _check_location_files(token.location, file_names)
+        except ValueError:
+            return None
+        return result
+
+    def splice(self, include_location, defines, included_files, result):
+        """
+        Append the tokens included at include_location to result and
+        update the defines and included files
+        """
+        self.splice_defines(include_location, defines)
+        included_files.extend((include_str, file_name) for include_str, file_name, _ in self.included_files)
+        result.extend(Token(token.kind, token.value, _add_include_location(token.location, include_location))
+                      for token in self.tokens)
+
+    def splice_defines(self, include_location, defines):
+        """
+        Update the defines as if included at include_location
+        """
+        for name in self.removed_defines:
+            defines.pop(name, None)
+
+        for macro in self.changed_defines:
+            defines[macro.name] = macro.with_previous(_add_include_location(macro.previous, include_location))
+
+
+# Replaces the locations of the `include directive within the locations of an IncludeResult
+_INCLUDE_LOCATION = "`include"
+
+
+class MacroExpansionCache(object):
+    """
+    Re-uses the preprocessed expansion of a macro used again with the
+    same actual values
+
+    The expansions depend on all defines and the cache must be cleared
+    whenever they change. The locations of the macro usage and of the
+    actual values within an expansion are replaced by markers and the
+    locations of the new usage are added back when it is re-used.
+    """
+
+    def __init__(self):
+        self._expansions = {}
+        self._seen = set()
+        self.version = 0
+
+    def clear(self):
+        """
+        Forget all expansions since the defines have changed
+        """
+        self._expansions.clear()
+        self._seen.clear()
+        self.version += 1
+
+    @staticmethod
+    def key(macro, values):
+        """
+        Returns the key of the expansion of macro with the actual values
+
+        The macro is identified by the object in the defines which is
+        valid until the cache is cleared. Bound defaults are distinguished
+        from equal actual values since their locations differ.
+        """
+        return (id(macro),
+                tuple((value is macro.defaults.get(name), tuple((token.kind, token.value) for token in value))
+                      for name, value in zip(macro.args, values)))
+
+    def lookup(self, key, macro_location, values, result):
+        """
+        Append the cached expansion at macro_location with the actual
+        values to result, returns False if there was no cached expansion
+        """
+        tokens = self._expansions.get(key)
+        if tokens is None:
+            CACHE_STATISTICS.count("MacroExpansionCache.lookup", "misses")
+            return False
+
+        CACHE_STATISTICS.count("MacroExpansionCache.lookup", "hits")
+        locations = {_MACRO_LOCATION: macro_location}
+        for idx, value in enumerate(values):
+            for token_idx, token in enumerate(value):
+                locations[(_MACRO_LOCATION, idx, token_idx)] = token.location
+        relocated = {}
+        result.extend(Token(token.kind, token.value, _add_locations(token.location, locations, relocated))
+                      for token in tokens)
+        return True
+
+    def store(self, key, macro_location, values, tokens):
+        """
+        Store the expansion at macro_location with the actual values
+
+        The expansion is only stored when key is stored the second time
+        since most macro usages have unique actual values.
+        """
+        if key not in self._seen:
+            self._seen.add(key)
+            return
+
+        if macro_location is None:
+            self._expansions[key] = tokens
+            return
+
+        replacements = [(_location_frames(macro_location), _MACRO_LOCATION)]
+        for idx, value in enumerate(values):
+            for token_idx, token in enumerate(value):
+                replacements.append((_location_frames(token.location), (_MACRO_LOCATION, idx, token_idx)))
+
+        frames_set = set(tuple(frames) for frames, _ in replacements)
+        if len(frames_set) != len(replacements) or () in frames_set:
+            # An actual value token would be relocated ambiguously
+            return
+
+        nodes = {}
+        try:
+            self._expansions[key] = [Token(token.kind, token.value,
+                                           _strip_locations(token.location, replacements, nodes))
+                                     for token in tokens]
+        except ValueError:
+            pass
+
+
+# Replaces the locations of the macro usage within the locations of a cached expansion
+_MACRO_LOCATION = "`define"
+
+
+def _location_frames(location):
+    """
+    Returns the list of the current locations of the location chain
+    """
+    frames = []
+    while location is not None:
+        current, location = location
+        frames.append(current)
+    return frames
+
+
+def _strip_include_location(location, include_location):
+    """
+    Returns location where every occurrence of the frames of
+    include_location is replaced by _INCLUDE_LOCATION. The location must
+    end with include_location.
+    """
+    if include_location is None:
+        return location
+    return _strip_locations(location, [(_location_frames(include_location), _INCLUDE_LOCATION)])
+
+
+def _check_location_files(location, file_names):
+    """
+    Raises ValueError unless every frame of location is the
+    _INCLUDE_LOCATION or within one of file_names
+    """
+    for frame in _location_frames(location):
+        if frame != _INCLUDE_LOCATION and frame[0] not in file_names:
+            raise ValueError("Location is not within the included files")
+
+
+def _add_include_location(location, include_location):
+    """
+    Returns location where every _INCLUDE_LOCATION is replaced by include_location
+    """
+    return _add_locations(location, {_INCLUDE_LOCATION: include_location})
+
+
+def _strip_locations(location, replacements, nodes=None):
+    """
+    Returns location where every occurrence of the frames of a
+    replacement is replaced by its marker. The replacements is a list of
+    (frames, marker) tuples where the location must end with the frames
+    of the first replacement. Longer frames are replaced first.
+
+    Equal tails of the locations stripped with the same nodes dictionary
+    are shared.
+    """
+    if location is None:
+        return None
+
+    frames = _location_frames(location)
+    end_frames = replacements[0][0]
+    if frames[-len(end_frames):] != end_frames:
+        raise ValueError("Location does not end with the replaced location")
+
+    replacements = sorted(replacements, key=lambda replacement: len(replacement[0]), reverse=True)
+    new_frames = []
+    idx = 0
+    while idx < len(frames):
+        for replaced_frames, marker in replacements:
+            if frames[idx:idx + len(replaced_frames)] == replaced_frames:
+                new_frames.append(marker)
+                idx += len(replaced_frames)
+                break
+        else:
+            new_frames.append(frames[idx])
+            idx += 1
+
+    nodes = {} if nodes is None else nodes
+    result = None
+    for frame in reversed(new_frames):
+        key = (frame, id(result))
+        if key not in nodes:
+            nodes[key] = (frame, result)
+        result = nodes[key]
+    return result
+
+
+def _add_locations(location, locations, relocated=None):
+    """
+    Returns location where every marker is replaced by its location in
+    the locations dictionary
+
+    Shared tails are only relocated once when the same relocated
+    dictionary is used for several locations.
+    """
+    if location is None:
+        return None
+
+    if relocated is not None and id(location) in relocated:
+        return relocated[id(location)]
+
+    current, previous = location
+    previous = _add_locations(previous, locations, relocated)
+    if current in locations:
+        result = add_previous(locations[current], previous)
+    else:
+        result = (current, previous)
+
+    if relocated is not None:
+        relocated[id(location)] = result
+    return result
+
+
+def _strip_previous_location(location, previous):
+    """
+    Returns location with the previous location at the end replaced by None
+    """
+    if location is previous:
+        return None
+
+    if location is None:
+        raise ValueError("Location does not end with the previous location")
+
+    current, old_previous = location
+    return (current, _strip_previous_location(old_previous, previous))
+
+
+def _strip_macro_include_location(macro, include_location):
+    """
+    Returns macro with include_location replaced by _INCLUDE_LOCATION
+
+    A macro defined in the included file has tokens ending with
+    include_location which is moved to the previous location of the macro.
+    """
+    if macro.previous is not None:
+        return macro.with_previous(_strip_include_location(macro.previous, include_location))
+
+    def strip(tokens):
+        return [Token(token.kind, token.value, _strip_previous_location(token.location, include_location))
+                for token in tokens]
+
+    return Macro(macro.name,
+                 tokens=strip(macro.tokens),
+                 args=macro.args,
+                 defaults=dict((name, strip(tokens)) for name, tokens in macro.defaults.items()),
+                 previous=(_INCLUDE_LOCATION, None))
 
 
 def find_included_file(include_paths, file_name):
@@ -315,6 +941,100 @@ def find_included_file(include_paths, file_name):
     return None
 
 
+class IncludeResolver(object):
+    """
+    Finds included files like find_included_file but lists each include
+    directory once and answers later lookups from memory, also when the
+    file is not found
+
+    Meant to be used during a single run where the contents of the
+    include directories do not change.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._directories = {}
+        self._exists_cache = {}
+
+    def find(self, include_paths, file_name):
+        """
+        Find the file to include given include_paths
+        """
+        key = (tuple(include_paths), file_name)
+        if key in self._results:
+            CACHE_STATISTICS.count("IncludeResolver.find", "hits")
+        else:
+            CACHE_STATISTICS.count("IncludeResolver.find", "misses")
+            self._results[key] = self._find(include_paths, file_name)
+        return self._results[key]
+
+    def _find(self, include_paths, file_name):
+        """
+        Find the file to include given include_paths without using the results of earlier calls
+        """
+        for include_path in include_paths:
+            full_name = abspath(join(include_path, file_name))
+            if self.exists(full_name):
+                return full_name
+        return None
+
+    def exists(self, full_name):
+        """
+        Returns the same as exists for an absolute full_name but only
+        calls it for names found in the directory listing
+
+        Files found by find are answered from memory
+        """
+        directory, name = split(full_name)
+        listing = self._list_directory(directory)
+        if listing is None or not name:
+            return exists(full_name)
+
+        names, case_insensitive = listing
+        if (name.lower() if case_insensitive else name) not in names:
+            return False
+
+        # Broken symbolic links are listed but do not exist
+        if full_name not in self._exists_cache:
+            self._exists_cache[full_name] = exists(full_name)
+        return self._exists_cache[full_name]
+
+    def _list_directory(self, directory):
+        """
+        Returns the set of names in the directory and if the file system
+        is case insensitive or None if it cannot be listed
+        """
+        if directory not in self._directories:
+            self._directories[directory] = _list_directory(directory)
+        return self._directories[directory]
+
+
+def _list_directory(directory):
+    """
+    Returns the set of names in the directory and if the file system
+    is case insensitive or None if it cannot be listed
+    """
+    try:
+        names = set(os.listdir(directory))
+    except OSError:
+        if isdir(directory):
+            return None
+        return set(), False
+
+    for name in names:
+        swapped = name.swapcase()
+        if swapped != name:
+            case_insensitive = swapped not in names and exists(join(directory, swapped))
+            break
+    else:
+        # Without names with letters all names compare equal in any case
+        case_insensitive = False
+
+    if case_insensitive:
+        names = set(name.lower() for name in names)
+    return names, case_insensitive
+
+
 def undef(undef_token, stream, defines):
     """
     Handles undef directive
@@ -406,16 +1126,45 @@ class Macro(object):
     A `define macro with zero or more arguments
     """
 
-    def __init__(self, name, tokens=None, args=tuple(), defaults=None):
+    def __init__(self, name, tokens=None, args=tuple(), defaults=None, previous=None):
+        """
+        previous -- Location added after the locations of the tokens and defaults when expanded
+        """
         self.name = name
         self.tokens = [] if tokens is None else tokens
         self.args = args
         self.defaults = {} if defaults is None else defaults
+        self.previous = previous
+        self._fingerprint = None
+
+    def with_previous(self, previous):
+        """
+        Returns the same macro with another previous location
+        """
+        macro = Macro(self.name, self.tokens, self.args, self.defaults, previous)
+        macro._fingerprint = self._fingerprint  # pylint: disable=protected-access
+        return macro
 
     @property
     def num_args(self):
         return len(self.args)
 
+    @property
+    def fingerprint(self):
+        """
+        A hash of the macro ignoring the location of its tokens
+        """
+        if self._fingerprint is None:
+            def strip(tokens):
+                return [(repr(token.kind), token.value) for token in tokens]
+
+            self._fingerprint = hash_string(repr((self.name,
+                                                  strip(self.tokens),
+                                                  self.args,
+                                                  sorted((name, strip(tokens))
+                                                         for name, tokens in self.defaults.items()))))
+        return self._fingerprint
+
     def __repr__(self):
         return "Macro(%r, %r %r, %r)" % (self.name, self.tokens, self.args, self.defaults)
 
@@ -423,16 +1172,20 @@ class Macro(object):
         """
         Expand macro with actual values, returns a list of expanded tokens
         """
+        definition_previous = previous if self.previous is None else add_previous(self.previous, previous)
         tokens = []
         for token in self.tokens:
             if token.kind == IDENTIFIER and token.value in self.args:
                 idx = self.args.index(token.value)
                 value = values[idx]
-                tokens += value
+                if value is self.defaults.get(token.value):
+                    tokens += [(tok, definition_previous) for tok in value]
+                else:
+                    tokens += [(tok, previous) for tok in value]
             else:
-                tokens.append(token)
-        return [Token(tok.kind, tok.value, add_previous(tok.location, previous))
-                for tok in tokens]
+                tokens.append((token, definition_previous))
+        return [Token(tok.kind, tok.value, add_previous(tok.location, tok_previous))
+                for tok, tok_previous in tokens]
 
     def __eq__(self, other):
         return ((self.name == other.name)
@@ -445,6 +1198,13 @@ class Macro(object):
         Expand macro consuming arguments from the stream
         returns the expanded tokens
         """
+        return self.expand(self.actuals_from_stream(token, stream), previous)
+
+    def actuals_from_stream(self, token, stream):
+        """
+        Consume the arguments of the macro from the stream and returns
+        the actual values with the defaults bound
+        """
         if self.num_args == 0:
             values = []
         else:
@@ -470,7 +1230,7 @@ class Macro(object):
                                                 (len(values), len(self.args)),
                                                 token.location)
 
-        return self.expand(values, previous)
+        return values
 
     @staticmethod
     def _parse_macro_actuals(define_token, stream):
@@ -37,11 +37,8 @@ class VerilogTokenizer(object):
         def remove_value(token):
             return Token(token.kind, '', token.location)
 
-        def ignore_value(token):  # pylint: disable=unused-argument
-            pass
-
-        def add(kind, regex, func=None):
-            self._tokenizer.add(kind, regex, func)
+        def add(kind, regex, func=None, ignore=False):
+            self._tokenizer.add(kind, regex, func, ignore)
 
         def replace_keywords(token):  # pylint: disable=missing-docstring
             if token.value in KEYWORDS:
@@ -67,7 +64,7 @@ class VerilogTokenizer(object):
 
         add(ESCAPED_NEWLINE,
             r"\\\n",
-            ignore_value)
+            ignore=True)
 
         add(NEWLINE,
             r"\n",
@@ -6,6 +6,8 @@
 #
 # Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
 
+# pylint: disable=too-many-lines
+
 """
 Functionality to represent and operate on a HDL code project
 """
@@ -13,23 +15,47 @@ Functionality to represent and operate on a HDL code project
 
 from os.path import join, basename, dirname, splitext, isdir, exists
 from copy import copy
+import sys
 import traceback
 import logging
+import pickle
 from collections import OrderedDict
 from vunit.hashing import hash_string
 from vunit.dependency_graph import (DependencyGraph,
                                     CircularDependencyException)
-from vunit.vhdl_parser import VHDLParser, VHDLReference
+from vunit.vhdl_parser import VHDLParser, VHDLReference, parse_file as parse_vhdl_file
 from vunit.cached import file_content_hash
-from vunit.parsing.verilog.parser import VerilogParser
-from vunit.parsing.encodings import HDL_FILE_ENCODING
+from vunit.parsing.verilog.parser import VerilogParser, parse_file as parse_verilog_file
+from vunit.parsing.tokenizer import LocationException, EOFException
 from vunit.exceptions import CompileError
 from vunit.simulator_factory import SIMULATOR_FACTORY
 from vunit.design_unit import DesignUnit, VHDLDesignUnit, Entity, Module
 from vunit import ostools
+
+try:
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:
+    # Python 2.7
+    ProcessPoolExecutor = None  # pylint: disable=invalid-name
+    BrokenProcessPool = None  # pylint: disable=invalid-name
+
 LOGGER = logging.getLogger(__name__)
 
 
+def _get_parse_context():
+    """
+    Return a multiprocessing context forking the parse processes or None
+    when processes can only be spawned which runs the run script once per process
+    """
+    start_methods = multiprocessing.get_all_start_methods()
+    for start_method in ("fork", "forkserver"):
+        if start_method in start_methods:
+            return multiprocessing.get_context(start_method)
+    return None
+
+
 class Project(object):  # pylint: disable=too-many-instance-attributes
     """
     The representation of a HDL code project.
@@ -38,13 +64,18 @@ class Project(object):  # pylint: disable=too-many-instance-attributes
     """
     def __init__(self,
                  depend_on_package_body=False,
-                 database=None):
+                 database=None,
+                 shared_database=None):
         """
         depend_on_package_body - Package users depend also on package body
+        shared_database - Parse results shared with other projects by content
         """
         self._database = database
-        self._vhdl_parser = VHDLParser(database=self._database)
-        self._verilog_parser = VerilogParser(database=self._database)
+        self._vhdl_parser = VHDLParser(database=self._database,
+                                       shared_database=shared_database)
+        self._verilog_parser = VerilogParser(database=self._database,
+                                             shared_database=shared_database,
+                                             dependencies_only=True)
         self._libraries = OrderedDict()
         # Mapping between library lower case name and real library name
         self._lower_library_names_dict = {}
@@ -139,6 +170,55 @@ class Project(object):  # pylint: disable=too-many-instance-attributes
 
         return old_source_file
 
+    def parse_in_parallel(self, files, num_processes):
+        """
+        Parse the files which are not found in the database using a pool of processes
+        and store the results in the database. Adding the files afterwards in the
+        same order then only re-uses the stored results.
+
+        :param files: A list of (file_name, file_type, include_dirs, defines) tuples
+        :param num_processes: The number of processes to parse with
+        """
+        if self._database is None or num_processes <= 1 or ProcessPoolExecutor is None:
+            return
+
+        jobs = []
+        for file_name, file_type, include_dirs, defines in files:
+            if file_type == "vhdl":
+                if not self._vhdl_parser.is_cached(file_name):
+                    jobs.append((parse_vhdl_file, (file_name,),
+                                 lambda result, file_name=file_name: self._vhdl_parser.store(file_name, result)))
+
+            elif file_type in VERILOG_FILE_TYPES:
+                if not self._verilog_parser.is_cached(file_name, include_dirs, defines):
+                    jobs.append((parse_verilog_file, (file_name, include_dirs, defines, True),
+                                 lambda result, file_name=file_name, defines=defines:
+                                 self._verilog_parser.store(file_name, defines, *result)))
+
+        if len(jobs) < 2:
+            return
+
+        context = _get_parse_context()
+        if context is None:
+            LOGGER.warning("Parsing %i files serially since the parse processes can only be spawned",
+                           len(jobs))
+            return
+
+        # Python < 3.7 always uses the default start method which is fork where available
+        kwargs = {"mp_context": context} if sys.version_info >= (3, 7) else {}
+
+        LOGGER.debug("Parsing %i files using %i processes", len(jobs), num_processes)
+        with ProcessPoolExecutor(max_workers=num_processes, **kwargs) as executor:
+            futures = [executor.submit(function, *args) for function, args, _ in jobs]
+            for future, (_, _, store) in zip(futures, jobs):
+                try:
+                    result = future.result()
+                except (EnvironmentError, ValueError, LocationException, EOFException,
+                        pickle.PicklingError, BrokenProcessPool):
+                    # The error is reported when the file is added
+                    continue
+                store(result)
+
     def add_manual_dependency(self, source_file, depends_on):
         """
         Add manual dependency where 'source_file' depends_on 'depends_on'
@@ -393,10 +473,8 @@ class Project(object):  # pylint: disable=too-many-instance-attributes
             self._handle_circular_dependency(exc)
             raise CompileError
 
-        def comparison_key(source_file):
-            return compile_order.index(source_file)
-
-        retval = sorted(affected_files, key=comparison_key)
+        position = dict((source_file, idx) for idx, source_file in enumerate(compile_order))
+        retval = sorted(affected_files, key=position.__getitem__)
         return retval
 
     def get_dependencies_in_compile_order(self, target_files=None, implementation_dependencies=False):
@@ -418,10 +496,8 @@ class Project(object):  # pylint: disable=too-many-instance-attributes
             self._handle_circular_dependency(exc)
             raise CompileError
 
-        def comparison_key(source_file):
-            return compile_order.index(source_file)
-
-        sorted_files = sorted(affected_files, key=comparison_key)
+        position = dict((source_file, idx) for idx, source_file in enumerate(compile_order))
+        sorted_files = sorted(affected_files, key=position.__getitem__)
         return sorted_files
 
     def get_source_files_in_order(self):
@@ -774,8 +850,7 @@ class VerilogSourceFile(SourceFile):
         self.module_dependencies = []
         self.include_dirs = include_dirs if include_dirs is not None else []
         self.defines = defines.copy() if defines is not None else {}
-        self._content_hash = file_content_hash(self.name, encoding=HDL_FILE_ENCODING,
-                                               database=database)
+        self._content_hash = file_content_hash(self.name, database=database)
 
         for path in self.include_dirs:
             self._content_hash = hash_string(self._content_hash + hash_string(path))
@@ -796,7 +871,6 @@ class VerilogSourceFile(SourceFile):
             for included_file_name in design_file.included_files:
                 self._content_hash = hash_string(self._content_hash
                                                  + file_content_hash(included_file_name,
-                                                                     encoding=HDL_FILE_ENCODING,
                                                                      database=database))
 
             for module in design_file.modules:
@@ -853,7 +927,6 @@ class VHDLSourceFile(SourceFile):
                 self._add_design_file(design_file)
 
         self._content_hash = file_content_hash(self.name,
-                                               encoding=HDL_FILE_ENCODING,
                                                database=database)
 
     def get_vhdl_standard(self):
@@ -913,8 +986,7 @@ class VHDLSourceFile(SourceFile):
         """
         result = []
         for entity in design_file.entities:
-            generic_names = [generic.identifier for generic in entity.generics]
-            result.append(Entity(entity.identifier, self, generic_names))
+            result.append(Entity(entity.identifier, self, entity.generic_names))
 
         for context in design_file.contexts:
             result.append(VHDLDesignUnit(context.identifier, self, 'context'))
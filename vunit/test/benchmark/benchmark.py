@@ -0,0 +1,235 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
+
+"""
+Benchmark of the parsers and test scanner on a synthetic corpus
+
+Run with python -m vunit.test.benchmark.benchmark --output result.json
+"""
+
+from __future__ import print_function
+
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import shutil
+from os.path import join, dirname
+from collections import OrderedDict
+from timeit import default_timer
+from vunit.about import version
+from vunit.builtins import VERILOG_PATH
+from vunit.database import DataBase, PickledDataBase
+from vunit.ostools import read_file
+from vunit.project import Project
+from vunit.vhdl_parser import VHDLDesignFile
+from vunit.parsing.verilog.tokenizer import VerilogTokenizer
+from vunit.parsing.verilog.preprocess import VerilogPreprocessor
+from vunit.parsing.verilog.parser import VerilogParser
+from vunit.test_bench_list import TestBenchList
+from vunit.test.benchmark.corpus import CorpusShape, create_corpus, create_dependency_graph
+
+
+class Benchmark(object):
+    """
+    Times the stages of adding source files on a synthetic corpus
+    """
+
+    def __init__(self, corpus, shape, repeat=3):
+        self._corpus = corpus
+        self._shape = shape
+        self._repeat = repeat
+        self._include_dirs = corpus.include_dirs + [join(VERILOG_PATH, "include")]
+        self._contents = dict((file_name, read_file(file_name))
+                              for file_name in corpus.vhdl_files + corpus.verilog_files)
+
+    def run(self, path):
+        """
+        Run all stages using path as the scratch directory and return the results
+        """
+        stages = OrderedDict()
+        stages["tokenize"] = self._time(self._tokenize)
+        stages["preprocess"] = self._time(self._preprocess)
+        stages["vhdl_parse"] = self._time(self._vhdl_parse)
+        stages["verilog_parse"] = self._time(self._verilog_parse)
+        test_bench_source_files = self._test_bench_source_files(join(path, "test_scan"))
+        stages["test_scan"] = self._time(lambda: self._test_scan(test_bench_source_files))
+        stages["toposort"] = self._time(self._toposort)
+        stages["cache_cold"] = self._time(lambda: self._add_files(join(path, "cold"), new=True))
+        self._add_files(join(path, "warm"), new=True)
+        stages["cache_warm"] = self._time(lambda: self._add_files(join(path, "warm"), new=False))
+        return stages
+
+    def _time(self, stage):
+        """
+        Run stage repeat times and return the best and mean time together
+        with the number of items it processed
+        """
+        times = []
+        items = None
+        for _ in range(self._repeat):
+            start = default_timer()
+            items = stage()
+            times.append(default_timer() - start)
+        return OrderedDict([("best", min(times)),
+                            ("mean", sum(times) / len(times)),
+                            ("items", items)])
+
+    def _tokenize(self):
+        """
+        Tokenize the Verilog files, returns the number of tokens
+        """
+        tokenizer = VerilogTokenizer()
+        return sum(len(tokenizer.tokenize(self._contents[file_name], file_name=file_name))
+                   for file_name in self._corpus.verilog_files)
+
+    def _preprocess(self):
+        """
+        Preprocess the Verilog files including the header tree, returns the number of tokens
+        """
+        tokenizer = VerilogTokenizer()
+        preprocessor = VerilogPreprocessor(tokenizer)
+        num_tokens = 0
+        for file_name in self._corpus.verilog_files:
+            tokens = tokenizer.tokenize(self._contents[file_name], file_name=file_name)
+            num_tokens += len(preprocessor.preprocess(tokens,
+                                                      include_paths=[dirname(file_name)] + self._include_dirs))
+        return num_tokens
+
+    def _vhdl_parse(self):
+        """
+        Parse the VHDL files, returns the number of design units
+        """
+        num_units = 0
+        for file_name in self._corpus.vhdl_files:
+            design_file = VHDLDesignFile.parse(self._contents[file_name])
+            num_units += (len(design_file.entities) + len(design_file.architectures)
+                          + len(design_file.packages) + len(design_file.package_bodies))
+        return num_units
+
+    def _verilog_parse(self):
+        """
+        Parse the Verilog files without a database, returns the number of design units
+        """
+        parser = VerilogParser()
+        num_units = 0
+        for file_name in self._corpus.verilog_files:
+            design_file = parser.parse(file_name, include_paths=self._include_dirs)
+            num_units += len(design_file.modules) + len(design_file.packages)
+        return num_units
+
+    def _test_bench_source_files(self, path):
+        """
+        Add all files to a project without a database and return the source files of the test benches
+        """
+        project = Project()
+        project.add_builtin_library("vunit_lib")
+        project.add_library("lib", join(path, "lib"))
+        for file_name in self._corpus.vhdl_files:
+            project.add_source_file(file_name, "lib", file_type="vhdl")
+        for file_name in self._corpus.verilog_files:
+            project.add_source_file(file_name, "lib", file_type="systemverilog",
+                                    include_dirs=self._include_dirs)
+        test_bench_files = set(self._corpus.test_bench_files)
+        return [source_file for source_file in project.get_source_files_in_order()
+                if source_file.name in test_bench_files]
+
+    @staticmethod
+    def _test_scan(source_files):
+        """
+        Scan the test benches for tests and attributes, returns the number of tests
+        """
+        test_bench_list = TestBenchList()
+        for source_file in source_files:
+            test_bench_list.add_from_source_file(source_file)
+        return sum(len(test_bench.tests) for test_bench in test_bench_list.get_test_benches())
+
+    def _toposort(self):
+        """
+        Sort a large dependency graph in compile order, returns the number of nodes
+        """
+        graph = create_dependency_graph(self._shape)
+        compile_order = graph.toposort()
+        position = dict((node, idx) for idx, node in enumerate(compile_order))
+        return len(sorted(graph.get_dependent([0]), key=position.__getitem__))
+
+    def _add_files(self, path, new):
+        """
+        Add all files to a project with a database in path and compute
+        the compile order, returns the number of source files
+        """
+        database = PickledDataBase(DataBase(join(path, "database"), new=new))
+        project = Project(database=database)
+        project.add_builtin_library("vunit_lib")
+        project.add_library("lib", join(path, "lib"))
+        for file_name in self._corpus.vhdl_files:
+            project.add_source_file(file_name, "lib", file_type="vhdl")
+        for file_name in self._corpus.verilog_files:
+            project.add_source_file(file_name, "lib", file_type="systemverilog",
+                                    include_dirs=self._include_dirs)
+        num_files = len(project.get_source_files_in_order())
+        database.flush()
+        return num_files
+
+
+def run_benchmark(shape, repeat=3):
+    """
+    Create a corpus with shape in a temporary directory, benchmark it and
+    return the result as a dictionary
+    """
+    path = tempfile.mkdtemp()
+    try:
+        corpus = create_corpus(join(path, "corpus"), shape)
+        stages = Benchmark(corpus, shape, repeat=repeat).run(join(path, "scratch"))
+    finally:
+        shutil.rmtree(path)
+
+    return OrderedDict([("vunit_version", version()),
+                        ("python_version", platform.python_version()),
+                        ("platform", platform.platform()),
+                        ("repeat", repeat),
+                        ("shape", shape.to_dict()),
+                        ("num_files", corpus.num_files),
+                        ("stages", stages)])
+
+
+def _create_argument_parser():
+    """
+    Create the command line argument parser
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the VUnit parsers and test scanner")
+    parser.add_argument("--output", default=None,
+                        help="Write the result as JSON to this file instead of stdout")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply the number of files, ports and tests of the corpus")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="The number of times each stage is run, the best time is reported")
+    parser.add_argument("--include-depth", type=int, default=CorpusShape().include_depth,
+                        help="The depth of the Verilog include tree")
+    parser.add_argument("--include-fanout", type=int, default=CorpusShape().include_fanout,
+                        help="The number of headers included by each Verilog header")
+    return parser
+
+
+def main(argv=None):
+    """
+    Run the benchmark from the command line
+    """
+    args = _create_argument_parser().parse_args(argv)
+    shape = CorpusShape(include_depth=args.include_depth,
+                        include_fanout=args.include_fanout).scaled(args.scale)
+    result = json.dumps(run_benchmark(shape, repeat=args.repeat), indent=2)
+
+    if args.output is None:
+        print(result)
+    else:
+        with open(args.output, "w") as fptr:
+            fptr.write(result)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,280 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
+
+"""
+Generation of synthetic VHDL and SystemVerilog corpora for benchmarking
+"""
+
+from os.path import join
+from collections import OrderedDict
+from vunit.ostools import write_file
+from vunit.dependency_graph import DependencyGraph
+
+
+class CorpusShape(object):  # pylint: disable=too-many-instance-attributes
+    """
+    The size and shape of a synthetic corpus
+    """
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 num_packages=20,
+                 num_entities=20,
+                 num_ports=50,
+                 num_test_benches=10,
+                 num_tests=50,
+                 num_modules=20,
+                 include_depth=5,
+                 include_fanout=2,
+                 num_graph_nodes=10000):
+        self.num_packages = num_packages
+        self.num_entities = num_entities
+        self.num_ports = num_ports
+        self.num_test_benches = num_test_benches
+        self.num_tests = num_tests
+        self.num_modules = num_modules
+        self.include_depth = include_depth
+        self.include_fanout = include_fanout
+        self.num_graph_nodes = num_graph_nodes
+
+    def scaled(self, scale):
+        """
+        Returns a new shape where the number of files and their length is multiplied by scale
+        """
+        return CorpusShape(num_packages=max(1, int(self.num_packages * scale)),
+                           num_entities=max(1, int(self.num_entities * scale)),
+                           num_ports=max(1, int(self.num_ports * scale)),
+                           num_test_benches=max(1, int(self.num_test_benches * scale)),
+                           num_tests=max(1, int(self.num_tests * scale)),
+                           num_modules=max(1, int(self.num_modules * scale)),
+                           include_depth=self.include_depth,
+                           include_fanout=self.include_fanout,
+                           num_graph_nodes=max(1, int(self.num_graph_nodes * scale)))
+
+    def to_dict(self):
+        return OrderedDict(sorted(vars(self).items()))
+
+
+class Corpus(object):
+    """
+    The files of a synthetic corpus written to a directory
+    """
+
+    def __init__(self, vhdl_files, verilog_files, test_bench_files, include_dirs):
+        self.vhdl_files = vhdl_files
+        self.verilog_files = verilog_files
+        self.test_bench_files = test_bench_files
+        self.include_dirs = include_dirs
+
+    @property
+    def num_files(self):
+        return len(self.vhdl_files) + len(self.verilog_files)
+
+
+def create_corpus(path, shape):
+    """
+    Write a synthetic corpus with the given shape into path and return it
+    """
+    vhdl_files = []
+    verilog_files = []
+    test_bench_files = []
+
+    for idx in range(shape.num_packages):
+        file_name = join(path, "vhdl", "pkg%i.vhd" % idx)
+        write_file(file_name, _vhdl_package(idx, shape))
+        vhdl_files.append(file_name)
+
+    for idx in range(shape.num_entities):
+        file_name = join(path, "vhdl", "ent%i.vhd" % idx)
+        write_file(file_name, _vhdl_entity(idx, shape))
+        vhdl_files.append(file_name)
+
+    for idx in range(shape.num_test_benches):
+        file_name = join(path, "vhdl", "tb_vhdl%i.vhd" % idx)
+        write_file(file_name, _vhdl_test_bench(idx, shape))
+        vhdl_files.append(file_name)
+        test_bench_files.append(file_name)
+
+    include_dir = join(path, "include")
+    top_headers = _write_include_tree(include_dir, shape)
+
+    for idx in range(shape.num_modules):
+        file_name = join(path, "sv", "module%i.sv" % idx)
+        write_file(file_name, _verilog_module(idx, shape, top_headers))
+        verilog_files.append(file_name)
+
+    for idx in range(shape.num_test_benches):
+        file_name = join(path, "sv", "tb_sv%i.sv" % idx)
+        write_file(file_name, _verilog_test_bench(idx, shape, top_headers))
+        verilog_files.append(file_name)
+        test_bench_files.append(file_name)
+
+    return Corpus(vhdl_files, verilog_files, test_bench_files, [include_dir])
+
+
+def create_dependency_graph(shape):
+    """
+    Returns a dependency graph of num_graph_nodes nodes where every node
+    depends on the previous one forming a chain through the whole graph
+    and also on a node about half way back
+    """
+    graph = DependencyGraph()
+    for node in range(shape.num_graph_nodes):
+        graph.add_node(node)
+        if node > 0:
+            graph.add_dependency(node - 1, node)
+            graph.add_dependency(node // 2, node)
+    return graph
+
+
+def _vhdl_package(idx, shape):
+    """
+    A package with many type and constant declarations
+    """
+    lines = ["library ieee;",
+             "use ieee.std_logic_1164.all;",
+             "",
+             "package pkg%i is" % idx]
+    for decl in range(shape.num_ports):
+        lines += ["  -- Declarations number %i" % decl,
+                  "  type enum%i_t is (idle, busy, done);" % decl,
+                  "  type rec%i_t is record" % decl,
+                  "    state : enum%i_t;" % decl,
+                  "    data : std_logic_vector(%i downto 0);" % (decl % 32),
+                  "  end record;",
+                  "  type arr%i_t is array (natural range <>) of rec%i_t;" % (decl, decl),
+                  "  constant c%i : natural := %i;" % (decl, decl)]
+    lines += ["end package;",
+              "",
+              "package body pkg%i is" % idx,
+              "end package body;",
+              ""]
+    return "\n".join(lines)
+
+
+def _vhdl_entity(idx, shape):
+    """
+    An entity with a huge port list instantiating the previous entity
+    """
+    ports = ["    p%i : %s std_logic_vector(width-1 downto 0)" % (port, "in" if port % 2 == 0 else "out")
+             for port in range(shape.num_ports)]
+    lines = ["library ieee;",
+             "use ieee.std_logic_1164.all;",
+             "use work.pkg%i.all;" % (idx % shape.num_packages),
+             "",
+             "entity ent%i is" % idx,
+             "  generic (width : natural := 8;",
+             "           depth : positive := 16);",
+             "  port (",
+             ";\n".join(ports),
+             "  );",
+             "end entity;",
+             "",
+             "architecture rtl of ent%i is" % idx,
+             "begin"]
+    if idx > 0:
+        lines += ["  inst : entity work.ent%i" % (idx - 1),
+                  "    generic map (width => width)",
+                  "    port map (%s);" % ", ".join("p%i => p%i" % (port, port) for port in range(shape.num_ports))]
+    lines += ["end architecture;", ""]
+    return "\n".join(lines)
+
+
+def _vhdl_test_bench(idx, shape):
+    """
+    A long test bench with many test cases
+    """
+    lines = ["library vunit_lib;",
+             "context vunit_lib.vunit_context;",
+             "",
+             "entity tb_vhdl%i is" % idx,
+             "  generic (runner_cfg : string);",
+             "end entity;",
+             "",
+             "architecture tb of tb_vhdl%i is" % idx,
+             "begin",
+             "  main : process",
+             "  begin",
+             "    test_runner_setup(runner, runner_cfg);",
+             "    while test_suite loop"]
+    for test in range(shape.num_tests):
+        lines += ["      %sif run(\"test %i\") then" % ("" if test == 0 else "els", test),
+                  "        -- vunit: .attr%i" % test,
+                  "        check_equal(%i, %i);" % (test, test)]
+    lines += ["      end if;",
+              "    end loop;",
+              "    test_runner_cleanup(runner);",
+              "  end process;",
+              "end architecture;",
+              ""]
+    return "\n".join(lines)
+
+
+def _write_include_tree(include_dir, shape):
+    """
+    Write a tree of headers include_depth levels deep where every header
+    includes include_fanout headers and defines macros. Returns the file
+    names of the top headers relative to include_dir.
+    """
+    def header_name(level, idx):
+        return "header_%i_%i.svh" % (level, idx)
+
+    for level in reversed(range(shape.include_depth)):
+        for idx in range(shape.include_fanout ** level):
+            guard = "HEADER_%i_%i" % (level, idx)
+            lines = ["`ifndef %s" % guard,
+                     "`define %s" % guard]
+            if level + 1 < shape.include_depth:
+                lines += ['`include "%s"' % header_name(level + 1, idx * shape.include_fanout + child)
+                          for child in range(shape.include_fanout)]
+            lines += ["// Macros of header %i at level %i" % (idx, level),
+                      "`define WIDTH_%i_%i %i" % (level, idx, 8 + idx),
+                      "`define MAX_%i_%i(a, b) ((a) > (b) ? (a) : (b))" % (level, idx),
+                      "`endif"]
+            write_file(join(include_dir, header_name(level, idx)), "\n".join(lines) + "\n")
+
+    return [header_name(0, 0)]
+
+
+def _verilog_module(idx, shape, top_headers):
+    """
+    A module including the header tree with many ports instantiating the previous module
+    """
+    lines = ['`include "%s"' % header for header in top_headers]
+    lines += ["",
+              "package module%i_pkg;" % idx,
+              "  parameter int width = `WIDTH_0_0;",
+              "endpackage",
+              "",
+              "module module%i #(parameter int width = 8) (" % idx,
+              ",\n".join("  %s logic [width-1:0] p%i" % ("input" if port % 2 == 0 else "output", port)
+                         for port in range(shape.num_ports)),
+              ");",
+              "  import module%i_pkg::*;" % idx]
+    if idx > 0:
+        lines += ["  module%i #(.width(`MAX_0_0(width, 1))) inst (%s);"
+                  % (idx - 1, ", ".join(".p%i(p%i)" % (port, port) for port in range(shape.num_ports)))]
+    lines += ["endmodule", ""]
+    return "\n".join(lines)
+
+
+def _verilog_test_bench(idx, shape, top_headers):
+    """
+    A long test bench with many test cases
+    """
+    lines = ['`include "vunit_defines.svh"']
+    lines += ['`include "%s"' % header for header in top_headers]
+    lines += ["",
+              "module tb_sv%i;" % idx,
+              "  `TEST_SUITE begin"]
+    for test in range(shape.num_tests):
+        lines += ['    `TEST_CASE("test %i") begin' % test,
+                  "      // vunit: .attr%i" % test,
+                  "      `CHECK_EQUAL(%i, %i);" % (test, test),
+                  "    end"]
+    lines += ["  end",
+              "endmodule",
+              ""]
+    return "\n".join(lines)
@@ -0,0 +1,45 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
+
+"""
+Test the parser and scanner benchmark
+"""
+
+import unittest
+import json
+from os.path import join
+from vunit.test.benchmark.benchmark import main
+from vunit.test.benchmark.corpus import CorpusShape, create_corpus
+from vunit.test.common import with_tempdir
+
+
+class TestBenchmark(unittest.TestCase):
+    """
+    Test the parser and scanner benchmark
+    """
+
+    @with_tempdir
+    def test_create_corpus(self, tempdir):
+        shape = CorpusShape(num_packages=2, num_entities=3, num_test_benches=4, num_modules=5)
+        corpus = create_corpus(tempdir, shape)
+        self.assertEqual(len(corpus.vhdl_files), 2 + 3 + 4)
+        self.assertEqual(len(corpus.verilog_files), 5 + 4)
+        self.assertEqual(len(corpus.test_bench_files), 2 * 4)
+
+    @with_tempdir
+    def test_writes_json_result(self, tempdir):
+        output_file = join(tempdir, "result.json")
+        main(["--scale", "0.05", "--repeat", "1", "--include-depth", "2", "--output", output_file])
+
+        with open(output_file, "r") as fptr:
+            result = json.load(fptr)
+
+        self.assertEqual(list(result["stages"].keys()),
+                         ["tokenize", "preprocess", "vhdl_parse", "verilog_parse",
+                          "test_scan", "toposort", "cache_cold", "cache_warm"])
+        self.assertEqual(result["stages"]["test_scan"]["items"], 2 * 2)
+        self.assertEqual(result["stages"]["toposort"]["items"], 500)
+        self.assertEqual(result["stages"]["cache_warm"]["items"], result["num_files"])
@@ -0,0 +1,180 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
+
+"""
+Test the cached module
+"""
+
+import unittest
+import os
+from os.path import join
+from vunit.cached import cached, file_content_hash, prestat, shared_content_key
+from vunit.database import DataBase, PickledDataBase
+from vunit.parsing.slotted import Slotted, pickle_versions
+from vunit.cache_statistics import CACHE_STATISTICS
+from vunit.hashing import hash_bytes, hash_file
+from vunit.ostools import write_file
+from vunit.test.mock_2or3 import mock
+from vunit.test.common import with_tempdir
+
+
+class TestCached(unittest.TestCase):
+    """
+    Test the cached module
+    """
+
+    @with_tempdir
+    def test_file_content_hash_is_cached(self, tempdir):
+        file_name = join(tempdir, "file.vhd")
+        write_file(file_name, "content")
+        database = {}
+        self.assertEqual(file_content_hash(file_name, database=database),
+                         hash_bytes(b"content"))
+
+        with mock.patch("vunit.cached.hash_file") as mock_hash_file:
+            self.assertEqual(file_content_hash(file_name, database=database),
+                             hash_bytes(b"content"))
+            self.assertFalse(mock_hash_file.called)
+
+    @with_tempdir
+    def test_file_content_hash_is_updated_when_size_changes(self, tempdir):
+        file_name = join(tempdir, "file.vhd")
+        write_file(file_name, "content")
+        stat = os.stat(file_name)
+        database = {}
+        file_content_hash(file_name, database=database)
+
+        write_file(file_name, "new content")
+        os.utime(file_name, (stat.st_atime, stat.st_mtime))
+        self.assertEqual(file_content_hash(file_name, database=database),
+                         hash_bytes(b"new content"))
+
+    @with_tempdir
+    def test_prestat_avoids_stat_of_each_file(self, tempdir):
+        if not hasattr(os, "scandir"):
+            return
+
+        file_names = [join(tempdir, "file%i.vhd" % idx) for idx in range(10)]
+        for file_name in file_names:
+            write_file(file_name, file_name)
+        database = {}
+        with mock.patch("vunit.cached.os.name", "nt"):
+            for file_name in file_names:
+                file_content_hash(file_name, database=database)
+
+            with prestat(file_names):
+                with mock.patch("vunit.cached.os.stat") as stat:
+                    with mock.patch("vunit.cached.hash_file") as mock_hash_file:
+                        for file_name in file_names:
+                            self.assertEqual(file_content_hash(file_name, database=database),
+                                             hash_bytes(file_name.encode()))
+                        self.assertFalse(mock_hash_file.called)
+                    self.assertFalse(stat.called)
+
+    @with_tempdir
+    def test_prestat_does_not_scan_directories_on_posix(self, tempdir):
+        file_names = [join(tempdir, "file%i.vhd" % idx) for idx in range(10)]
+        for file_name in file_names:
+            write_file(file_name, file_name)
+
+        with mock.patch("vunit.cached.os.name", "posix"):
+            with mock.patch("vunit.cached.os.scandir", create=True) as scandir:
+                with prestat(file_names):
+                    for file_name in file_names:
+                        self.assertEqual(file_content_hash(file_name, database={}),
+                                         hash_bytes(file_name.encode()))
+                self.assertFalse(scandir.called)
+
+    @with_tempdir
+    def test_hash_file_in_chunks(self, tempdir):
+        file_name = join(tempdir, "file.vhd")
+        write_file(file_name, "content" * 100)
+        self.assertEqual(hash_file(file_name, chunk_size=3),
+                         hash_bytes(b"content" * 100))
+
+    @with_tempdir
+    def test_counts_unchanged_rehashes(self, tempdir):
+        file_name = join(tempdir, "file.vhd")
+        write_file(file_name, "content")
+        stat = os.stat(file_name)
+        database = {}
+        CACHE_STATISTICS.reset()
+        file_content_hash(file_name, database=database)
+        file_content_hash(file_name, database=database)
+        os.utime(file_name, (stat.st_atime, stat.st_mtime + 1))
+        file_content_hash(file_name, database=database)
+
+        statistics = CACHE_STATISTICS.to_dict()["file_content_hash"]
+        self.assertEqual(statistics["misses"], 1)
+        self.assertEqual(statistics["hits"], 1)
+        self.assertEqual(statistics["unchanged_rehashes"], 1)
+        self.assertNotIn("rehashes", statistics)
+
+    @with_tempdir
+    def test_counts_cached_hits_and_misses(self, tempdir):
+        file_name = join(tempdir, "file.vhd")
+        write_file(file_name, "content")
+        database = {}
+        CACHE_STATISTICS.reset()
+        for _ in range(3):
+            self.assertEqual(cached("key", len, file_name, encoding="utf-8", database=database), 7)
+
+        statistics = CACHE_STATISTICS.to_dict()["key"]
+        self.assertEqual(statistics["misses"], 1)
+        self.assertEqual(statistics["hits"], 2)
+        self.assertGreaterEqual(statistics["time"], 0.0)
+
+    @with_tempdir
+    def test_result_pickled_with_other_version_is_a_miss(self, tempdir):
+        file_name = join(tempdir, "file.vhd")
+        write_file(file_name, "content")
+
+        def function(content):
+            return _Result(len(content))
+
+        database = PickledDataBase(DataBase(join(tempdir, "database")))
+        shared_database = PickledDataBase(DataBase(join(tempdir, "shared_database")))
+        cached("key", function, file_name, encoding="utf-8",
+               database=database, shared_database=shared_database)
+        database.flush()
+        shared_database.flush()
+
+        CACHE_STATISTICS.reset()
+        with mock.patch.object(_Result, "_pickle_version", 2):
+            for _ in range(2):
+                database = PickledDataBase(DataBase(join(tempdir, "database")))
+                shared_database = PickledDataBase(DataBase(join(tempdir, "shared_database")))
+                self.assertEqual(cached("key", function, file_name, encoding="utf-8",
+                                        database=database, shared_database=shared_database).value, 7)
+                database.flush()
+                shared_database.flush()
+
+        statistics = CACHE_STATISTICS.to_dict()["key"]
+        self.assertEqual(statistics["misses"], 1)
+        self.assertEqual(statistics["hits"], 1)
+
+
+    def test_shared_content_key_depends_on_database_and_pickle_versions(self):
+        key = shared_content_key("key", "hash")
+        self.assertEqual(shared_content_key("key", "hash"), key)
+
+        with mock.patch("vunit.cached.DATABASE_VERSION", (16,)):
+            self.assertNotEqual(shared_content_key("key", "hash"), key)
+
+        with mock.patch.object(_Result, "_pickle_version", 2):
+            self.assertNotEqual(shared_content_key("key", "hash"), key)
+
+        self.assertIn(("%s._Result" % __name__, 1), pickle_versions())
+
+
+class _Result(Slotted):
+    """
+    A result
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
@@ -0,0 +1,55 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
+
+"""
+Test the removal of comments
+"""
+
+import unittest
+from vunit.parsing.comments import strip_vhdl_comments, strip_verilog_comments, get_line_offsets
+
+
+class TestComments(unittest.TestCase):
+    """
+    Test the removal of comments
+    """
+
+    def test_vhdl_comments(self):
+        self.assertEqual(strip_vhdl_comments("a -- b\nc /* d\ne */ f").code,
+                         "a     \nc     \n     f")
+
+    def test_vhdl_comment_delimiters_within_strings_and_characters(self):
+        code = 'report "-- /*" & \'-\' & "a""--"; -- c\n\'"\' --"'
+        self.assertEqual(strip_vhdl_comments(code).code,
+                         'report "-- /*" & \'-\' & "a""--";     \n\'"\'    ')
+
+    def test_verilog_comments(self):
+        self.assertEqual(strip_verilog_comments('a // b\n"// \\" /*" /* c\n*/').code,
+                         'a     \n"// \\" /*"     \n  ')
+        self.assertEqual(strip_verilog_comments("a\n// foo \nb").code,
+                         "a\n       \nb")
+        self.assertEqual(strip_verilog_comments("a\n/* foo\n \n */ \nb").code,
+                         "a\n      \n \n    \nb")
+
+    def test_offsets_are_unaffected(self):
+        code = "a\n-- b\r\nc"
+        stripped = strip_vhdl_comments(code)
+        self.assertEqual(len(stripped.code), len(code))
+        self.assertEqual(stripped.line_offsets, [0, 2, 8])
+        self.assertEqual(stripped.lineno(code.find("c")), 3)
+
+    def test_get_line_offsets(self):
+        self.assertEqual(get_line_offsets(""), [])
+        self.assertEqual(get_line_offsets("1"), [0])
+        self.assertEqual(get_line_offsets("12\n3"), [0, 3])
+        self.assertEqual(get_line_offsets("12\n3\n"), [0, 3])
+        self.assertEqual(get_line_offsets("12\n3\n4"), [0, 3, 5])
+        self.assertEqual(get_line_offsets("12\r\n3\n4"), [0, 4, 6])
+
+    def test_same_code_is_only_stripped_once(self):
+        code = "entity ent is -- comment\nend entity;"
+        self.assertIs(strip_vhdl_comments(code), strip_vhdl_comments(code))
+        self.assertIsNot(strip_vhdl_comments(code), strip_verilog_comments(code))
@@ -9,8 +9,13 @@ Test the database related classes
 """
 
 import unittest
-from os.path import join
-from vunit.database import DataBase, PickledDataBase
+from os.path import join, exists
+import io
+import os
+import multiprocessing
+from vunit.test.mock_2or3 import mock
+from vunit.database import (DataBase, LogDataBase, SqliteDataBase, PickledDataBase, open_database,
+                            DataBaseLockTimeout)
 from vunit.test.common import with_tempdir
 
 
@@ -88,6 +93,291 @@ class TestDataBase(unittest.TestCase):
         self.assertEqual(database[self.key1], self.value2)
         self.assertEqual(database[self.key2], self.value1)
 
+    @with_tempdir
+    def test_can_delete_key(self, tempdir):
+        database = self.create_database(tempdir)
+        database[self.key1] = self.value1
+        database[self.key2] = self.value2
+        del database[self.key1]
+        self.assertTrue(self.key1 not in database)
+        self.assertEqual(database[self.key2], self.value2)
+        self.assertRaises(KeyError, database.__delitem__, self.key1)
+        database.flush()
+
+        database = self.create_database(tempdir)
+        self.assertTrue(self.key1 not in database)
+        self.assertEqual(database[self.key2], self.value2)
+
+
+class TestDataBaseIndex(unittest.TestCase):
+    """
+    Test the persisted index of the node based database
+    """
+
+    key1 = TestDataBase.key1
+    key2 = TestDataBase.key2
+    value1 = TestDataBase.value1
+    value2 = TestDataBase.value2
+
+    @with_tempdir
+    def test_reads_persisted_index(self, tempdir):
+        path = join(tempdir, "database")
+        database = DataBase(path)
+        database[self.key1] = self.value1
+        database[self.key2] = self.value2
+        database.flush()
+        self.assertTrue(exists(join(path, "index")))
+
+        with mock.patch.object(DataBase, "_discover_nodes") as discover_nodes:
+            database = DataBase(path)
+            self.assertFalse(discover_nodes.called)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database[self.key2], self.value2)
+
+    @with_tempdir
+    def test_ignores_stale_index(self, tempdir):
+        path = join(tempdir, "database")
+        database = DataBase(path)
+        database[self.key1] = self.value1
+        database.flush()
+
+        # Another process adds a node without updating the index
+        other_database = DataBase(path)
+        other_database[self.key2] = self.value2
+
+        database = DataBase(path)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database[self.key2], self.value2)
+
+
+class TestDataBaseSharing(unittest.TestCase):
+    """
+    Test the node based database shared by several processes
+    """
+
+    @with_tempdir
+    def test_does_not_reuse_node_of_other_process(self, tempdir):
+        path = join(tempdir, "database")
+        database1 = DataBase(path)
+        database2 = DataBase(path)
+        database1[b"key1"] = b"value1"
+        database2[b"key2"] = b"value2"
+
+        database = DataBase(path)
+        self.assertEqual(database[b"key1"], b"value1")
+        self.assertEqual(database[b"key2"], b"value2")
+
+    @with_tempdir
+    def test_uses_most_recent_node_of_same_key(self, tempdir):
+        path = join(tempdir, "database")
+        database1 = DataBase(path)
+        database2 = DataBase(path)
+        database1[b"key"] = b"value1"
+        database2[b"key"] = b"value2"
+        self.assertEqual(DataBase(path)[b"key"], b"value2")
+
+    @with_tempdir
+    def test_removes_older_node_of_same_key(self, tempdir):
+        path = join(tempdir, "database")
+        database1 = DataBase(path)
+        database2 = DataBase(path)
+        database1[b"key"] = b"value1"
+        database2[b"key"] = b"value2"
+        # The first node is written last although it has the lower node index
+        os.utime(join(path, "1"), (0, 0))
+
+        database = DataBase(path)
+        self.assertEqual(database[b"key"], b"value1")
+        database.flush()
+        self.assertEqual(sorted(name for name in os.listdir(path) if name.isdigit()), ["0"])
+        self.assertIsNotNone(DataBase(path)._read_index())  # pylint: disable=protected-access
+
+    @with_tempdir
+    def test_node_removed_by_other_process_is_missing(self, tempdir):
+        path = join(tempdir, "database")
+        database1 = DataBase(path)
+        database1[b"key"] = b"value"
+        database2 = DataBase(path)
+        del database1[b"key"]
+
+        self.assertIn(b"key", database2)
+        self.assertRaises(KeyError, lambda: database2[b"key"])
+        self.assertNotIn(b"key", database2)
+
+        database1[b"key"] = b"value"
+        database2 = PickledDataBase(DataBase(path))
+        del database1[b"key"]
+        self.assertNotIn(b"key", database2)
+
+    @unittest.skipIf(os.name == "nt", "Advisory locks are not supported on Windows")
+    @with_tempdir
+    def test_concurrent_processes(self, tempdir):
+        path = join(tempdir, "database")
+        DataBase(path)
+        processes = [multiprocessing.Process(target=_add_keys, args=(path, idx))
+                     for idx in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        database = DataBase(path)
+        for idx in range(4):
+            for key_idx in range(50):
+                key = ("%i_%i" % (idx, key_idx)).encode()
+                self.assertEqual(database[key], key)
+
+
+def _add_keys(path, idx):
+    """
+    Add keys to the database from another process
+    """
+    database = DataBase(path)
+    for key_idx in range(50):
+        key = ("%i_%i" % (idx, key_idx)).encode()
+        database[key] = key
+
+
+class TestLogDataBase(TestDataBase):
+    """
+    Test the single file log structured database
+
+    Re-uses test from TestDataBase class
+    """
+
+    @staticmethod
+    def create_database(tempdir, new=False):
+        return LogDataBase(join(tempdir, "database.log"), new=new)
+
+    @with_tempdir
+    def test_is_persistent_after_compaction(self, tempdir):
+        file_name = join(tempdir, "database.log")
+        database = LogDataBase(file_name, min_garbage_size=0)
+        for _ in range(10):
+            database[self.key1] = self.value1
+        database[self.key2] = self.value2
+        size_before = database.size
+        database.close()
+
+        database = LogDataBase(file_name, min_garbage_size=0)
+        self.assertLess(database.size, size_before)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database[self.key2], self.value2)
+
+    @with_tempdir
+    def test_truncates_incomplete_record(self, tempdir):
+        file_name = join(tempdir, "database.log")
+        database = LogDataBase(file_name)
+        database[self.key1] = self.value1
+        database[self.key2] = self.value2
+        size = database.size
+        database.close()
+
+        with io.open(file_name, "r+b") as fptr:
+            fptr.truncate(size - 1)
+
+        database = LogDataBase(file_name)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertTrue(self.key2 not in database)
+
+    @with_tempdir
+    def test_migrates_node_database(self, tempdir):
+        path = join(tempdir, "database")
+        node_database = DataBase(path)
+        node_database[self.key1] = self.value1
+        node_database[self.key2] = self.value2
+
+        database = open_database(path, backend="log")
+        self.assertFalse(exists(path))
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database[self.key2], self.value2)
+
+
+    @with_tempdir
+    def test_keeps_node_database_when_migration_fails(self, tempdir):
+        path = join(tempdir, "database")
+        node_database = DataBase(path)
+        node_database[self.key1] = self.value1
+
+        with mock.patch("vunit.database.DataBase.__getitem__", autospec=True, side_effect=IOError):
+            self.assertRaises(IOError, open_database, path, backend="log")
+        self.assertEqual(DataBase(path)[self.key1], self.value1)
+
+    @with_tempdir
+    def test_keeps_node_database_when_not_migrated(self, tempdir):
+        path = join(tempdir, "database")
+        open_database(path, backend="log")
+        node_database = DataBase(path)
+        node_database[self.key1] = self.value1
+
+        for new in (False, True):
+            open_database(path, backend="log", new=new)
+            self.assertEqual(DataBase(path)[self.key1], self.value1)
+
+
+class TestSqliteDataBase(TestDataBase):
+    """
+    Test the SQLite database
+
+    Re-uses test from TestDataBase class
+    """
+
+    @staticmethod
+    def create_database(tempdir, new=False):
+        return SqliteDataBase(join(tempdir, "database.sqlite"), new=new)
+
+    @with_tempdir
+    def test_transaction_is_persistent(self, tempdir):
+        database = self.create_database(tempdir)
+        with database.transaction():
+            database[self.key1] = self.value1
+            with database.transaction():
+                database[self.key2] = self.value2
+            self.assertEqual(database[self.key2], self.value2)
+        database.close()
+
+        database = self.create_database(tempdir)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database[self.key2], self.value2)
+
+    @with_tempdir
+    def test_shared_between_connections(self, tempdir):
+        database1 = self.create_database(tempdir)
+        database2 = self.create_database(tempdir)
+        with database1.transaction():
+            database1[self.key1] = self.value1
+        self.assertEqual(database2[self.key1], self.value1)
+        database2[self.key2] = self.value2
+        self.assertEqual(sorted(database1.keys()), sorted([self.key1, self.key2]))
+        database1.close()
+        database2.close()
+
+    @with_tempdir
+    def test_transaction_only_locks_after_first_write(self, tempdir):
+        database1 = self.create_database(tempdir)
+        database2 = SqliteDataBase(join(tempdir, "database.sqlite"), timeout=0.1)
+        with database1.transaction():
+            self.assertNotIn(self.key1, database1)
+            database2[self.key1] = self.value1
+            database1[self.key2] = self.value2
+            self.assertRaises(DataBaseLockTimeout, database2.__setitem__, self.key2, self.value2)
+        self.assertEqual(database2[self.key2], self.value2)
+        database1.close()
+        database2.close()
+
+    @with_tempdir
+    def test_pickled_transaction_only_locks_while_writing(self, tempdir):
+        database1 = PickledDataBase(self.create_database(tempdir), cache_size=1)
+        database2 = SqliteDataBase(join(tempdir, "database.sqlite"), timeout=0.1)
+        with database1.transaction():
+            database1[self.key1] = self.value1
+            database1[self.key2] = self.value2
+            self.assertIn(self.key1, database2)
+            database2[b"other"] = self.value1
+        self.assertIn(self.key2, database2)
+        database2.close()
+
 
 class TestPickedDataBase(TestDataBase):
     """
@@ -102,3 +392,107 @@ class TestPickedDataBase(TestDataBase):
     @staticmethod
     def create_database(tempdir, new=False):
         return PickledDataBase(TestDataBase.create_database(tempdir, new))
+
+    @with_tempdir
+    def test_is_persistent(self, tempdir):
+        database = self.create_database(tempdir)
+        database[self.key1] = self.value1
+        database[self.key2] = self.value2
+        database.flush()
+
+        database = self.create_database(tempdir)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database[self.key2], self.value2)
+
+    @with_tempdir
+    def test_buffers_writes_until_flush(self, tempdir):
+        byte_database = TestDataBase.create_database(tempdir)
+        database = PickledDataBase(byte_database)
+        database[self.key1] = self.value1
+        self.assertTrue(self.key1 in database)
+        self.assertTrue(self.key1 not in byte_database)
+        database.flush()
+        self.assertTrue(self.key1 in byte_database)
+
+    @with_tempdir
+    def test_flushes_when_outermost_transaction_ends(self, tempdir):
+        byte_database = TestDataBase.create_database(tempdir)
+        database = PickledDataBase(byte_database)
+        with database.transaction():
+            with database.transaction():
+                database[self.key1] = self.value1
+            self.assertTrue(self.key1 not in byte_database)
+        self.assertTrue(self.key1 in byte_database)
+
+        def write_and_fail():
+            with database.transaction():
+                database[self.key2] = self.value2
+                raise RuntimeError("failed")
+
+        self.assertRaises(RuntimeError, write_and_fail)
+        self.assertTrue(self.key2 in byte_database)
+
+    @with_tempdir
+    def test_writes_evicted_values(self, tempdir):
+        byte_database = TestDataBase.create_database(tempdir)
+        database = PickledDataBase(byte_database, cache_size=1)
+        database[self.key1] = self.value1
+        database[self.key2] = self.value2
+        self.assertTrue(self.key1 in byte_database)
+        self.assertTrue(self.key2 not in byte_database)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database[self.key2], self.value2)
+        self.assertEqual(database.stats, {"hits": 0, "misses": 2, "evictions": 3})
+
+    @with_tempdir
+    def test_writes_evicted_values_in_batches(self, tempdir):
+        byte_database = TestDataBase.create_database(tempdir)
+        database = PickledDataBase(byte_database, cache_size=3, batch_size=2)
+        keys = [("key%i" % idx).encode() for idx in range(5)]
+        for key in keys[:4]:
+            database[key] = self.value1
+        self.assertEqual([key in byte_database for key in keys], [True, True, True, False, False])
+
+        database[keys[4]] = self.value1
+        self.assertEqual([key in byte_database for key in keys], [True, True, True, False, False])
+        self.assertEqual(database.stats["evictions"], 2)
+
+    @with_tempdir
+    def test_counts_hits(self, tempdir):
+        database = self.create_database(tempdir)
+        database[self.key1] = self.value1
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database.stats, {"hits": 2, "misses": 0, "evictions": 0})
+
+    @with_tempdir
+    def test_collect_garbage_removes_untouched_entries(self, tempdir):
+        database = self.create_database(tempdir)
+        database[self.key1] = self.value1
+        database[self.key2] = self.value2
+        database[b"keep"] = self.value2
+        database.flush()
+
+        database = self.create_database(tempdir)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertEqual(database.collect_garbage(keep=[b"keep"]), 1)
+
+        database = self.create_database(tempdir)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertTrue(self.key2 not in database)
+        self.assertTrue(b"keep" in database)
+
+    @with_tempdir
+    def test_collect_garbage_keeps_touched_entries(self, tempdir):
+        database = self.create_database(tempdir)
+        database[self.key1] = self.value1
+        database[self.key2] = self.value2
+        database.flush()
+
+        database = self.create_database(tempdir)
+        database.touch(self.key1)
+        self.assertEqual(database.collect_garbage(), 1)
+
+        database = self.create_database(tempdir)
+        self.assertEqual(database[self.key1], self.value1)
+        self.assertTrue(self.key2 not in database)
@@ -37,6 +37,14 @@ class TestDependencyGraph(unittest.TestCase):
         result = graph.toposort()
         self._check_result(result, dependencies)
 
+    def test_should_sort_dependency_chain_deeper_than_recursion_limit(self):
+        nodes = list(range(5000))
+        dependencies = list(zip(nodes[1:], nodes[:-1]))
+        graph = DependencyGraph()
+        self._add_nodes_and_dependencies(graph, nodes, dependencies)
+        self.assertEqual(graph.toposort(), list(reversed(nodes)))
+        self.assertEqual(graph.get_dependencies([0]), set(nodes))
+
     def test_should_raise_runtime_error_exception_on_self_dependency(self):
         nodes = ['a', 'b', 'c', 'd']
         dependencies = [('a', 'b'), ('a', 'c'), ('b', 'd'), ('d', 'd')]
@@ -13,7 +13,7 @@ Test the project functionality
 
 import unittest
 from shutil import rmtree
-from os.path import join, exists, dirname
+from os.path import join, exists, dirname, abspath
 import os
 from time import sleep
 import itertools
@@ -986,6 +986,61 @@ end architecture;
 """)
         self.assert_compiles(module1, before=module2)
 
+    def test_parse_in_parallel_stores_results_in_database(self):
+        write_file("ent.vhd", """\
+entity ent is
+end entity;
+""")
+        write_file("pkg.vhd", """\
+package pkg is
+end package;
+""")
+        write_file("module.sv", """\
+`include "include.svh"
+""")
+        write_file("include.svh", """\
+module name;
+endmodule
+""")
+        self.project = Project(database={})
+        self.project.parse_in_parallel([(abspath("ent.vhd"), "vhdl", None, None),
+                                        (abspath("pkg.vhd"), "vhdl", None, None),
+                                        (abspath("module.sv"), "systemverilog", [], None)],
+                                       num_processes=2)
+
+        self.project.add_library("lib", "lib_path")
+        with mock.patch("vunit.vhdl_parser.VHDLDesignFile.parse") as parse, \
+                mock.patch("vunit.parsing.verilog.parser.VerilogDesignFile.parse") as verilog_parse:
+            ent = self.project.add_source_file(abspath("ent.vhd"), "lib")
+            self.project.add_source_file(abspath("pkg.vhd"), "lib")
+            module = self.project.add_source_file(abspath("module.sv"), "lib", file_type="systemverilog",
+                                                  include_dirs=[])
+            self.assertFalse(parse.called)
+            self.assertFalse(verilog_parse.called)
+
+        self.assert_has_entity(ent, "ent")
+        self.assert_has_package(abspath("pkg.vhd"), "pkg")
+        self.assertEqual([unit.name for unit in module.design_units], ["name"])
+
+    @mock.patch("vunit.project.LOGGER.warning", autospec=True)
+    @mock.patch("vunit.project.ProcessPoolExecutor", autospec=True)
+    @mock.patch("vunit.project._get_parse_context", return_value=None, autospec=True)
+    def test_parse_serially_when_processes_can_only_be_spawned(self, _, executor, warning):
+        write_file("ent.vhd", """\
+entity ent is
+end entity;
+""")
+        write_file("pkg.vhd", """\
+package pkg is
+end package;
+""")
+        self.project = Project(database={})
+        self.project.parse_in_parallel([(abspath("ent.vhd"), "vhdl", None, None),
+                                        (abspath("pkg.vhd"), "vhdl", None, None)],
+                                       num_processes=2)
+        self.assertFalse(executor.called)
+        self.assertEqual(warning.call_count, 1)
+
     def test_finds_verilog_include_dependencies(self):
         def create_project():
             """
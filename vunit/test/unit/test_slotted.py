@@ -0,0 +1,80 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
+
+"""
+Test the compact pickling of parse results
+"""
+
+import unittest
+import pickle
+from vunit.parsing.slotted import Slotted
+from vunit.vhdl_parser import VHDLDesignFile, VHDLReference
+from vunit.test.mock_2or3 import mock
+
+
+class TestSlotted(unittest.TestCase):
+    """
+    Test the compact pickling of parse results
+    """
+
+    def test_pickle_design_file(self):
+        design_file = VHDLDesignFile.parse("""\
+library lib;
+use lib.pkg.all;
+
+entity ent is
+  generic (width : natural := 8);
+end entity;
+""")
+        self.assertFalse(hasattr(design_file, "__dict__"))
+
+        result = pickle.loads(pickle.dumps(design_file, protocol=pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(result.references, [VHDLReference("package", "lib", "pkg", "all")])
+        self.assertEqual(result.entities[0].identifier, "ent")
+        self.assertEqual(result.entities[0].generic_names, ["width"])
+        self.assertEqual(result.entities[0].generics[0].init_value, "8")
+
+    def test_transient_slots_are_not_pickled(self):
+        entity = VHDLDesignFile.parse("""\
+entity ent is
+  generic (width : natural := 8);
+end entity;
+""").entities[0]
+        self.assertEqual(entity.generics[0].identifier, "width")
+
+        result = pickle.loads(pickle.dumps(entity, protocol=pickle.HIGHEST_PROTOCOL))
+        self.assertIsNone(result._parsed_generics)  # pylint: disable=protected-access
+        self.assertEqual(result.generics[0].identifier, "width")
+
+    def test_pickle_subclass_with_dict(self):
+        reference = _Reference("package", "lib", "pkg")
+        result = pickle.loads(pickle.dumps(reference))
+        self.assertEqual(result, reference)
+        self.assertEqual(result.extra, 1)
+
+    def test_fails_on_other_pickle_version(self):
+        data = pickle.dumps(_Value(1))
+        with mock.patch.object(_Value, "_pickle_version", 2):
+            self.assertRaises(pickle.UnpicklingError, pickle.loads, data)
+
+
+class _Reference(VHDLReference):
+    """
+    A subclass without __slots__
+    """
+    def __init__(self, *args):
+        VHDLReference.__init__(self, *args)
+        self.extra = 1
+
+
+class _Value(Slotted):
+    """
+    A value
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
@@ -15,9 +15,7 @@ import unittest
 from os.path import join
 
 from vunit.test_bench import (TestBench,
-                              _remove_verilog_comments,
                               _find_tests,
-                              _get_line_offsets,
                               _lookup_lineno,
                               _find_attributes,
                               _find_tests_and_attributes,
@@ -25,6 +23,7 @@ from vunit.test_bench import (TestBench,
                               FileLocation,
                               Attribute,
                               LegacyAttribute)
+from vunit.parsing.comments import get_line_offsets, strip_vhdl_comments
 from vunit.ostools import write_file
 from vunit.test.mock_2or3 import mock
 from vunit.test.common import (with_tempdir,
@@ -231,6 +230,26 @@ if run("Test_2")
         assert location.offset == code.find("Test_1")
         assert location.length == len("Test_1")
 
+    @with_tempdir
+    def test_scan_tests_from_shared_database(self, tempdir):
+        shared_database = {}
+        code = 'if run("Test_1")'
+        file_names = [join(tempdir, "first", "file.vhd"), join(tempdir, "second", "file.vhd")]
+        design_units = [Entity('tb_entity', file_name=file_name, contents=code) for file_name in file_names]
+        for design_unit in design_units:
+            design_unit.generic_names = ["runner_cfg"]
+
+        TestBench(design_units[0], database={}, shared_database=shared_database)
+
+        with mock.patch("vunit.test_bench._find_tests_and_attributes") as find_tests_and_attributes:
+            test_bench = TestBench(design_units[1], database={}, shared_database=shared_database)
+            self.assertFalse(find_tests_and_attributes.called)
+
+        tests = self.create_tests(test_bench)
+        location = tests[0].test_information['lib.tb_entity.Test_1'].location
+        self.assertEqual(location.file_name, file_names[1])
+        self.assertEqual(location.offset, code.find("Test_1"))
+
     @with_tempdir
     def test_scan_tests_from_missing_file(self, tempdir):
         design_unit = Entity('tb_entity',
@@ -447,21 +466,8 @@ if run("Test 2")
         test_bench = TestBench(design_unit)
         self.assertRaises(ValueError, test_bench.set_sim_option, "unknown", "value")
 
-    def test_remove_verilog_comments(self):
-        self.assertEqual(_remove_verilog_comments("a\n// foo \nb"),
-                         "a\n       \nb")
-        self.assertEqual(_remove_verilog_comments("a\n/* foo\n \n */ \nb"),
-                         "a\n      \n \n    \nb")
-
-    def test_get_line_offsets(self):
-        self.assertEqual(_get_line_offsets(""), [])
-        self.assertEqual(_get_line_offsets("1"), [0])
-        self.assertEqual(_get_line_offsets("12\n3"), [0, 3])
-        self.assertEqual(_get_line_offsets("12\n3\n"), [0, 3])
-        self.assertEqual(_get_line_offsets("12\n3\n4"), [0, 3, 5])
-
     def test_lookup_lineno(self):
-        offsets = _get_line_offsets("12\n3\n4")
+        offsets = get_line_offsets("12\n3\n4")
         self.assertEqual(_lookup_lineno(0, offsets), 1)
         self.assertEqual(_lookup_lineno(1, offsets), 1)
         self.assertEqual(_lookup_lineno(2, offsets), 1)
@@ -654,6 +660,14 @@ if run("Test_2")
         self.assertEqual(test2.location.lineno, 5)
         self.assertEqual([attr.name for attr in test2.attributes], [".arg2", ".arg2b"])
 
+    def test_comments_are_stripped_once_when_finding_tests_and_attributes(self):
+        with mock.patch("vunit.test_bench.strip_vhdl_comments", wraps=strip_vhdl_comments) as strip:
+            (test,), _ = _find_tests_and_attributes("""\
+        if run("test") -- vunit: .arg
+        """, file_name="file.vhd")
+        self.assertEqual(strip.call_count, 1)
+        self.assertEqual(test.name, "test")
+
     def test_duplicate_attributes_ok(self):
         (test1, test2), attributes = _find_tests_and_attributes("""\
 // vunit: .arg0
@@ -10,7 +10,7 @@ Test the test report functionality
 
 from unittest import TestCase
 from xml.etree import ElementTree
-from os.path import join, dirname
+from os.path import join, dirname, exists
 import os
 from vunit.test_report import TestReport, PASSED, SKIPPED, FAILED
 
@@ -28,6 +28,10 @@ class TestTestReport(TestCase):
         with open(self.output_file_name, "w") as fwrite:
             fwrite.write(self.output_file_contents)
 
+    def tearDown(self):
+        if exists(self.output_file_name):
+            os.remove(self.output_file_name)
+
     def report_to_str(self, report):
         """
         Helper function to create a string with color tags of the report
@@ -9,7 +9,7 @@ Test of the general tokenizer
 """
 
 from unittest import TestCase
-from vunit.parsing.tokenizer import describe_location
+from vunit.parsing.tokenizer import describe_location, Tokenizer, new_token_kind
 from vunit.test.mock_2or3 import mock
 
 
@@ -18,6 +18,19 @@ class TestTokenizer(TestCase):
     Test of the general tokenizer
     """
 
+    def test_ignored_kinds_are_skipped(self):
+        word = new_token_kind("word")
+        space = new_token_kind("space")
+        tokenizer = Tokenizer()
+        tokenizer.add(word, r"[a-z]+")
+        tokenizer.add(space, r"[ ]+", ignore=True)
+        tokenizer.finalize()
+        tokens = tokenizer.tokenize("foo  bar", file_name="fn", create_locations=True)
+        self.assertEqual([(token.kind, token.value) for token in tokens],
+                         [(word, "foo"), (word, "bar")])
+        self.assertEqual([token.location for token in tokens],
+                         [(("fn", (0, 2)), None), (("fn", (5, 7)), None)])
+
     def test_describes_single_char_location(self):
         self.assertEqual(
             _describe_location("""\
@@ -20,12 +20,13 @@ import re
 from re import MULTILINE
 from shutil import rmtree
 from vunit.ui import VUnit
+from vunit.database import DataBaseLockTimeout
 from vunit.project import VHDL_EXTENSIONS, VERILOG_EXTENSIONS
 from vunit.test.mock_2or3 import mock
 from vunit.test.common import (set_env,
                                with_tempdir,
                                create_vhdl_test_bench_file)
-from vunit.ostools import renew_path
+from vunit.ostools import renew_path, write_file
 from vunit.builtins import add_verilog_include_dir
 from vunit.simulator_interface import SimulatorInterface
 
@@ -408,6 +409,88 @@ lib2, ent0.vhd
 lib1, ent0.vhd
 Listed 2 files""".splitlines()))
 
+    def test_cache_statistics_json(self):
+        json_file_name = join(self._output_path, "cache_statistics.json")
+        ui = self._create_ui("--files", "--cache-statistics=%s" % json_file_name)
+        lib = ui.add_library("lib")
+        lib.add_source_file(self.create_entity_file(0))
+        with mock.patch("sys.stdout", autospec=True):
+            self._run_main(ui)
+
+        with open(json_file_name, "r") as fptr:
+            statistics = json.load(fptr)
+        self.assertEqual(statistics["CachedVHDLParser.parse"]["misses"], 1)
+        self.assertIn("hits", statistics["project_database"])
+
+    def test_parse_processes(self):
+        file_names = [self.create_entity_file(idx) for idx in range(3)]
+        file_names.append(self.create_entity_file(3, file_suffix=".v"))
+        write_file(file_names[-1], "module mod3;\nendmodule\n")
+
+        ui = self._create_ui("--parse-processes=2")
+        lib = ui.add_library("lib")
+        source_files = lib.add_source_files(file_names)
+        self.assertEqual([source_file.name for source_file in source_files], file_names)
+        library = ui._project.get_library("lib")  # pylint: disable=protected-access
+        self.assertEqual(sorted(entity.name for entity in library.get_entities()), ["ent0", "ent1", "ent2"])
+        self.assertEqual([module.name for module in library.get_modules()], ["mod3"])
+
+    def test_list_files_keeps_entries_of_files_not_added(self):
+        ui = self._create_ui("--files")
+        lib = ui.add_library("lib")
+        lib.add_source_file(self.create_entity_file(0))
+        lib.add_source_file(self.create_entity_file(1))
+        with mock.patch("sys.stdout", autospec=True):
+            self._run_main(ui)
+
+        with mock.patch("vunit.ui.SIMULATOR_FACTORY.select_simulator",
+                        new=lambda: MockSimulator):
+            ui = VUnit.from_argv(argv=["--output-path=%s" % self._output_path,
+                                       "--files"],
+                                 compile_builtins=False)
+        lib = ui.add_library("lib")
+        lib.add_source_file(self.create_entity_file(0))
+        with mock.patch("sys.stdout", autospec=True):
+            self._run_main(ui)
+
+        keys = ui._database._database.keys()  # pylint: disable=protected-access
+        self.assertTrue(any(b"ent1.vhd" in key for key in keys))
+
+    @mock.patch("vunit.ui.LOGGER.error", autospec=True)
+    def test_exits_with_error_when_database_is_locked(self, logger):
+        ui = self._create_ui()
+        lib = ui.add_library("lib")
+        with mock.patch("vunit.ui.Project.add_source_file", autospec=True,
+                        side_effect=DataBaseLockTimeout("Timed out")):
+            self.assertRaises(SystemExit, lib.add_source_file, self.create_entity_file(0))
+        self.assertEqual(logger.call_count, 1)
+        self.assertEqual(str(logger.call_args[0][1]), "Timed out")
+
+    def test_compact_database_removes_stale_entries(self):
+        ui = self._create_ui("--files")
+        lib = ui.add_library("lib")
+        lib.add_source_file(self.create_entity_file(0))
+        lib.add_source_file(self.create_entity_file(1))
+        with mock.patch("sys.stdout", autospec=True):
+            self._run_main(ui)
+
+        with mock.patch("vunit.ui.SIMULATOR_FACTORY.select_simulator",
+                        new=lambda: MockSimulator):
+            ui = VUnit.from_argv(argv=["--output-path=%s" % self._output_path,
+                                       "--compact-database"],
+                                 compile_builtins=False)
+        lib = ui.add_library("lib")
+        lib.add_source_file(self.create_entity_file(0))
+        with mock.patch("sys.stdout", autospec=True) as stdout:
+            self._run_main(ui)
+        text = "".join([call[1][0] for call in stdout.write.mock_calls])
+        self.assertTrue(text.startswith("Removed "))
+        self.assertNotIn("Removed 0 stale entries", text)
+
+        keys = ui._database._database.keys()  # pylint: disable=protected-access
+        self.assertTrue(any(b"ent0.vhd" in key for key in keys))
+        self.assertFalse(any(b"ent1.vhd" in key for key in keys))
+
     @with_tempdir
     def test_filtering_tests(self, tempdir):
         def setup(ui):
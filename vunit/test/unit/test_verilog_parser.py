@@ -15,6 +15,10 @@ import time
 import shutil
 from vunit.ostools import renew_path
 from vunit.parsing.verilog.parser import VerilogParser
+from vunit.parsing.verilog.preprocess import IncludeResolver
+from vunit.cache_statistics import CACHE_STATISTICS
+from vunit.database import DataBase, PickledDataBase
+from vunit.cached import file_content_hash
 from vunit.test.mock_2or3 import mock
 
 
@@ -103,6 +107,26 @@ endmodule
         self.assertEqual(param1, "param1")
         self.assertEqual(param2, "param2")
 
+    def test_dependencies_only_finds_parameters_of_test_benches(self):
+        self.write_file("file_name.sv", """\
+module foo #(parameter param1 = 1);
+  parameter param2;
+endmodule
+""")
+        self.write_file("tb_file_name.sv", """\
+module tb_foo;
+  parameter string runner_cfg = "";
+  parameter param1;
+endmodule
+""")
+        parser = VerilogParser(dependencies_only=True)
+        module, = parser.parse("file_name.sv").modules
+        self.assertEqual(module.name, "foo")
+        self.assertEqual(module.parameters, [])
+        module, = parser.parse("tb_file_name.sv").modules
+        self.assertEqual(module.name, "tb_foo")
+        self.assertEqual(module.parameters, ["runner_cfg", "param1"])
+
     def test_parse_package(self):
         packages = self.parse("""\
 package true1;
@@ -327,6 +351,180 @@ endmodule;
         self.assertEqual(len(result.modules), 1)
         self.assertEqual(result.modules[0].name, "mod2")
 
+    def test_shared_cache_is_used_for_same_contents(self):
+        shared_cache = {}
+        code = """\
+`include "include.svh"
+module mod;
+endmodule
+"""
+        for directory in ("first", "second"):
+            self.write_file(join(directory, "include.svh"), "")
+            self.write_file(join(directory, "file_name.sv"), code)
+
+        parser = VerilogParser(database={}, shared_database=shared_cache)
+        result = parser.parse(join("first", "file_name.sv"))
+        self.assertEqual(result.included_files, [join(self.output_path, "first", "include.svh")])
+
+        parser = VerilogParser(database={}, shared_database=shared_cache)
+        with mock.patch("vunit.parsing.verilog.parser.VerilogDesignFile.parse") as parse:
+            result = parser.parse(join("second", "file_name.sv"))
+            self.assertFalse(parse.called)
+        self.assertEqual(result.modules[0].name, "mod")
+        self.assertEqual(result.included_files, [join(self.output_path, "second", "include.svh")])
+
+        self.assertEqual(len(shared_cache), 1)
+        shared_result = list(shared_cache.values())[0][1]
+        self.assertEqual(shared_result.included_files, [join(self.output_path, "first", "include.svh")])
+
+    def test_shared_cache_is_not_used_for_other_includes(self):
+        shared_cache = {}
+        code = """\
+`include "include.svh"
+"""
+        self.write_file(join("first", "include.svh"), "module mod1; endmodule")
+        self.write_file(join("first", "file_name.sv"), code)
+        self.write_file(join("second", "include.svh"), "module mod2; endmodule")
+        self.write_file(join("second", "file_name.sv"), code)
+
+        parser = VerilogParser(database={}, shared_database=shared_cache)
+        self.assertEqual(parser.parse(join("first", "file_name.sv")).modules[0].name, "mod1")
+        parser = VerilogParser(database={}, shared_database=shared_cache)
+        self.assertEqual(parser.parse(join("second", "file_name.sv")).modules[0].name, "mod2")
+
+    def test_reused_result_keeps_tokens_of_included_files(self):
+        self.write_file("include.svh", "module mod; endmodule")
+        self.write_file("file_name.sv", '`include "include.svh"')
+        path = join(self.output_path, "database")
+
+        database = PickledDataBase(DataBase(path))
+        VerilogParser(database=database).parse("file_name.sv")
+        database.flush()
+        keys = set(DataBase(path).keys())
+        self.assertTrue(any(key.startswith(b"TokenCache.tokenize(") for key in keys))
+
+        database = PickledDataBase(DataBase(path))
+        VerilogParser(database=database).parse("file_name.sv")
+        self.assertEqual(database.collect_garbage(), 0)
+        self.assertEqual(set(DataBase(path).keys()), keys)
+
+    def test_reused_result_keeps_include_results(self):
+        self.write_file("include.svh", "wire w;")
+        self.write_file("file_name.sv", '`include "include.svh"\n`include "include.svh"')
+        path = join(self.output_path, "database")
+
+        database = PickledDataBase(DataBase(path))
+        VerilogParser(database=database).parse("file_name.sv")
+        database.flush()
+        keys = set(DataBase(path).keys())
+        self.assertTrue(any(key.startswith(b"IncludeCache(") for key in keys))
+
+        database = PickledDataBase(DataBase(path))
+        VerilogParser(database=database).parse("file_name.sv")
+        self.assertEqual(database.collect_garbage(), 0)
+        self.assertEqual(set(DataBase(path).keys()), keys)
+
+    def test_changed_include_removes_its_include_results(self):
+        self.write_file("include.svh", "wire w;")
+        self.write_file("file_name.sv", '`include "include.svh"\n`include "include.svh"')
+        database = {}
+        VerilogParser(database=database).parse("file_name.sv", defines={"foo": "1"})
+        old_keys = [key for key in database if key.startswith(b"IncludeCache(")]
+        self.assertEqual(len(old_keys), 1)
+
+        tick()
+        self.write_file("include.svh", "wire v;")
+        VerilogParser(database=database).parse("file_name.sv", defines={"foo": "2"})
+        new_keys = [key for key in database if key.startswith(b"IncludeCache(")]
+        self.assertEqual(len(new_keys), 1)
+        self.assertNotEqual(new_keys, old_keys)
+
+    def test_changed_include_removes_results_of_files_including_it(self):
+        self.write_file("include.svh", "module mod1; endmodule")
+        self.write_file("first.sv", '`include "include.svh"')
+        self.write_file("second.sv", '`include "include.svh"')
+        self.write_file("third.sv", "module mod3; endmodule")
+        cache = {}
+        parser = VerilogParser(database=cache)
+        for file_name in ("first.sv", "second.sv", "third.sv"):
+            parser.parse(file_name)
+
+        tick()
+        self.write_file("include.svh", "module mod2; endmodule")
+        CACHE_STATISTICS.reset()
+        parser = VerilogParser(database=cache)
+        self.assertEqual(parser.parse("first.sv").modules[0].name, "mod2")
+        self.assertEqual(CACHE_STATISTICS.to_dict()["VerilogParser.parse"]["invalidations"], 2)
+        self.assertFalse(parser.is_cached("second.sv"))
+        self.assertTrue(parser.is_cached("third.sv"))
+        self.assertEqual(parser.parse("second.sv").modules[0].name, "mod2")
+
+    def test_changed_include_is_found_without_its_dependents(self):
+        self.write_file("include.svh", "module mod1; endmodule")
+        self.write_file("first.sv", '`include "include.svh"')
+        cache = {}
+        VerilogParser(database=cache).parse("first.sv")
+        for key in [key for key in cache if key.startswith(b"VerilogParser.dependents(")]:
+            del cache[key]
+
+        tick()
+        self.write_file("include.svh", "module mod2; endmodule")
+        parser = VerilogParser(database=cache)
+        self.assertFalse(parser.is_cached("first.sv"))
+        self.assertEqual(parser.parse("first.sv").modules[0].name, "mod2")
+
+    def test_changed_include_removes_results_of_all_parse_modes(self):
+        self.write_file("include.svh", "module mod1; endmodule")
+        self.write_file("first.sv", '`include "include.svh"')
+        cache = {}
+        VerilogParser(database=cache).parse("first.sv")
+        VerilogParser(database=cache, dependencies_only=True).parse("first.sv")
+        num_keys = len(cache)
+
+        tick()
+        self.write_file("include.svh", "module mod2; endmodule")
+        CACHE_STATISTICS.reset()
+        self.assertEqual(VerilogParser(database=cache).parse("first.sv").modules[0].name, "mod2")
+        self.assertEqual(CACHE_STATISTICS.to_dict()["VerilogParser.parse"]["invalidations"], 2)
+        self.assertEqual(len(cache), num_keys - 1)
+
+    def test_cached_includes_are_resolved_once_per_include_paths(self):
+        self.write_file("include.svh", "")
+        code = '`include "include.svh"\n`include "include.svh"'
+        self.write_file("first.sv", code)
+        self.write_file("second.sv", code)
+        cache = {}
+        parser = VerilogParser(database=cache)
+        parser.parse("first.sv")
+        parser.parse("second.sv")
+
+        parser = VerilogParser(database=cache)
+        with mock.patch("vunit.parsing.verilog.preprocess.IncludeResolver._find",
+                        autospec=True, side_effect=IncludeResolver._find) as find:  # pylint: disable=protected-access
+            self.assertTrue(parser.is_cached("first.sv"))
+            self.assertTrue(parser.is_cached("second.sv"))
+            self.assertEqual(find.call_count, 1)
+
+    def test_cached_includes_are_checked_once_per_run(self):
+        self.write_file("include.svh", "")
+        code = '`include "include.svh"\n`include "include.svh"'
+        self.write_file("first.sv", code)
+        self.write_file("second.sv", code)
+        cache = {}
+        parser = VerilogParser(database=cache)
+        parser.parse("first.sv")
+        parser.parse("second.sv")
+
+        parser = VerilogParser(database=cache)
+        with mock.patch("vunit.parsing.verilog.parser.file_content_hash",
+                        side_effect=file_content_hash) as content_hash:
+            with mock.patch("vunit.parsing.verilog.preprocess.exists", wraps=exists) as exists_mock:
+                self.assertTrue(parser.is_cached("first.sv"))
+                self.assertTrue(parser.is_cached("second.sv"))
+                self.assertEqual(content_hash.call_count, 3)
+                # Once to check case sensitivity and once per file found in the directory listing
+                self.assertEqual(exists_mock.call_count, 1 + 3)
+
     def write_file(self, file_name, contents):
         """
         Write file with contents into output path
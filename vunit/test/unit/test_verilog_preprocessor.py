@@ -4,7 +4,7 @@
 #
 # Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
 
-# pylint: disable=too-many-public-methods
+# pylint: disable=too-many-public-methods, too-many-lines
 # pylint: disable=unused-wildcard-import
 # pylint: disable=wildcard-import
 
@@ -17,9 +17,12 @@ import os
 from unittest import TestCase
 import shutil
 from vunit.ostools import renew_path, write_file
-from vunit.parsing.verilog.preprocess import VerilogPreprocessor, Macro
+from vunit.parsing.verilog.preprocess import (VerilogPreprocessor, TokenCache, IncludeCache, IncludeResolver,
+                                              MacroExpansionCache, find_included_file, Macro)
 from vunit.parsing.verilog.tokenizer import VerilogTokenizer
 from vunit.parsing.tokenizer import Token
+from vunit.database import DataBase, PickledDataBase
+from vunit.cache_statistics import CACHE_STATISTICS
 from vunit.test.mock_2or3 import mock
 
 
@@ -172,6 +175,178 @@ class TestVerilogPreprocessor(TestCase):
                                  include_paths=[self.output_path])
         result.assert_no_log()
 
+    def test_include_file_is_tokenized_once(self):
+        self.write_file("include.svh", "hello")
+        CACHE_STATISTICS.reset()
+        result = self.preprocess('`include "include.svh"\n`include "include.svh"',
+                                 include_paths=[self.output_path])
+        result.assert_has_tokens("hello\nhello")
+        statistics = CACHE_STATISTICS.to_dict()["TokenCache.tokenize"]
+        self.assertEqual(statistics["misses"], 1)
+        self.assertEqual(statistics["hits"], 1)
+
+        included_file = join(self.output_path, "include.svh")
+        first, _, second = result.tokens
+        self.assertEqual(first.location, ((included_file, (0, 4)), (("fn.v", (0, 7)), None)))
+        self.assertEqual(second.location, ((included_file, (0, 4)), (("fn.v", (23, 30)), None)))
+
+    def test_token_cache_is_stored_in_database(self):
+        file_name = join(self.output_path, "include.svh")
+        self.write_file("include.svh", "hello")
+        tokenizer = VerilogTokenizer()
+        database = PickledDataBase(DataBase(join(self.output_path, "database")))
+        expected = tokenizer.tokenize("hello", file_name=file_name, previous_location="previous")
+        self.assertEqual(TokenCache(tokenizer, database=database).tokenize(file_name, "previous"),
+                         expected)
+        database.flush()
+
+        CACHE_STATISTICS.reset()
+        database = PickledDataBase(DataBase(join(self.output_path, "database")))
+        self.assertEqual(TokenCache(tokenizer, database=database).tokenize(file_name, "previous"),
+                         expected)
+        self.assertEqual(CACHE_STATISTICS.to_dict()["TokenCache.tokenize"]["database_hits"], 1)
+
+        self.write_file("include.svh", "hey")
+        self.assertEqual(TokenCache(tokenizer, database=database).tokenize(file_name),
+                         tokenizer.tokenize("hey", file_name=file_name))
+
+    def test_included_file_result_is_reused_with_same_defines(self):
+        self.write_file("include.svh", "`define foo(x) x+1\n`foo(2)\n")
+        tokenizer = VerilogTokenizer()
+        preprocessor = VerilogPreprocessor(tokenizer)
+        code = '`include "include.svh"\n`foo(3)'
+        CACHE_STATISTICS.reset()
+        for file_name in ("fn1.v", "fn2.v", "fn3.v"):
+            self.assertEqual(self._preprocess_file(preprocessor, code, file_name),
+                             self._preprocess_file(VerilogPreprocessor(tokenizer), code, file_name))
+        self.assertEqual(CACHE_STATISTICS.to_dict()["IncludeCache.lookup"]["hits"], 1)
+
+    def test_included_file_result_keeps_locations_of_macros_defined_outside(self):
+        self.write_file("a.svh", "`define foo(x) x+1\n")
+        self.write_file("c.svh", "`foo(2)\nbar\n")
+        tokenizer = VerilogTokenizer()
+        preprocessor = VerilogPreprocessor(tokenizer)
+        for file_name, code in (("m1.sv", '`include "a.svh"\n`include "c.svh"\n'),
+                                ("m2.sv", '\n`include "a.svh"\n\n`include "c.svh"\n'),
+                                ("m3.sv", '`include "a.svh"\n`include "c.svh"\n'),
+                                ("m4.sv", '  `include "a.svh"\n  `include "c.svh"\n')):
+            tokens = self._preprocess_file(preprocessor, code, file_name)
+            expected = self._preprocess_file(VerilogPreprocessor(tokenizer), code, file_name)
+            self.assertEqual([token.location for token in tokens],
+                             [token.location for token in expected])
+            self.assertEqual(tokens, expected)
+
+    def test_included_file_result_depends_on_defines(self):
+        self.write_file("include.svh", "`ifdef foo\nfoo\n`else\nbar\n`endif\n")
+        preprocessor = VerilogPreprocessor(VerilogTokenizer())
+        for _ in range(3):
+            self.assertEqual(strip_loc(self._preprocess_file(preprocessor, '`include "include.svh"')),
+                             strip_loc(tokenize("bar\n")))
+            self.assertEqual(strip_loc(self._preprocess_file(preprocessor, '`define foo\n`include "include.svh"')),
+                             strip_loc(tokenize("foo\n")))
+
+    def test_included_file_result_depends_on_resolved_includes(self):
+        self.write_file("include.svh", '`include "nested.svh"')
+        self.write_file(join("dir1", "nested.svh"), "one")
+        self.write_file(join("dir2", "nested.svh"), "two")
+        preprocessor = VerilogPreprocessor(VerilogTokenizer())
+        for _ in range(3):
+            for name in ("one", "two"):
+                include_paths = [self.output_path, join(self.output_path, "dir1" if name == "one" else "dir2")]
+                self.assertEqual(strip_loc(self._preprocess_file(preprocessor, '`include "include.svh"',
+                                                                 include_paths=include_paths)),
+                                 strip_loc(tokenize(name)))
+
+    def test_included_file_result_is_stored_in_database(self):
+        self.write_file("include.svh", "`define foo(x) x+1\n`foo(2)\n")
+        tokenizer = VerilogTokenizer()
+        code = '`include "include.svh"\n`foo(3)'
+        expected = self._preprocess_file(VerilogPreprocessor(tokenizer), code)
+
+        def create_preprocessor():
+            token_cache = TokenCache(tokenizer)
+            database = PickledDataBase(DataBase(join(self.output_path, "database")))
+            return VerilogPreprocessor(tokenizer, token_cache,
+                                       IncludeCache(token_cache.content_hash, database=database)), database
+
+        preprocessor, database = create_preprocessor()
+        for _ in range(2):
+            self.assertEqual(self._preprocess_file(preprocessor, code), expected)
+        database.flush()
+
+        CACHE_STATISTICS.reset()
+        preprocessor, database = create_preprocessor()
+        self.assertEqual(self._preprocess_file(preprocessor, code), expected)
+        self.assertEqual(CACHE_STATISTICS.to_dict()["IncludeCache.lookup"]["database_hits"], 1)
+
+    def test_include_resolver_finds_same_files_as_find_included_file(self):
+        self.write_file(join("first", "include.svh"), "")
+        self.write_file(join("first", "sub", "nested.svh"), "")
+        self.write_file(join("second", "include.svh"), "")
+        self.write_file(join("second", "other.svh"), "")
+        os.makedirs(join(self.output_path, "second", "directory.svh"))
+        include_paths = [join(self.output_path, "missing"),
+                         join(self.output_path, "first"),
+                         join(self.output_path, "second")]
+        resolver = IncludeResolver()
+        for _ in range(2):
+            for paths in (include_paths, list(reversed(include_paths)), include_paths[:1], []):
+                for file_name in ("include.svh", "other.svh", "missing.svh", "directory.svh",
+                                  join("sub", "nested.svh"), join("..", "second", "other.svh"),
+                                  join("sub", "missing.svh"), join("missing", "include.svh")):
+                    self.assertEqual(resolver.find(paths, file_name), find_included_file(paths, file_name))
+
+    def test_include_resolver_lists_each_directory_once(self):
+        self.write_file(join("first", "include.svh"), "")
+        self.write_file(join("second", "other.svh"), "")
+        include_paths = [join(self.output_path, "first"), join(self.output_path, "second")]
+        resolver = IncludeResolver()
+        with mock.patch("vunit.parsing.verilog.preprocess.os.listdir", wraps=os.listdir) as listdir:
+            with mock.patch("vunit.parsing.verilog.preprocess.exists", wraps=exists) as exists_mock:
+                for file_name in ("include.svh", "other.svh", "missing1.svh", "missing2.svh"):
+                    resolver.find(include_paths, file_name)
+                    resolver.find(include_paths[::-1], file_name)
+                self.assertEqual(listdir.call_count, 2)
+                # Once per directory to check case sensitivity and once per file found
+                self.assertEqual(exists_mock.call_count, 2 + 2)
+
+    def test_macro_expansion_is_reused_with_same_actuals(self):
+        code = """\
+`define add(a, b=1) ((a) + (b))
+`define twice(x) `add(x, x) * `add(x)
+`twice(y) `twice(y) `twice(y) `twice( y )
+"""
+        with mock.patch.object(MacroExpansionCache, "store", autospec=True):
+            expected = self._preprocess_file(VerilogPreprocessor(VerilogTokenizer()), code)
+
+        CACHE_STATISTICS.reset()
+        self.assertEqual(self._preprocess_file(VerilogPreprocessor(VerilogTokenizer()), code), expected)
+        self.assertEqual(CACHE_STATISTICS.to_dict()["MacroExpansionCache.lookup"]["hits"], 1)
+
+    def test_macro_expansion_cache_is_cleared_when_defines_change(self):
+        result = self.preprocess("""\
+`define one 1
+`define foo `one
+`foo `foo `foo
+`undef one
+`define one 2
+`foo `foo `foo
+`resetall
+`define one 3
+`define foo `one
+`foo `foo `foo
+""")
+        result.assert_has_tokens("1 1 1\n\n2 2 2\n\n3 3 3\n")
+        result.assert_no_log()
+
+    def _preprocess_file(self, preprocessor, code, file_name="fn.v", include_paths=None):
+        """
+        Preprocess code of file_name using preprocessor
+        """
+        include_paths = [self.output_path] if include_paths is None else include_paths
+        tokens = VerilogTokenizer().tokenize(code, file_name=file_name)
+        return preprocessor.preprocess(tokens, include_paths=include_paths)
+
     def test_detects_circular_macro_expansion_of_self(self):
         result = self.preprocess('''
 `define foo `foo
@@ -9,9 +9,15 @@ Test of the VHDL parser
 """
 
 from unittest import TestCase
+from vunit.test.mock_2or3 import mock
 from vunit.vhdl_parser import (VHDLDesignFile,
                                VHDLInterfaceElement,
                                VHDLEntity,
+                               VHDLArchitecture,
+                               VHDLPackage,
+                               VHDLPackageBody,
+                               VHDLContext,
+                               VHDLConfiguration,
                                VHDLSubtypeIndication,
                                VHDLEnumerationType,
                                VHDLArrayType,
@@ -385,6 +391,108 @@ end architecture;
         self.assertEqual(component_instantiations[1], "foo2")
         self.assertEqual(component_instantiations[2], "foo3")
 
+    def test_component_instantiations_without_closing_association_list_are_ignored(self):
+        design_file = VHDLDesignFile.parse("""
+architecture arch of top is
+begin
+    label1 : foo port map (clk => clk) ;
+    label2 : foo port map (clk => clk(0)), rst => rst);
+    label3 : foo port map (clk => clk
+    label4 : bar port map (clk => clk);
+end architecture;
+""")
+        self.assertEqual(design_file.component_instantiations, ["foo", "bar"])
+
+    def test_parse_gives_same_result_as_separate_searches(self):
+        code = """\
+library ieee, work;
+use ieee.std_logic_1164.all, work.pkg.const;
+context work.ctx;
+
+context ctx is
+  library lib;
+  use lib.pkg2.all;
+end context;
+
+package pkg is
+  generic (package gen_pkg is new work.gen generic map (<>));
+  type enum_t is (a, b);
+  type rec_t is record
+    field : natural;
+  end record;
+  type arr_t is array (natural range <>) of enum_t;
+end package pkg;
+
+package body pkg is
+  package nested is new work.gen;
+end package body;
+
+package inst is new lib.gen generic map (width => 8);
+
+entity ent is
+  generic (width : natural := 8;
+           type data_t);
+  port (clk : in std_logic;
+        data : out std_logic_vector(width-1 downto 0));
+end entity ent;
+
+architecture a of ent is
+  component comp port (clk : in std_logic); end component;
+begin
+  entity_label : entity work.ent(a) port map (clk => clk);
+  use : comp port map (clk => clk);
+  label1 : component comp generic map (width => 2) port map (clk, "01");
+  label2 : configuration lib.cfg port map (clk => clk);
+  Label3:comp port map(clk);
+end architecture;
+
+configuration cfg of ent is
+  for a
+    for all : comp use entity work.ent; end for;
+  end for;
+end configuration;
+
+entity no_end is
+"""
+        self.assertEqual(_as_comparable(VHDLDesignFile.parse(code)),
+                         _as_comparable(_parse_with_separate_searches(code)))
+
+    def test_entity_generics_and_ports_are_parsed_when_used(self):
+        entity = self.parse_single_entity("""\
+entity ent is
+  generic (type data_t;
+           width : natural := 8;
+           runner_cfg : string);
+  port (clk : in std_logic);
+end entity;
+""")
+        with mock.patch("vunit.vhdl_parser.VHDLInterfaceElement.parse") as parse:
+            self.assertEqual(entity.generic_names, ["width", "runner_cfg"])
+            self.assertFalse(parse.called)
+
+        self.assertEqual([generic.identifier for generic in entity.generics], ["width", "runner_cfg"])
+        self.assertEqual(entity.generics[0].init_value, "8")
+        self.assertEqual(entity.ports[0].mode, "in")
+
+        with mock.patch("vunit.vhdl_parser.VHDLInterfaceElement.parse") as parse:
+            self.assertEqual(entity.generic_names, ["width", "runner_cfg"])
+            self.assertEqual([generic.identifier for generic in entity.generics], ["width", "runner_cfg"])
+            self.assertEqual(entity.ports[0].identifier, "clk")
+            self.assertFalse(parse.called)
+
+        entity.add_generic("extra", "natural")
+        self.assertEqual(entity.generic_names, ["width", "runner_cfg", "extra"])
+
+    def test_malformed_entity_clauses_fail_when_parsing(self):
+        for clause in ("generic (width : natural; 8);", "port (;);",
+                       "generic (width : 8);", "port (clk : in);"):
+            code = """\
+entity ent is
+  %s
+end entity;
+""" % clause
+            self.assertRaises(ValueError, VHDLDesignFile.parse, code)
+
     def test_adding_generics_to_entity(self):
         entity = VHDLEntity("name")
         entity.add_generic("max_value", "boolean", "20")
@@ -518,3 +626,35 @@ record
                             generics=[data_width],
                             ports=[clk, data])
         return entity
+
+
+def _parse_with_separate_searches(code):
+    """
+    Return a new VHDLDesignFile instance by searching the code once per kind of object
+    """
+    code = remove_comments(code).lower()
+    return VHDLDesignFile(entities=list(VHDLEntity.find(code)),
+                          architectures=list(VHDLArchitecture.find(code)),
+                          packages=list(VHDLPackage.find(code)),
+                          package_bodies=list(VHDLPackageBody.find(code)),
+                          contexts=list(VHDLContext.find(code)),
+                          component_instantiations=list(
+                              VHDLDesignFile._find_component_instantiations(code)),  # pylint: disable=protected-access
+                          configurations=list(VHDLConfiguration.find(code)),
+                          references=list(VHDLReference.find(code)))
+
+
+def _as_comparable(value):
+    """
+    Convert parsed objects into nested builtin types which can be compared
+    """
+    if isinstance(value, list):
+        return [_as_comparable(item) for item in value]
+
+    if hasattr(value, "__slots__"):
+        return (type(value).__name__,
+                dict((name, _as_comparable(getattr(value, name)))
+                     for cls in type(value).__mro__
+                     for name in cls.__dict__.get("__slots__", ())))
+
+    return value
@@ -16,8 +16,9 @@ import collections
 from collections import OrderedDict
 from vunit.ostools import file_exists
 from vunit.cached import cached
+from vunit.cache_statistics import CACHE_STATISTICS
 from vunit.test_list import TestList
-from vunit.vhdl_parser import remove_comments as remove_vhdl_comments
+from vunit.parsing.comments import strip_vhdl_comments, strip_verilog_comments, get_line_offsets
 from vunit.test_suites import IndependentSimTestCase, SameSimTestSuite
 from vunit.parsing.encodings import HDL_FILE_ENCODING
 from vunit.project import file_type_of, VERILOG_FILE_TYPES
@@ -32,10 +33,11 @@ class TestBench(ConfigurationVisitor):
     A VUnit test bench top level
     """
 
-    def __init__(self, design_unit, database=None):
+    def __init__(self, design_unit, database=None, shared_database=None):
         ConfigurationVisitor.__init__(self)
         self.design_unit = design_unit
         self._database = database
+        self._shared_database = shared_database
 
         self._individual_tests = False
         self._configs = {}
@@ -171,6 +173,13 @@ class TestBench(ConfigurationVisitor):
         if not file_exists(file_name):
             raise ValueError("File %r does not exist" % file_name)
 
+        with CACHE_STATISTICS.timed("TestBench.scan_tests_from_file"):
+            self._scan_tests_from_file(file_name)
+
+    def _scan_tests_from_file(self, file_name):
+        """
+        Scan file for test cases and attributes
+        """
         def parse(content):
             """
             Parse attributes and test case names
@@ -183,7 +192,9 @@ class TestBench(ConfigurationVisitor):
                                    file_name,
                                    encoding=HDL_FILE_ENCODING,
                                    database=self._database,
-                                   newline='')
+                                   newline='',
+                                   shared_database=self._shared_database,
+                                   relocate=_relocate_tests_and_attributes)
 
         for attr in attributes:
             if _is_user_attribute(attr.name):
@@ -390,21 +401,6 @@ _RE_VHDL_TEST_SUITE = re.compile(r'test_runner_setup\s*\(', re.IGNORECASE)
 _RE_VERILOG_TEST_SUITE = re.compile(r'`TEST_SUITE\b')
 
 
-def _get_line_offsets(code):
-    """
-    Returns a list with one entry per line returning the offset in the
-    code where it starts
-    """
-
-    offset = 0
-    offsets = []
-    for line in code.splitlines():
-        offsets.append(offset)
-        offset += len(line) + 1
-
-    return offsets
-
-
 def _lookup_lineno(offset, offsets):
     """
     Convert offset into line number
@@ -433,25 +429,25 @@ def _check_duplicate_tests(tests):
         raise RuntimeError('Duplicate tests where found')
 
 
-def _find_tests(code, file_name, line_offsets=None):
+def _find_tests(code, file_name, stripped=None):
     """
     Finds all tests within a file including implicit tests where there
     is only a test suite
 
+    stripped -- The StrippedCode of the code if the comments are already stripped
+
     returns a list to Test objects
     """
 
-    if line_offsets is None:
-        line_offsets = _get_line_offsets(code)
-
-    is_verilog = file_type_of(file_name) in VERILOG_FILE_TYPES
+    if stripped is None:
+        stripped = _strip_comments(code, file_name)
+    code = stripped.code
+    line_offsets = stripped.line_offsets
 
-    if is_verilog:
-        code = _remove_verilog_comments(code)
+    if file_type_of(file_name) in VERILOG_FILE_TYPES:
         regexp = _RE_VERILOG_TEST_CASE
         suite_regexp = _RE_VERILOG_TEST_SUITE
     else:
-        code = remove_vhdl_comments(code)
         regexp = _RE_VHDL_TEST_CASE
         suite_regexp = _RE_VHDL_TEST_SUITE
 
@@ -510,9 +506,10 @@ def _find_tests_and_attributes(content, file_name):
 
     Returns the tests and global attributes. The tests have been annotated with attributes.
     """
-    line_offsets = _get_line_offsets(content)
-    attributes = _find_attributes(content, file_name, line_offsets)
-    tests = _find_tests(content, file_name, line_offsets)
+    # The comments are stripped once and shared with _find_tests
+    stripped = _strip_comments(content, file_name)
+    attributes = _find_attributes(content, file_name, stripped.line_offsets)
+    tests = _find_tests(content, file_name, stripped)
 
     tests = sorted(tests, key=lambda test: test.location.offset)
     offsets = [test.location.offset for test in tests]
@@ -546,6 +543,28 @@ def _find_tests_and_attributes(content, file_name):
     return tests, global_attributes
 
 
+def _relocate_tests_and_attributes(result, old_file_name, new_file_name):  # pylint: disable=unused-argument
+    """
+    Returns tests and attributes parsed from another file with the same contents
+    with all locations moved to new_file_name
+    """
+    def relocate(location):
+        return FileLocation(new_file_name, location.offset, location.length, location.lineno)
+
+    def relocate_attribute(attr):
+        return attr._replace(location=relocate(attr.location))  # pylint: disable=protected-access
+
+    tests, attributes = result
+    new_tests = []
+    for test in tests:
+        new_test = Test(test.name, relocate(test.location))
+        for attr in test.attributes:
+            new_test.add_attribute(relocate_attribute(attr))
+        new_tests.append(new_test)
+
+    return new_tests, [relocate_attribute(attr) for attr in attributes]
+
+
 _RE_ATTR_NAME = r"[a-zA-Z0-9_\-]+"
 _RE_ATTRIBUTE = re.compile(r'vunit:\s*(?P<name>\.?' + _RE_ATTR_NAME + r')',
                            re.IGNORECASE)
@@ -571,7 +590,7 @@ def _find_attributes(code, file_name, line_offsets=None):
     """
 
     if line_offsets is None:
-        line_offsets = _get_line_offsets(code)
+        line_offsets = get_line_offsets(code)
 
     attributes = []
 
@@ -606,22 +625,10 @@ Attribute = collections.namedtuple("Attribute", ["name", "value", "location"])
 LegacyAttribute = collections.namedtuple("LegacyAttribute", ["name", "value", "location"])
 
 
-VERILOG_REMOVE_COMMENT_RE = re.compile(r'(//[^\n]*)|(/\*.*?\*/)',
-                                       re.DOTALL)
-
-
-def _comment_repl(match):
-    """
-    Replace comment with equal amount of whitespace to make
-    lexical position unaffected
-    """
-    text = match.group(0)
-    return "".join(" " if c != "\n" else "\n"
-                   for c in text)
-
-
-def _remove_verilog_comments(code):
+def _strip_comments(code, file_name):
     """
-    Remove all verilog comments
+    Returns the StrippedCode of the code depending on the file type
     """
-    return VERILOG_REMOVE_COMMENT_RE.sub(_comment_repl, code)
+    if file_type_of(file_name) in VERILOG_FILE_TYPES:
+        return strip_verilog_comments(code)
+    return strip_vhdl_comments(code)
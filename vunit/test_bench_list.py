@@ -22,9 +22,10 @@ class TestBenchList(object):
     A list of test benchs
     """
 
-    def __init__(self, database=None):
+    def __init__(self, database=None, shared_database=None):
         self._libraries = OrderedDict()
         self._database = database
+        self._shared_database = shared_database
 
     def add_from_source_file(self, source_file):
         """
@@ -34,7 +35,7 @@ class TestBenchList(object):
             if design_unit.is_entity or design_unit.is_module:
                 if tb_filter is None or tb_filter(design_unit):
                     if design_unit.is_module or design_unit.is_entity:
-                        self._add_test_bench(TestBench(design_unit, self._database))
+                        self._add_test_bench(TestBench(design_unit, self._database, self._shared_database))
 
     def _add_test_bench(self, test_bench):
         """
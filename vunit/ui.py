@@ -236,8 +236,11 @@ import json
 import os
 from os.path import exists, abspath, join, basename, splitext, normpath, dirname
 from glob import glob
+from contextlib import contextmanager
 from fnmatch import fnmatch
-from vunit.database import PickledDataBase, DataBase
+from vunit.database import PickledDataBase, open_database, DATABASE_BACKENDS, DataBaseLockTimeout
+from vunit.cached import prestat, DATABASE_VERSION
+from vunit.cache_statistics import CACHE_STATISTICS
 from vunit import ostools
 from vunit.vunit_cli import VUnitCLI
 from vunit.simulator_factory import SIMULATOR_FACTORY
@@ -349,31 +352,42 @@ class VUnit(object):  # pylint: disable=too-many-instance-attributes, too-many-p
 
         self._create_output_path(args.clean)
 
-        database = self._create_database()
+        CACHE_STATISTICS.reset()
+        with _exit_on_database_lock_timeout():
+            database = self._create_database()
+        self._database = database
+        shared_database = self._create_shared_database()
         self._project = Project(
             database=database,
-            depend_on_package_body=simulator_class.package_users_depend_on_bodies)
+            depend_on_package_body=simulator_class.package_users_depend_on_bodies,
+            shared_database=shared_database)
 
-        self._test_bench_list = TestBenchList(database=database)
+        self._test_bench_list = TestBenchList(database=database,
+                                              shared_database=shared_database)
 
         self._builtins = Builtins(self, self._vhdl_standard, simulator_class)
         if compile_builtins:
             self.add_builtins()
 
+    _database_version_key = b"version"
+
     def _create_database(self):
         """
         Create a persistent database to store expensive parse results
 
-        Check for Python version used to create the database is the
-        same as the running python instance or re-create
+        Check for Python version and hash algorithm used to create the
+        database is the same as the running python instance or re-create
+
+        The database backend is selected by the VUNIT_DATABASE_BACKEND environment variable
         """
         project_database_file_name = join(self._output_path, "project_database")
+        backend = select_database_backend()
         create_new = False
-        key = b"version"
-        version = str((9, sys.version)).encode()
+        key = self._database_version_key
+        version = str(DATABASE_VERSION).encode()
         database = None
         try:
-            database = DataBase(project_database_file_name)
+            database = open_database(project_database_file_name, backend)
             create_new = (key not in database) or (database[key] != version)
         except KeyboardInterrupt:
             raise KeyboardInterrupt
@@ -382,11 +396,44 @@ class VUnit(object):  # pylint: disable=too-many-instance-attributes, too-many-p
             create_new = True
 
         if create_new:
-            database = DataBase(project_database_file_name, new=True)
+            database = open_database(project_database_file_name, backend, new=True)
         database[key] = version
 
         return PickledDataBase(database)
 
+    def _create_shared_database(self):
+        """
+        Create the database of parse results shared between output paths if enabled
+
+        The path is taken from the --shared-cache-path argument or the
+        VUNIT_SHARED_CACHE_PATH environment variable
+        """
+        shared_cache_path = self._args.shared_cache_path
+        if shared_cache_path is None:
+            shared_cache_path = os.environ.get("VUNIT_SHARED_CACHE_PATH", None)
+        if shared_cache_path is None:
+            return None
+
+        try:
+            database = open_database(join(abspath(shared_cache_path), "parse_cache"), "sqlite")
+        except KeyboardInterrupt:
+            raise KeyboardInterrupt
+        except:  # pylint: disable=bare-except
+            LOGGER.warning("Could not open shared cache in %s", shared_cache_path, exc_info=True)
+            return None
+
+        # Every write is done directly to share results with concurrent processes
+        return PickledDataBase(database, cache_size=0)
+
+    @contextmanager
+    def _database_transaction(self):
+        """
+        Group the database writes made while adding source files and
+        write them to the project database when done
+        """
+        with _exit_on_database_lock_timeout(), self._database.transaction():
+            yield
+
     @staticmethod
     def _configure_logging(log_level):
         """
@@ -705,6 +752,15 @@ class VUnit(object):  # pylint: disable=too-many-instance-attributes, too-many-p
                                                           no_parse=no_parse,
                                                           file_type=file_type)
 
+    def _parse_in_parallel(self, files):
+        """
+        Parse files not found in the database using --parse-processes processes
+        before they are added
+
+        :param files: A list of (file_name, file_type, include_dirs, defines) tuples
+        """
+        self._project.parse_in_parallel(files, self._args.parse_processes)
+
     def _preprocess(self, library_name, file_name, preprocessors):
         """
         Preprocess file_name within library_name using explicit preprocessors
@@ -791,7 +847,8 @@ avoid location preprocessing of other functions sharing name with a VUnit log or
           argument which is an instance of :class:`.Results`
         """
         try:
-            all_ok = self._main(post_run)
+            with _exit_on_database_lock_timeout():
+                all_ok = self._main(post_run)
         except KeyboardInterrupt:
             sys.exit(1)
         except CompileError:
@@ -822,6 +879,12 @@ avoid location preprocessing of other functions sharing name with a VUnit log or
         """
         Base vunit main function without performing exit
         """
+        # All source files have been added and parsed at this point
+        self._database.flush()
+        self._report_cache_statistics()
+
+        if self._args.compact_database:
+            return self._main_compact_database()
 
         if self._args.export_json is not None:
             return self._main_export_json(self._args.export_json)
@@ -838,6 +901,31 @@ avoid location preprocessing of other functions sharing name with a VUnit log or
         all_ok = self._main_run(post_run)
         return all_ok
 
+    def _report_cache_statistics(self):
+        """
+        Log the statistics of the caches used while adding source files
+        and optionally write them to a JSON file
+        """
+        CACHE_STATISTICS.log_summary(LOGGER)
+        LOGGER.info("Cache project_database: %s",
+                    ", ".join("%s=%i" % item for item in sorted(self._database.stats.items())))
+
+        if self._args.cache_statistics is not None:
+            CACHE_STATISTICS.write_json(self._args.cache_statistics,
+                                        extra={"project_database": self._database.stats})
+
+    def _collect_database_garbage(self):
+        """
+        Remove project database entries not used during this run such
+        as parse results of removed or renamed files
+
+        Only done with --compact-database since a run which only adds
+        some of the source files would remove the entries of the others
+        """
+        num_removed = self._database.collect_garbage(keep=[self._database_version_key])
+        LOGGER.debug("Removed %i stale project database entries", num_removed)
+        return num_removed
+
     def _create_simulator_if(self):
         """
         Create new simulator instance
@@ -956,6 +1044,17 @@ avoid location preprocessing of other functions sharing name with a VUnit log or
         print("Listed %i files" % len(files))
         return True
 
+    def _main_compact_database(self):
+        """
+        Main function when only removing stale entries from and compacting the project database
+        """
+        size_before = self._database.size
+        num_removed = self._collect_database_garbage()
+        self._database.compact()
+        print("Removed %i stale entries and reclaimed %i bytes from the project database"
+              % (num_removed, size_before - self._database.size))
+        return True
+
     def _main_compile_only(self):
         """
         Main function when only compiling
@@ -1268,10 +1367,19 @@ class Library(object):
             check_not_empty(new_file_names, allow_empty, "Pattern %r did not match any file" % pattern_instance)
             file_names += new_file_names
 
-        return SourceFileList(source_files=[
-            self.add_source_file(file_name, preprocessors, include_dirs, defines, vhdl_standard,
-                                 no_parse=no_parse, file_type=file_type)
-            for file_name in file_names])
+        with self._parent._database_transaction(), prestat(file_names):  # pylint: disable=protected-access
+            prepared = [self._prepare_source_file(file_name, preprocessors, include_dirs, file_type)
+                        for file_name in file_names]
+
+            if not no_parse:
+                self._parent._parse_in_parallel(  # pylint: disable=protected-access
+                    [(new_file_name, file_type_, include_dirs_, defines)
+                     for _, new_file_name, file_type_, include_dirs_ in prepared])
+
+            return SourceFileList(source_files=[
+                self._add_prepared_source_file(file_name, new_file_name, file_type_, include_dirs_, defines,
+                                               vhdl_standard, no_parse=no_parse)
+                for file_name, new_file_name, file_type_, include_dirs_ in prepared])
 
     def add_source_file(self,  # pylint: disable=too-many-arguments
                         file_name, preprocessors=None, include_dirs=None, defines=None,
@@ -1294,6 +1402,17 @@ class Library(object):
 
            library.add_source_file("file.vhd")
 
+        """
+        file_name, new_file_name, file_type, include_dirs = self._prepare_source_file(
+            file_name, preprocessors, include_dirs, file_type)
+        return self._add_prepared_source_file(file_name, new_file_name, file_type, include_dirs, defines,
+                                              vhdl_standard, no_parse)
+
+    def _prepare_source_file(self, file_name, preprocessors, include_dirs, file_type):
+        """
+        Preprocess a source file before adding it
+
+        :returns: The file name, the preprocessed file name, the file type and include directories
         """
         file_name = abspath(file_name)
 
@@ -1308,18 +1427,26 @@ class Library(object):
 
         new_file_name = self._parent._preprocess(  # pylint: disable=protected-access
             self._library_name, file_name, preprocessors)
+        return file_name, new_file_name, file_type, include_dirs
 
-        source_file = self._project.add_source_file(new_file_name,
-                                                    self._library_name,
-                                                    file_type=file_type,
-                                                    include_dirs=include_dirs,
-                                                    defines=defines,
-                                                    vhdl_standard=vhdl_standard,
-                                                    no_parse=no_parse)
-        # To get correct tb_path generic
-        source_file.original_name = file_name
+    def _add_prepared_source_file(self,  # pylint: disable=too-many-arguments
+                                  file_name, new_file_name, file_type, include_dirs, defines,
+                                  vhdl_standard, no_parse):
+        """
+        Add a source file prepared by _prepare_source_file to the library
+        """
+        with self._parent._database_transaction():  # pylint: disable=protected-access
+            source_file = self._project.add_source_file(new_file_name,
+                                                        self._library_name,
+                                                        file_type=file_type,
+                                                        include_dirs=include_dirs,
+                                                        defines=defines,
+                                                        vhdl_standard=vhdl_standard,
+                                                        no_parse=no_parse)
+            # To get correct tb_path generic
+            source_file.original_name = file_name
 
-        self._test_bench_list.add_from_source_file(source_file)
+            self._test_bench_list.add_from_source_file(source_file)
 
         return SourceFile(source_file,
                           self._project,
@@ -1917,6 +2044,32 @@ def select_vhdl_standard(vhdl_standard=None):
     return vhdl_standard
 
 
+@contextmanager
+def _exit_on_database_lock_timeout():
+    """
+    Exit with an error message instead of a traceback when a database
+    is locked by another process for longer than the timeout
+    """
+    try:
+        yield
+    except DataBaseLockTimeout as exc:
+        LOGGER.error("%s\n"
+                     "Another VUnit process is using the same database, "
+                     "wait for it to finish or use another --output-path", exc)
+        sys.exit(1)
+
+
+def select_database_backend():
+    """
+    Select the project database backend according to the environment variable VUNIT_DATABASE_BACKEND
+    """
+    backend = os.environ.get("VUNIT_DATABASE_BACKEND", "nodes")
+    if backend not in DATABASE_BACKENDS:
+        raise ValueError("Unknown database backend %r from VUNIT_DATABASE_BACKEND environment variable not one of %r"
+                         % (backend, DATABASE_BACKENDS))
+    return backend
+
+
 def lower_generics(generics):
     """
     Convert all generics names to lower case to match internal representation.
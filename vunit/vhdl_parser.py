@@ -13,8 +13,11 @@ VHDL parsing functionality
 import re
 from os.path import abspath
 import logging
-from vunit.cached import cached
+from vunit.cached import cached, is_cached, store_cached
+from vunit.ostools import read_file
 from vunit.parsing.encodings import HDL_FILE_ENCODING
+from vunit.parsing.comments import strip_vhdl_comments
+from vunit.parsing.slotted import Slotted
 LOGGER = logging.getLogger(__name__)
 
 
@@ -23,8 +26,11 @@ class VHDLParser(object):
     Parse a single VHDL file, caching the result to a database if available
     """
 
-    def __init__(self, database=None):
+    _key = "CachedVHDLParser.parse"
+
+    def __init__(self, database=None, shared_database=None):
         self._database = database
+        self._shared_database = shared_database
 
     def parse(self, file_name):
         """
@@ -32,17 +38,47 @@ class VHDLParser(object):
         parse result is re-used if content hash found in database
         """
         file_name = abspath(file_name)
-        return cached("CachedVHDLParser.parse",
+        return cached(self._key,
                       VHDLDesignFile.parse,
                       file_name,
                       encoding=HDL_FILE_ENCODING,
-                      database=self._database)
+                      database=self._database,
+                      shared_database=self._shared_database)
+
+    def is_cached(self, file_name):
+        """
+        Returns True if parse would re-use a result from the database
+        """
+        return is_cached(self._key,
+                         abspath(file_name),
+                         database=self._database,
+                         shared_database=self._shared_database)
+
+    def store(self, file_name, design_file):
+        """
+        Store the result of parse_file from another process into the database
+        """
+        store_cached(self._key,
+                     abspath(file_name),
+                     design_file,
+                     database=self._database,
+                     shared_database=self._shared_database)
 
 
-class VHDLDesignFile(object):  # pylint: disable=too-many-instance-attributes
+def parse_file(file_name):
+    """
+    Parse the VHDL file without using any database
+    """
+    return VHDLDesignFile.parse(read_file(file_name, encoding=HDL_FILE_ENCODING))
+
+
+class VHDLDesignFile(Slotted):  # pylint: disable=too-many-instance-attributes
     """
     Contains VHDL objects found within a file
     """
+    __slots__ = ("entities", "packages", "package_bodies", "architectures", "contexts",
+                 "component_instantiations", "configurations", "references")
+
     def __init__(self,  # pylint: disable=too-many-arguments
                  entities=None,
                  packages=None,
@@ -67,18 +103,13 @@ class VHDLDesignFile(object):  # pylint: disable=too-many-instance-attributes
         Return a new VHDLDesignFile instance by parsing the code
         """
         code = remove_comments(code).lower()
-        return cls(entities=list(VHDLEntity.find(code)),
-                   architectures=list(VHDLArchitecture.find(code)),
-                   packages=list(VHDLPackage.find(code)),
-                   package_bodies=list(VHDLPackageBody.find(code)),
-                   contexts=list(VHDLContext.find(code)),
-                   component_instantiations=list(cls._find_component_instantiations(code)),
-                   configurations=list(VHDLConfiguration.find(code)),
-                   references=list(VHDLReference.find(code)))
+        return _VHDLScanner(code).scan(cls)
 
+    # The association list is matched by a lookahead which is not backtracked into
+    # and must end with the closing parenthesis before the semicolon
     _component_re = re.compile(
         r"[a-zA-Z]\w*\s*\:\s*(?:component)?\s*(?:(?:[a-zA-Z]\w*)\.)?([a-zA-Z]\w*)\s*"
-        r"(?:generic|port) map\s*\([\s\w\=\>\,\.\)\(\+\-\'\"]*\);",
+        r"(?:generic|port) map\s*\((?=(?P<associations>[\s\w\=\>\,\.\)\(\+\-\'\"]*))(?P=associations)(?<=\));",
         re.IGNORECASE)
 
     @classmethod
@@ -86,14 +117,15 @@ class VHDLDesignFile(object):  # pylint: disable=too-many-instance-attributes
         """
         Return the component name of all component instantiations found within the code
         """
-        matches = cls._component_re.findall(code)
-        return [comp_name for comp_name in matches]
+        return [match.group(1) for match in cls._component_re.finditer(code)]
 
 
-class VHDLPackageBody(object):
+class VHDLPackageBody(Slotted):
     """
     Representation of a VHDL package body
     """
+    __slots__ = ("identifier",)
+
     def __init__(self, identifier):
         self.identifier = identifier
 
@@ -118,10 +150,12 @@ class VHDLPackageBody(object):
             yield VHDLPackageBody(match.group('package'))
 
 
-class VHDLConfiguration(object):
+class VHDLConfiguration(Slotted):
     """
     A configuratio declaration
     """
+    __slots__ = ("identifier", "entity")
+
     def __init__(self, identifier, entity):
         self.identifier = identifier
         self.entity = entity
@@ -148,10 +182,12 @@ class VHDLConfiguration(object):
         return [cls(match.group('id'), match.group('entity_id')) for match in matches]
 
 
-class VHDLArchitecture(object):
+class VHDLArchitecture(Slotted):
     """
     Representation of a VHDL architecture
     """
+    __slots__ = ("identifier", "entity")
+
     def __init__(self, identifier, entity):
         self.identifier = identifier
         self.entity = entity
@@ -184,10 +220,12 @@ PACKAGE_INSTANCE_PATTERN = (
     r'\bpackage\s+(?P<new_name>[a-zA-Z]\w*)\s+is\s+new\s+(?P<lib>[a-zA-Z]\w*)\.(?P<name>[a-zA-Z]\w*)')
 
 
-class VHDLPackage(object):
+class VHDLPackage(Slotted):
     """
     Representation of a VHDL package
     """
+    __slots__ = ("identifier", "enumeration_types", "record_types", "array_types")
+
     def __init__(self, identifier,
                  enumeration_types, record_types, array_types):
         self.identifier = identifier
@@ -210,19 +248,28 @@ class VHDLPackage(object):
         Iterate over new instances of VHDLPackage for all packages within the code
         """
         for package in cls._package_start_re.finditer(code):
-            identifier = package.group('id')
-            package_end = re.compile(r"""
-                \b                            # Word boundary
-                end                           # end keyword
-                (\s+package)?                 # Optional package keyword
-                (\s+""" + identifier + r""")? # Optional identifier
-                [\s]*                         # Potential whitespaces
-                ;                             # Semicolon
-                """, re.MULTILINE | re.IGNORECASE | re.VERBOSE)
-            sub_code = code[package.start():]
-            match = package_end.search(sub_code)
-            if match:
-                yield cls.parse(sub_code[:match.end()])
+            result = cls._from_start_match(code, package)
+            if result is not None:
+                yield result
+
+    @classmethod
+    def _from_start_match(cls, code, package):
+        """
+        Returns a new instance for the package starting at the match or None if it has no end
+        """
+        identifier = package.group('id')
+        package_end = re.compile(r"""
+            \b                            # Word boundary
+            end                           # end keyword
+            (\s+package)?                 # Optional package keyword
+            (\s+""" + identifier + r""")? # Optional identifier
+            [\s]*                         # Potential whitespaces
+            ;                             # Semicolon
+            """, re.MULTILINE | re.IGNORECASE | re.VERBOSE)
+        match = package_end.search(code, package.start())
+        if match:
+            return cls.parse(code[package.start():match.end()])
+        return None
 
     _package_instance_re = re.compile("^" + PACKAGE_INSTANCE_PATTERN,
                                       re.MULTILINE | re.IGNORECASE)
@@ -261,39 +308,97 @@ class VHDLPackage(object):
         return cls(identifier, enumeration_types, record_types, array_types)
 
 
-class VHDLEntity(object):
+class VHDLEntity(Slotted):
     """
     Represents a VHDL Entity
+
+    The generic and port clauses of a parsed entity are only parsed when first used
     """
+    __slots__ = ("identifier", "_generics", "_ports", "_generic_clause", "_port_clause",
+                 "_parsed_generics", "_parsed_ports")
+    _pickle_version = 2
+    _transient_slots = ("_parsed_generics", "_parsed_ports")
+
     def __init__(self, identifier, generics=None, ports=None):
         self.identifier = identifier
 
         if generics is not None:
-            self.generics = generics
+            self._generics = generics
         else:
-            self.generics = []
+            self._generics = []
 
         if ports is not None:
-            self.ports = ports
+            self._ports = ports
         else:
-            self.ports = []
+            self._ports = []
+
+        self._generic_clause = None
+        self._port_clause = None
+        self._parsed_generics = None
+        self._parsed_ports = None
+
+    @property
+    def generics(self):
+        """
+        The generics of the entity as VHDLInterfaceElement instances
+        """
+        if self._generic_clause is not None:
+            # The clause is kept since a parsed entity may be shared through the database cache
+            if self._parsed_generics is None:
+                self._parsed_generics = self._parse_generic_clause(self._generic_clause)
+            return self._parsed_generics
+        return self._generics
+
+    @generics.setter
+    def generics(self, value):
+        self._generic_clause = None
+        self._parsed_generics = None
+        self._generics = value
+
+    @property
+    def ports(self):
+        """
+        The ports of the entity as VHDLInterfaceElement instances
+        """
+        if self._port_clause is not None:
+            # The clause is kept since a parsed entity may be shared through the database cache
+            if self._parsed_ports is None:
+                self._parsed_ports = self._parse_port_clause(self._port_clause)
+            return self._parsed_ports
+        return self._ports
+
+    @ports.setter
+    def ports(self, value):
+        self._port_clause = None
+        self._parsed_ports = None
+        self._ports = value
+
+    @property
+    def generic_names(self):
+        """
+        The identifiers of the generics without parsing the rest of the generic clause
+        """
+        if self._generic_clause is None:
+            return [generic.identifier for generic in self._generics]
+        return [interface_element.split(':')[0].strip()
+                for interface_element in self._generic_interface_elements(self._generic_clause)]
 
     def add_generic(self, identifier, subtype_code, init_value=None):
         """
         Add a generic to this entity
         """
-        self.generics.append(VHDLInterfaceElement(identifier,
-                                                  VHDLSubtypeIndication.parse(subtype_code),
-                                                  init_value=init_value))
+        self.generics = self.generics + [VHDLInterfaceElement(identifier,
+                                                              VHDLSubtypeIndication.parse(subtype_code),
+                                                              init_value=init_value)]
 
     def add_port(self, identifier, mode, subtype_code, init_value=None):
         """
         Add a port to this entity
         """
-        self.ports.append(VHDLInterfaceElement(identifier,
-                                               VHDLSubtypeIndication.parse(subtype_code),
-                                               init_value=init_value,
-                                               mode=mode))
+        self.ports = self.ports + [VHDLInterfaceElement(identifier,
+                                                        VHDLSubtypeIndication.parse(subtype_code),
+                                                        init_value=init_value,
+                                                        mode=mode)]
 
     _entity_start_re = re.compile(r"""
         \b                    # Word boundary
@@ -310,22 +415,31 @@ class VHDLEntity(object):
         Iterates over new instances of VHDLEntity for all entities within the code
         """
         for entity in cls._entity_start_re.finditer(code):
-            identifier = entity.group('id')
-            sub_code = code[entity.start():]
-            entity_end_re = re.compile(r"""
-                \b                            # Word boundary
-                end                           # end keyword
-                [\s]*                         # Potential whitespaces
-                (entity)?                     # Optional entity keyword
-                [\s]*                         # Potential whitespaces
-                (""" + identifier + r""")?    # Optional identifier
-                [\s]*                         # Potential whitespaces
-                ;                             # Semicolon
-                """, re.MULTILINE | re.IGNORECASE | re.VERBOSE)
-
-            match = entity_end_re.search(sub_code)
-            if match:
-                yield VHDLEntity.parse(sub_code[:match.end()])
+            result = cls._from_start_match(code, entity)
+            if result is not None:
+                yield result
+
+    @classmethod
+    def _from_start_match(cls, code, entity):
+        """
+        Returns a new instance for the entity starting at the match or None if it has no end
+        """
+        identifier = entity.group('id')
+        entity_end_re = re.compile(r"""
+            \b                            # Word boundary
+            end                           # end keyword
+            [\s]*                         # Potential whitespaces
+            (entity)?                     # Optional entity keyword
+            [\s]*                         # Potential whitespaces
+            (""" + identifier + r""")?    # Optional identifier
+            [\s]*                         # Potential whitespaces
+            ;                             # Semicolon
+            """, re.MULTILINE | re.IGNORECASE | re.VERBOSE)
+
+        match = entity_end_re.search(code, entity.start())
+        if match:
+            return VHDLEntity.parse(code[entity.start():match.end()])
+        return None
 
     @classmethod
     def parse(cls, code):
@@ -343,11 +457,20 @@ class VHDLEntity(object):
             is                    # is keyword
             """, re_flags)
         identifier = entity_start.match(code).group('id')
+        entity = cls(identifier)
         # Find generics and ports
-        generics = cls._find_generic_clause(code)
-        ports = cls._find_port_clause(code)
+        generic_clause = cls._find_generic_clause(code)
+        port_clause = cls._find_port_clause(code)
 
-        return cls(identifier, generics, ports)
+        # Only split the clauses such that malformed clauses are still found when parsing
+        if generic_clause is not None:
+            cls._check_interface_elements(cls._generic_interface_elements(generic_clause))
+        if port_clause is not None:
+            cls._check_interface_elements(cls._port_interface_elements(port_clause), is_signal=True)
+
+        entity._generic_clause = generic_clause  # pylint: disable=protected-access
+        entity._port_clause = port_clause  # pylint: disable=protected-access
+        return entity
 
     @classmethod
     def _find_generic_clause(cls, code):
@@ -370,9 +493,8 @@ class VHDLEntity(object):
                 """, re_flags)
             match_semicolon = semicolon.match(code[match.end() + closing_pos:])
             if match_semicolon:
-                return cls._parse_generic_clause(
-                    code[match.start(): match.end() + closing_pos + match_semicolon.end()])
-        return []
+                return code[match.start(): match.end() + closing_pos + match_semicolon.end()]
+        return None
 
     @classmethod
     def _find_port_clause(cls, code):
@@ -396,9 +518,8 @@ class VHDLEntity(object):
                 """, re_flags)
             match_semicolon = semicolon.match(code[match.end() + closing_pos:])
             if match_semicolon:
-                return cls._parse_port_clause(
-                    code[match.start(): match.end() + closing_pos + match_semicolon.end()])
-        return []
+                return code[match.start(): match.end() + closing_pos + match_semicolon.end()]
+        return None
 
     @staticmethod
     def _split_not_in_par(string, sep):
@@ -445,9 +566,10 @@ class VHDLEntity(object):
     _function_generic_re = re.compile(r"\s*(impure\s+)?(function|procedure)\s+", re.MULTILINE | re.IGNORECASE)
 
     @classmethod
-    def _parse_generic_clause(cls, code):
+    def _generic_interface_elements(cls, code):
         """
-        Parse the generic clause and return a list of interface elements
+        Return the code of the interface elements of the generic clause
+        which are not package, type or function generics
         """
         # The generic list is between the outer parenthesis
         generic_list_string = code[code.find('(') + 1: code.rfind(')')]
@@ -455,8 +577,7 @@ class VHDLEntity(object):
         # Split the interface elements
         interface_elements = cls._split_not_in_par(generic_list_string, ';')
 
-        generic_list = []
-        # Add interface elements to the generic list
+        result = []
         for interface_element in interface_elements:
 
             if cls._package_generic_re.match(interface_element) is not None:
@@ -471,33 +592,71 @@ class VHDLEntity(object):
                 # Ignore function generics
                 continue
 
-            generic_list.append(VHDLInterfaceElement.parse(interface_element))
+            result.append(interface_element)
 
-        return generic_list
+        return result
 
     @classmethod
-    def _parse_port_clause(cls, code):
+    def _parse_generic_clause(cls, code):
         """
-        Parse the port clause and return a list of interface elements
+        Parse the generic clause and return a list of interface elements
+        """
+        return [VHDLInterfaceElement.parse(interface_element)
+                for interface_element in cls._generic_interface_elements(code)]
+
+    @staticmethod
+    def _port_interface_elements(code):
+        """
+        Return the code of the interface elements of the port clause
         """
         # The port list is between the outer parenthesis
         port_list_string = code[code.find('(') + 1: code.rfind(')')]
 
         # Split the interface elements
-        interface_elements = port_list_string.split(';')
+        return port_list_string.split(';')
+
+    _interface_element_re = re.compile(r"""
+        [^:]*                                               # Identifier
+        :                                                   # Colon
+        \s*                                                 # Potential whitespaces
+        (?:
+            (?:in|out|inout|buffer|linkage)\s+[a-zA-Z]      # A mode followed by a type mark
+            |
+            (?!(?:in|out|inout|buffer|linkage)(?:\s|:|$))[a-zA-Z]  # A type mark without a mode
+        )
+        """, re.VERBOSE)
 
+    @classmethod
+    def _check_interface_elements(cls, interface_elements, is_signal=False):
+        """
+        Raise ValueError if an interface element would fail to parse as a VHDLInterfaceElement
+        """
+        for interface_element in interface_elements:
+            if is_signal:
+                interface_element = interface_element.replace("signal", "")
+
+            if cls._interface_element_re.match(interface_element) is None:
+                raise ValueError("Failed to parse interface element %r" % interface_element)
+
+    @classmethod
+    def _parse_port_clause(cls, code):
+        """
+        Parse the port clause and return a list of interface elements
+        """
         port_list = []
         # Add interface elements to the port list
-        for interface_element in interface_elements:
+        for interface_element in cls._port_interface_elements(code):
             port_list.append(VHDLInterfaceElement.parse(interface_element, is_signal=True))
 
         return port_list
 
 
-class VHDLContext(object):
+class VHDLContext(Slotted):
     """
     Represents a VHDL 2008 context
     """
+    __slots__ = ("identifier",)
+
     def __init__(self, identifier):
         self.identifier = identifier
 
@@ -520,10 +679,12 @@ class VHDLContext(object):
             yield VHDLContext(identifier=identifier)
 
 
-class VHDLSubtypeIndication(object):
+class VHDLSubtypeIndication(Slotted):
     """
     Represents a VHDL subtype indication
     """
+    __slots__ = ("code", "type_mark", "constraint", "array_type")
+
     def __init__(self, code, type_mark, constraint, array_type):
         self.code = code
         self.type_mark = type_mark
@@ -555,10 +716,12 @@ class VHDLSubtypeIndication(object):
         return self.code
 
 
-class VHDLInterfaceElement(object):
+class VHDLInterfaceElement(Slotted):
     """
     Represents a VHDL interface element
     """
+    __slots__ = ("identifier", "mode", "subtype_indication", "init_value")
+
     def __init__(self, identifier, subtype_indication, mode=None, init_value=None):
         self.identifier = identifier
         self.mode = mode
@@ -627,8 +790,10 @@ class VHDLInterfaceElement(object):
         return code
 
 
-class VHDLEnumerationType(object):
+class VHDLEnumerationType(Slotted):
     """Represents a VHDL enumeration type"""
+    __slots__ = ("identifier", "literals")
+
     def __init__(self, identifier, literals):
         self.identifier = identifier
         self.literals = literals
@@ -656,15 +821,19 @@ class VHDLEnumerationType(object):
             yield cls(identifier, literals)
 
 
-class VHDLElementDeclaration(object):
+class VHDLElementDeclaration(Slotted):
     """Represents a VHDL element declaration"""
+    __slots__ = ("identifier_list", "subtype_indication")
+
     def __init__(self, identifier_list, subtype_indication):
         self.identifier_list = identifier_list
         self.subtype_indication = subtype_indication
 
 
-class VHDLRecordType(object):
+class VHDLRecordType(Slotted):
     """Represents a VHDL record type"""
+    __slots__ = ("identifier", "elements")
+
     def __init__(self, identifier, elements):
         self.identifier = identifier
         self.elements = elements
@@ -698,8 +867,10 @@ class VHDLRecordType(object):
             yield cls(identifier, parsed_elements)
 
 
-class VHDLRange(object):
+class VHDLRange(Slotted):
     """Represents a VHDL Range"""
+    __slots__ = ("range_type", "left", "right", "attribute")
+
     def __init__(self, range_type=None, left=None, right=None, attribute=None):
         self.range_type = range_type
         self.left = left
@@ -707,8 +878,10 @@ class VHDLRange(object):
         self.attribute = attribute
 
 
-class VHDLArrayType(object):
+class VHDLArrayType(Slotted):
     """Represents a VHDL array type"""
+    __slots__ = ("identifier", "subtype_indication", "range1", "range2")
+
     def __init__(self, identifier, subtype_indication, range1, range2):
         self.identifier = identifier
         self.subtype_indication = subtype_indication
@@ -840,10 +1013,12 @@ def find_closing_delimiter(start, end, code):
     raise ValueError('Failed to find closing delimiter to ' + start + ' in ' + code + '.')
 
 
-class VHDLReference(object):
+class VHDLReference(Slotted):
     """
     Reference to design unit
     """
+    __slots__ = ("reference_type", "library", "design_unit", "name_within")
+
     _reference_types = ("package",
                         "context",
                         "entity",
@@ -865,6 +1040,17 @@ class VHDLReference(object):
         Find all the libraries and use clasues within the code
         """
 
+        references = []
+        for match in cls._uses_re.finditer(code):
+            references += cls._from_uses_match(match)
+        return references
+
+    @classmethod
+    def _from_uses_match(cls, match):
+        """
+        Returns the references of a single use or context clause
+        """
+
         def get_ids(match):
             """
             Get all ids found within the match taking the optinal extra ids of
@@ -882,18 +1068,17 @@ class VHDLReference(object):
             return ids
 
         references = []
-        for match in cls._uses_re.finditer(code):
-            for uses in get_ids(match):
-                uses = uses.split(".")
+        for uses in get_ids(match):
+            uses = uses.split(".")
 
-                names_within = uses[2:] if len(uses) > 2 else (None,)
-                for name_within in names_within:
-                    ref = cls(reference_type="package" if match.group("use_type") == "use" else "context",
-                              library=uses[0],
-                              design_unit=uses[1],
-                              name_within=name_within)
+            names_within = uses[2:] if len(uses) > 2 else (None,)
+            for name_within in names_within:
+                ref = cls(reference_type="package" if match.group("use_type") == "use" else "context",
+                          library=uses[0],
+                          design_unit=uses[1],
+                          name_within=name_within)
 
-                    references.append(ref)
+                references.append(ref)
         return references
 
     _entity_reference_re = re.compile(
@@ -905,13 +1090,17 @@ class VHDLReference(object):
         """
         Find all entity references from instantiations or block configurations
         """
-        references = []
-        for match in cls._entity_reference_re.finditer(code):
-            if match.group("arch") is None:
-                references.append(cls('entity', match.group("lib"), match.group("ent")))
-            else:
-                references.append(cls('entity', match.group("lib"), match.group("ent"), match.group("arch")))
-        return references
+        return [cls._from_entity_reference_match(match)
+                for match in cls._entity_reference_re.finditer(code)]
+
+    @classmethod
+    def _from_entity_reference_match(cls, match):
+        """
+        Returns the reference of a single entity instantiation or block configuration
+        """
+        if match.group("arch") is None:
+            return cls('entity', match.group("lib"), match.group("ent"))
+        return cls('entity', match.group("lib"), match.group("ent"), match.group("arch"))
 
     _configuration_reference_re = re.compile(
         r'\bconfiguration\s+(?P<lib>[a-zA-Z]\w*)\.(?P<cfg>[a-zA-Z]\w*)',
@@ -988,20 +1177,128 @@ class VHDLReference(object):
         return self.name_within == "all"
 
 
-VHDL_REMOVE_COMMENT_RE = re.compile(r'--[^\n]*')
-
-
-def _comment_repl(match):
+def remove_comments(code):
     """
-    Replace comment with equal amount of whitespace to make
-    lexical position unaffected
+    Return the code with comments removed
     """
-    text = match.group(0)
-    return " " * len(text)
+    return strip_vhdl_comments(code).code
 
 
-def remove_comments(code):
+class _VHDLScanner(object):  # pylint: disable=too-many-instance-attributes
     """
-    Return the code with comments removed
+    Finds all objects of a VHDLDesignFile in a single pass over the code
+
+    The code is scanned once for keywords and labels and only the patterns which
+    can start at a keyword or label are tried there. Each pattern continues after
+    its previous match which gives the same result as searching the whole code
+    once per pattern.
     """
-    return VHDL_REMOVE_COMMENT_RE.sub(_comment_repl, code)
+
+    _trigger_re = re.compile(
+        r"\b(?P<keyword>entity|architecture|package|context|configuration|use)\b"
+        r"|\b(?P<label>\w+)\s*:")
+    _colon_re = re.compile(r"\s*:")
+    _letter_re = re.compile(r"[a-zA-Z]")
+
+    def __init__(self, code):
+        self._code = code
+        self._next_pos = {}
+
+        self._entities = []
+        self._architectures = []
+        self._packages = []
+        self._package_instances = []
+        self._package_bodies = []
+        self._contexts = []
+        self._component_instantiations = []
+        self._configurations = []
+        self._uses = []
+        self._entity_references = []
+        self._configuration_references = []
+        self._package_instance_references = []
+
+        # pylint: disable=protected-access
+        self._component = (VHDLDesignFile._component_re,
+                           lambda match: self._component_instantiations.append(match.group(1)))
+        uses = (VHDLReference._uses_re,
+                lambda match: self._uses.extend(VHDLReference._from_uses_match(match)))
+        self._keyword_patterns = {
+            "entity": [
+                (VHDLEntity._entity_start_re,
+                 lambda match: self._append_if_found(self._entities, VHDLEntity._from_start_match(code, match))),
+                (VHDLReference._entity_reference_re,
+                 lambda match: self._entity_references.append(VHDLReference._from_entity_reference_match(match)))],
+            "architecture": [
+                (VHDLArchitecture._architecture_re,
+                 lambda match: self._architectures.append(VHDLArchitecture(match.group("id"),
+                                                                           match.group("entity_id"))))],
+            "package": [
+                (VHDLPackage._package_start_re,
+                 lambda match: self._append_if_found(self._packages, VHDLPackage._from_start_match(code, match))),
+                (VHDLPackage._package_instance_re,
+                 lambda match: self._package_instances.append(VHDLPackage(match.group("new_name"), [], [], []))),
+                (VHDLPackageBody._package_body_pattern,
+                 lambda match: self._package_bodies.append(VHDLPackageBody(match.group("package")))),
+                (VHDLReference._package_instance_re,
+                 lambda match: self._package_instance_references.append(
+                     VHDLReference("package", match.group("lib"), match.group("name"))))],
+            "context": [
+                (VHDLContext._context_start_re,
+                 lambda match: self._contexts.append(VHDLContext(identifier=match.group("id")))),
+                uses],
+            "configuration": [
+                (VHDLConfiguration._configuration_re,
+                 lambda match: self._configurations.append(VHDLConfiguration(match.group("id"),
+                                                                             match.group("entity_id")))),
+                (VHDLReference._configuration_reference_re,
+                 lambda match: self._configuration_references.append(
+                     VHDLReference("configuration", match.group("lib"), match.group("cfg"))))],
+            "use": [uses],
+        }
+
+    @staticmethod
+    def _append_if_found(result, obj):
+        if obj is not None:
+            result.append(obj)
+
+    def _try(self, pattern, add, pos):
+        """
+        Try to match the pattern at pos unless pos is within its previous match
+        """
+        if pos < self._next_pos.get(pattern, 0):
+            return
+        match = pattern.match(self._code, pos)
+        if match is not None:
+            self._next_pos[pattern] = match.end()
+            add(match)
+
+    def scan(self, design_file_class):
+        """
+        Return a new design_file_class instance with the objects found within the code
+        """
+        for trigger in self._trigger_re.finditer(self._code):
+            keyword = trigger.group("keyword")
+            if keyword is None:
+                letter = self._letter_re.search(trigger.group("label"))
+                if letter is not None:
+                    self._try(*self._component, pos=trigger.start() + letter.start())
+                continue
+
+            for pattern, add in self._keyword_patterns[keyword]:
+                self._try(pattern, add, trigger.start())
+
+            if self._colon_re.match(self._code, trigger.end()):
+                # A keyword used as a label
+                self._try(*self._component, pos=trigger.start())
+
+        return design_file_class(entities=self._entities,
+                                 architectures=self._architectures,
+                                 packages=self._packages + self._package_instances,
+                                 package_bodies=self._package_bodies,
+                                 contexts=self._contexts,
+                                 component_instantiations=self._component_instantiations,
+                                 configurations=self._configurations,
+                                 references=(self._uses
+                                             + self._entity_references
+                                             + self._configuration_references
+                                             + self._package_instance_references))
@@ -177,6 +177,11 @@ def _create_argument_parser(description=None, for_documentation=False):
                         help=('Number of tests to run in parallel. '
                               'Test output is not continuously written in verbose mode with p > 1'))
 
+    parser.add_argument('--parse-processes', type=positive_int,
+                        default=1,
+                        help=('Number of processes used to parse source files which are not found '
+                              'in the project database when adding many files at once'))
+
     parser.add_argument("-u", "--unique-sim",
                         action="store_true",
                         default=False,
@@ -186,6 +191,22 @@ def _create_argument_parser(description=None, for_documentation=False):
                         default=None,
                         help="Export project information to a JSON file.")
 
+    parser.add_argument("--compact-database",
+                        action="store_true",
+                        default=False,
+                        help=("Only remove stale entries from and compact the project database "
+                              "and report the number of bytes reclaimed"))
+
+    parser.add_argument("--cache-statistics",
+                        default=None,
+                        help=("Write statistics of the caches used when adding source files to a JSON file. "
+                              "The statistics are also logged with --log-level=info"))
+
+    parser.add_argument("--shared-cache-path",
+                        default=None,
+                        help=("Directory of a parse result cache shared between output paths. "
+                              "Overrides the VUNIT_SHARED_CACHE_PATH environment variable."))
+
     parser.add_argument('--version', action='version', version=version())
 
     SIMULATOR_FACTORY.add_arguments(parser)